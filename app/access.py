@@ -0,0 +1,105 @@
+"""Module unlock checks for students.
+
+A module is unlocked when it is the first module of its course (modules are
+ordered by id) or the previous module is passed (`ModulePassed.isPassed`).
+
+The set of unlocked modules per (user, course) is computed with one window
+query and cached in-process. Only unlocks are cached: `isPassed` never goes
+back to False, so a cached unlock stays valid, while a module missing from
+the cached set is re-checked against the database. The cache is dropped when
+`ModulePassed` changes (`compute_module_knowledge`) or modules of a course are
+created or deleted; entries also expire after ``MODULE_UNLOCK_CACHE_TTL``
+seconds so other worker processes pick such changes up.
+"""
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from .models import (
+    Course as CourseModel,
+    CourseEnrollment as CourseEnrollmentModel,
+    Module as ModuleModel,
+    ModulePassed as ModulePassedModel,
+)
+
+MODULE_UNLOCK_CACHE_TTL = float(os.environ.get("MODULE_UNLOCK_CACHE_TTL", "60"))
+
+# (user_id, course_id) -> (expires_at, unlocked module ids)
+_unlocked: dict[tuple[int, int], tuple[float, frozenset[int]]] = {}
+_lock = threading.Lock()
+
+
+def load_unlocked_modules(db: Session, user_id: int, course_id: int) -> frozenset[int]:
+    """Ids of the course modules the user may open, in one query."""
+    passed = (
+        select(
+            ModuleModel.id.label("id"),
+            func.bool_or(ModulePassedModel.id.isnot(None)).label("passed"),
+        )
+        .outerjoin(
+            ModulePassedModel,
+            and_(
+                ModulePassedModel.moduleId == ModuleModel.id,
+                ModulePassedModel.userId == user_id,
+                ModulePassedModel.isPassed == True,
+            ),
+        )
+        .where(ModuleModel.courseId == course_id)
+        .group_by(ModuleModel.id)
+        .subquery()
+    )
+    # Первый модуль открыт всегда (default=True), остальные — если пройден предыдущий
+    prev_passed = func.lag(passed.c.passed, 1, True).over(order_by=passed.c.id)
+    rows = db.execute(select(passed.c.id, prev_passed)).all()
+    return frozenset(module_id for module_id, unlocked in rows if unlocked)
+
+
+def is_module_unlocked(db: Session, user_id: int, course_id: int, module_id: int) -> bool:
+    key = (user_id, course_id)
+    now = time.monotonic()
+    with _lock:
+        cached = _unlocked.get(key)
+    if cached and cached[0] > now and module_id in cached[1]:
+        return True
+
+    unlocked = load_unlocked_modules(db, user_id, course_id)
+    with _lock:
+        _unlocked[key] = (now + MODULE_UNLOCK_CACHE_TTL, unlocked)
+    return module_id in unlocked
+
+
+def invalidate_module_unlocks(user_id: int | None = None, course_id: int | None = None) -> None:
+    """Drop cached unlock sets of a user, of a course, or all of them."""
+    with _lock:
+        if user_id is None and course_id is None:
+            _unlocked.clear()
+            return
+        for key in list(_unlocked):
+            if (user_id is None or key[0] == user_id) and (course_id is None or key[1] == course_id):
+                del _unlocked[key]
+
+
+def ensure_module_access(db: Session, course: CourseModel, module: ModuleModel, user_id: int) -> None:
+    """Raise 403/404 unless the user is the author or an enrolled student with the module unlocked."""
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if not module or int(module.courseId) != int(course.id):
+        raise HTTPException(status_code=404, detail="Module not found")
+    if int(course.authorId) == user_id:
+        return
+    enrolled = (
+        db.query(CourseEnrollmentModel.id)
+        .filter(
+            CourseEnrollmentModel.courseId == course.id,
+            CourseEnrollmentModel.userId == user_id,
+        )
+        .first()
+    )
+    if not enrolled:
+        raise HTTPException(status_code=403, detail="Not enrolled")
+    if not is_module_unlocked(db, user_id, int(course.id), int(module.id)):
+        raise HTTPException(status_code=403, detail="Module locked")
@@ -0,0 +1,392 @@
+"""Immutable snapshots of course structure.
+
+A `CourseTree` holds the modules, topics, tests, questions and answers of one
+course. Snapshots are keyed by ``(course_id, Course.treeVersion)``; every
+authoring write in `teaching.py` bumps the version in the same transaction
+(`bump_tree_version`), so a reader that sees the new version never gets a
+stale tree and no explicit invalidation across workers is needed. Checking
+the version costs one primary-key lookup instead of a query per level.
+
+Snapshots live in an in-process LRU (``COURSE_TREE_CACHE_SIZE`` courses) and,
+when ``COURSE_TREE_REDIS_URL`` is set and the ``redis`` package is installed,
+are shared between workers through Redis as plain JSON (never pickle: the
+bytes come from outside the process). Async handlers use `aget_course_tree`,
+which talks to Redis through ``redis.asyncio``.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, is_dataclass
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import (
+    Answer as AnswerModel,
+    Course as CourseModel,
+    Module as ModuleModel,
+    Question as QuestionModel,
+    Test as TestModel,
+    Topic as TopicModel,
+)
+
+logger = logging.getLogger(__name__)
+
+COURSE_TREE_CACHE_SIZE = int(os.environ.get("COURSE_TREE_CACHE_SIZE", "256"))
+COURSE_TREE_REDIS_URL = os.environ.get("COURSE_TREE_REDIS_URL")
+COURSE_TREE_REDIS_TTL = int(os.environ.get("COURSE_TREE_REDIS_TTL", "3600"))
+
+
+@dataclass(frozen=True)
+class AnswerNode:
+    id: int
+    questionId: int
+    text: str
+    isCorrect: bool
+
+
+@dataclass(frozen=True)
+class QuestionNode:
+    id: int
+    testId: int
+    text: str
+    picture: str | None
+    complexityPoints: int
+    questionType: str
+    topicId: int | None
+    answers: tuple[AnswerNode, ...]
+
+
+@dataclass(frozen=True)
+class TestNode:
+    id: int
+    name: str
+    description: str
+    durationInMinutes: int
+    moduleId: int | None
+    courseId: int | None
+    questions: tuple[QuestionNode, ...]
+
+
+@dataclass(frozen=True)
+class TopicNode:
+    id: int
+    name: str
+    description: str
+    moduleId: int
+
+
+@dataclass(frozen=True)
+class ModuleNode:
+    id: int
+    name: str
+    description: str
+    courseId: int
+    topics: tuple[TopicNode, ...]
+    tests: tuple[TestNode, ...]
+
+
+@dataclass(frozen=True)
+class CourseTree:
+    course_id: int
+    version: int
+    # ordered by id, as the rest of the code expects
+    modules: tuple[ModuleNode, ...]
+    # final tests attached to the course itself
+    course_tests: tuple[TestNode, ...]
+    _modules_by_id: dict = field(default_factory=dict, repr=False, compare=False)
+    _tests_by_id: dict = field(default_factory=dict, repr=False, compare=False)
+    # Values computed from this snapshot (e.g. answer keys); they are dropped
+    # together with it when the version changes.
+    derived: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._modules_by_id.update((m.id, m) for m in self.modules)
+        for test in self.course_tests + tuple(t for m in self.modules for t in m.tests):
+            self._tests_by_id[test.id] = test
+
+    def module(self, module_id: int) -> ModuleNode | None:
+        return self._modules_by_id.get(module_id)
+
+    def test(self, test_id: int) -> TestNode | None:
+        return self._tests_by_id.get(test_id)
+
+
+def load_course_tree(db: Session, course_id: int, version: int) -> CourseTree:
+    """Read the whole structure of a course with one query per level."""
+    modules = db.query(ModuleModel).filter(ModuleModel.courseId == course_id).order_by(ModuleModel.id.asc()).all()
+    module_ids = [m.id for m in modules]
+
+    topics_by_module: dict[int, list] = {}
+    if module_ids:
+        for t in db.query(TopicModel).filter(TopicModel.moduleId.in_(module_ids)).order_by(TopicModel.id.asc()):
+            topics_by_module.setdefault(t.moduleId, []).append(
+                TopicNode(id=t.id, name=t.name, description=t.description, moduleId=t.moduleId))
+
+    tests_filter = TestModel.courseId == course_id
+    if module_ids:
+        tests_filter = or_(tests_filter, TestModel.moduleId.in_(module_ids))
+    tests = db.query(TestModel).filter(tests_filter).order_by(TestModel.id.asc()).all()
+    test_ids = [t.id for t in tests]
+
+    questions = []
+    answers_by_question: dict[int, list] = {}
+    if test_ids:
+        questions = db.query(QuestionModel).filter(QuestionModel.testId.in_(test_ids)).order_by(QuestionModel.id.asc()).all()
+    if questions:
+        answers = (
+            db.query(AnswerModel)
+            .filter(AnswerModel.questionId.in_([q.id for q in questions]))
+            .order_by(AnswerModel.id.asc())
+        )
+        for a in answers:
+            answers_by_question.setdefault(a.questionId, []).append(
+                AnswerNode(id=a.id, questionId=a.questionId, text=a.text, isCorrect=a.isCorrect))
+
+    questions_by_test: dict[int, list] = {}
+    for q in questions:
+        questions_by_test.setdefault(q.testId, []).append(
+            QuestionNode(
+                id=q.id,
+                testId=q.testId,
+                text=q.text,
+                picture=q.picture,
+                complexityPoints=q.complexityPoints,
+                questionType=q.questionType,
+                topicId=q.topicId,
+                answers=tuple(answers_by_question.get(q.id, ())),
+            )
+        )
+
+    tests_by_module: dict[int, list] = {}
+    course_tests = []
+    for t in tests:
+        node = TestNode(
+            id=t.id,
+            name=t.name,
+            description=t.description,
+            durationInMinutes=t.durationInMinutes,
+            moduleId=t.moduleId,
+            courseId=t.courseId,
+            questions=tuple(questions_by_test.get(t.id, ())),
+        )
+        if t.moduleId:
+            tests_by_module.setdefault(t.moduleId, []).append(node)
+        else:
+            course_tests.append(node)
+
+    return CourseTree(
+        course_id=course_id,
+        version=version,
+        modules=tuple(
+            ModuleNode(
+                id=m.id,
+                name=m.name,
+                description=m.description,
+                courseId=m.courseId,
+                topics=tuple(topics_by_module.get(m.id, ())),
+                tests=tuple(tests_by_module.get(m.id, ())),
+            )
+            for m in modules
+        ),
+        course_tests=tuple(course_tests),
+    )
+
+
+class _TreeLRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._items: OrderedDict[int, CourseTree] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, course_id: int, version: int) -> CourseTree | None:
+        with self._lock:
+            tree = self._items.get(course_id)
+            if tree is None or tree.version != version:
+                return None
+            self._items.move_to_end(course_id)
+            return tree
+
+    def put(self, tree: CourseTree) -> None:
+        with self._lock:
+            current = self._items.get(tree.course_id)
+            # a slower request must not replace a newer snapshot
+            if current is not None and current.version > tree.version:
+                return
+            self._items[tree.course_id] = tree
+            self._items.move_to_end(tree.course_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def discard(self, course_id: int) -> None:
+        with self._lock:
+            self._items.pop(course_id, None)
+
+
+def _encode(node):
+    if isinstance(node, tuple):
+        return [_encode(item) for item in node]
+    if is_dataclass(node):
+        # indexes and derived values (compare=False) are rebuilt, not stored
+        return {f.name: _encode(getattr(node, f.name)) for f in fields(node) if f.compare}
+    return node
+
+
+def dump_tree(tree: CourseTree) -> bytes:
+    return json.dumps(_encode(tree), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def load_tree(raw: bytes) -> CourseTree:
+    data = json.loads(raw)
+
+    def question(q: dict) -> QuestionNode:
+        return QuestionNode(**{**q, "answers": tuple(AnswerNode(**a) for a in q["answers"])})
+
+    def test(t: dict) -> TestNode:
+        return TestNode(**{**t, "questions": tuple(question(q) for q in t["questions"])})
+
+    return CourseTree(
+        course_id=data["course_id"],
+        version=data["version"],
+        modules=tuple(
+            ModuleNode(**{
+                **m,
+                "topics": tuple(TopicNode(**t) for t in m["topics"]),
+                "tests": tuple(test(t) for t in m["tests"]),
+            })
+            for m in data["modules"]
+        ),
+        course_tests=tuple(test(t) for t in data["course_tests"]),
+    )
+
+
+_local = _TreeLRU(COURSE_TREE_CACHE_SIZE)
+_redis = None
+_aredis = None
+if COURSE_TREE_REDIS_URL:
+    try:
+        import redis
+        import redis.asyncio
+
+        _redis = redis.Redis.from_url(COURSE_TREE_REDIS_URL)
+        _aredis = redis.asyncio.Redis.from_url(COURSE_TREE_REDIS_URL)
+    except ImportError:
+        logger.warning("COURSE_TREE_REDIS_URL is set but the redis package is not installed")
+
+
+def _shared_key(course_id: int, version: int) -> str:
+    return f"course-tree:json:{course_id}:{version}"
+
+
+def _decode_shared(raw: bytes | None, course_id: int, version: int) -> CourseTree | None:
+    if not raw:
+        return None
+    try:
+        tree = load_tree(raw)
+    except (ValueError, TypeError, KeyError):
+        logger.exception("Malformed shared course tree %s", _shared_key(course_id, version))
+        return None
+    if tree.course_id != course_id or tree.version != version:
+        return None
+    return tree
+
+
+def _shared_get(course_id: int, version: int) -> CourseTree | None:
+    if _redis is None:
+        return None
+    try:
+        raw = _redis.get(_shared_key(course_id, version))
+    except Exception:
+        logger.exception("Shared course tree cache is unavailable")
+        return None
+    return _decode_shared(raw, course_id, version)
+
+
+def _shared_put(tree: CourseTree) -> None:
+    if _redis is None:
+        return
+    try:
+        _redis.set(_shared_key(tree.course_id, tree.version), dump_tree(tree), ex=COURSE_TREE_REDIS_TTL)
+    except Exception:
+        logger.exception("Shared course tree cache is unavailable")
+
+
+async def _ashared_get(course_id: int, version: int) -> CourseTree | None:
+    if _aredis is None:
+        return None
+    try:
+        raw = await _aredis.get(_shared_key(course_id, version))
+    except Exception:
+        logger.exception("Shared course tree cache is unavailable")
+        return None
+    return _decode_shared(raw, course_id, version)
+
+
+async def _ashared_put(tree: CourseTree) -> None:
+    if _aredis is None:
+        return
+    try:
+        await _aredis.set(_shared_key(tree.course_id, tree.version), dump_tree(tree), ex=COURSE_TREE_REDIS_TTL)
+    except Exception:
+        logger.exception("Shared course tree cache is unavailable")
+
+
+def get_course_tree(db: Session, course_id: int, version: int | None = None) -> CourseTree | None:
+    """Snapshot of the course structure; None if the course does not exist.
+
+    Pass `version` when the Course row is already loaded to skip the lookup.
+    For sync handlers only: in async code use `aget_course_tree`.
+    """
+    if version is None:
+        version = db.scalar(select(CourseModel.treeVersion).where(CourseModel.id == course_id))
+        if version is None:
+            return None
+    tree = _local.get(course_id, version)
+    if tree is None:
+        tree = _shared_get(course_id, version)
+        if tree is None:
+            tree = load_course_tree(db, course_id, version)
+            _shared_put(tree)
+        _local.put(tree)
+    return tree
+
+
+async def aget_course_tree(db: AsyncSession, course_id: int, version: int | None = None) -> CourseTree | None:
+    """`get_course_tree` for async handlers; Redis is read through ``redis.asyncio``."""
+    if version is None:
+        version = await db.scalar(select(CourseModel.treeVersion).where(CourseModel.id == course_id))
+        if version is None:
+            return None
+    tree = _local.get(course_id, version)
+    if tree is None:
+        tree = await _ashared_get(course_id, version)
+        if tree is None:
+            tree = await db.run_sync(load_course_tree, course_id, version)
+            await _ashared_put(tree)
+        _local.put(tree)
+    return tree
+
+
+def course_id_for_test(db: Session, test) -> int | None:
+    """Course of a final test (Test.courseId) or of the module of a module test."""
+    if test.courseId:
+        return int(test.courseId)
+    if test.moduleId:
+        course_id = db.scalar(select(ModuleModel.courseId).where(ModuleModel.id == test.moduleId))
+        return int(course_id) if course_id is not None else None
+    return None
+
+
+def bump_tree_version(db: Session, course_id: int | None) -> None:
+    """Mark the structure of a course as changed; commits with the caller's transaction."""
+    if course_id is None:
+        return
+    db.execute(
+        update(CourseModel)
+        .where(CourseModel.id == course_id)
+        .values(treeVersion=CourseModel.treeVersion + 1)
+    )
+    _local.discard(int(course_id))
@@ -1,12 +1,13 @@
 import os
-from datetime import date
-from typing import Any
+from datetime import date, datetime, timedelta, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Body, Response
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .db import get_db
-from .deps import get_current_user, require_role
+from .db import get_async_db, get_db
+from .deps import get_async_read_db, get_current_user, get_read_db, require_role
 from .models import (
     Answer as AnswerModel,
     Course as CourseModel,
@@ -29,13 +30,18 @@ from .schemas import (
     CourseCategoryCreate,
     CourseCategoryRead,
     CourseEnrollmentRead,
+    CourseRead,
+    CourseStudyView,
     PermissionCreate,
     PermissionRead,
     RoleCreate,
     RolePermissionCreate,
     RolePermissionRead,
     RoleRead,
+    StudyModuleRead,
+    StudyTestRead,
     TestResultRead,
+    TopicRead,
     UserAnswerCreate,
     UserAnswerRead,
     UserModuleKnowledgeCreate,
@@ -43,7 +49,18 @@ from .schemas import (
     UserCourseKnowledgeCreate,
     UserCourseKnowledgeRead,
 )
-from .utils import generate_unique_id, compute_test_score, compute_module_knowledge, compute_course_knowledge
+from .access import load_unlocked_modules
+from .exports import export_response
+from .cache import CourseTree, aget_course_tree
+from .grading import GradingResult, answer_key_from_tree, grade_submission, load_answer_key
+from .ids import anext_id, next_id
+from .rbac import MANAGE_PERMISSIONS, ensure_admin_can_manage, require_permission, refresh as refresh_permissions
+from .utils import (
+    record_test_score,
+    run_knowledge_job,
+    upsert_course_knowledge,
+    upsert_module_knowledge,
+)
 from sqlalchemy.exc import IntegrityError
 
 TEST_PASS_PERCENT = int(os.environ.get(
@@ -52,10 +69,32 @@ _max_attempts_env = os.environ.get(
     "TEST_MAX_ATTEMPTS", None)  # Изменено с "3" на None
 TEST_MAX_ATTEMPTS = int(_max_attempts_env) if _max_attempts_env and _max_attempts_env.isdigit(
 ) and int(_max_attempts_env) > 0 else None
+# Через сколько секунд незавершённый фоновый пересчёт знаний выполняется при опросе
+KNOWLEDGE_JOB_STALE_SECONDS = int(os.environ.get("KNOWLEDGE_JOB_STALE_SECONDS", "30"))
+# Максимальный размер страницы для админских списков
+ADMIN_PAGE_LIMIT_MAX = int(os.environ.get("ADMIN_PAGE_LIMIT_MAX", "500"))
 
 router = APIRouter(prefix="/full", tags=["full"])
 
 
+def _keyset_page(query, model, after_id: int | None, limit: int, response: Response):
+    """One page of `query` ordered by id, starting after `after_id`.
+
+    The limit is capped by ADMIN_PAGE_LIMIT_MAX. When there are more rows the id
+    of the last returned row is sent in the X-Next-Cursor header; pass it back as
+    `after_id` to get the next page. Unlike OFFSET the cost of a page does not
+    grow with its position.
+    """
+    limit = max(1, min(limit, ADMIN_PAGE_LIMIT_MAX))
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    rows = query.order_by(model.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+
 @router.post(
     "/admin/categories",
     response_model=CourseCategoryRead,
@@ -65,7 +104,7 @@ router = APIRouter(prefix="/full", tags=["full"])
 )
 def create_category(payload: CourseCategoryCreate, db: Session = Depends(get_db)):
     category = CourseCategoryModel()
-    category.id = generate_unique_id(db, CourseCategoryModel)
+    category.id = next_id()
     category.name = payload.name
     db.add(category)
     db.commit()
@@ -132,16 +171,17 @@ def delete_category(cat_id: int, db: Session = Depends(get_db)):
 @router.post(
     "/admin/roles",
     response_model=RoleRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Создать роль",
     description="Добавляет новую роль в систему. Требуются права администратора.",
 )
 def create_role(payload: RoleCreate, db: Session = Depends(get_db)):
     role = RoleModel()
-    role.id = generate_unique_id(db, RoleModel)
+    role.id = next_id()
     role.name = payload.name
     db.add(role)
     db.commit()
+    refresh_permissions(db)
     db.refresh(role)
     return role
 
@@ -149,7 +189,7 @@ def create_role(payload: RoleCreate, db: Session = Depends(get_db)):
 @router.get(
     "/admin/roles",
     response_model=list[RoleRead],
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Список ролей",
     description="Возвращает все доступные роли. Только для администраторов.",
 )
@@ -160,7 +200,7 @@ def list_roles(db: Session = Depends(get_db)):
 @router.get(
     "/admin/roles/{role_id}",
     response_model=RoleRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Получить роль",
     description="Возвращает данные роли по идентификатору. Только для администраторов.",
 )
@@ -174,7 +214,7 @@ def get_role(role_id: int, db: Session = Depends(get_db)):
 @router.put(
     "/admin/roles/{role_id}",
     response_model=RoleRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Обновить роль",
     description="Изменяет название роли. Доступно только администраторам.",
 )
@@ -184,14 +224,16 @@ def update_role(role_id: int, payload: RoleCreate, db: Session = Depends(get_db)
         raise HTTPException(status_code=404, detail="Role not found")
     role.name = payload.name
     db.add(role)
+    ensure_admin_can_manage(db)
     db.commit()
+    refresh_permissions(db)
     db.refresh(role)
     return role
 
 
 @router.delete(
     "/admin/roles/{role_id}",
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Удалить роль",
     description="Удаляет роль из системы. Требуются права администратора.",
 )
@@ -200,23 +242,26 @@ def delete_role(role_id: int, db: Session = Depends(get_db)):
     if not role:
         raise HTTPException(status_code=404, detail="Role not found")
     db.delete(role)
+    ensure_admin_can_manage(db)
     db.commit()
+    refresh_permissions(db)
     return {"ok": True}
 
 
 @router.post(
     "/admin/permissions",
     response_model=PermissionRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Создать разрешение",
     description="Добавляет новое действие в систему разрешений. Только для администраторов.",
 )
 def create_permission(payload: PermissionCreate, db: Session = Depends(get_db)):
     permission = PermissionModel()
-    permission.id = generate_unique_id(db, PermissionModel)
+    permission.id = next_id()
     permission.action = payload.action
     db.add(permission)
     db.commit()
+    refresh_permissions(db)
     db.refresh(permission)
     return permission
 
@@ -224,7 +269,7 @@ def create_permission(payload: PermissionCreate, db: Session = Depends(get_db)):
 @router.get(
     "/admin/permissions",
     response_model=list[PermissionRead],
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Список разрешений",
     description="Возвращает все зарегистрированные разрешения. Только для администраторов.",
 )
@@ -235,7 +280,7 @@ def list_permissions(db: Session = Depends(get_db)):
 @router.get(
     "/admin/permissions/{perm_id}",
     response_model=PermissionRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Получить разрешение",
     description="Возвращает разрешение по идентификатору. Только для администраторов.",
 )
@@ -249,7 +294,7 @@ def get_permission(perm_id: int, db: Session = Depends(get_db)):
 @router.put(
     "/admin/permissions/{perm_id}",
     response_model=PermissionRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Обновить разрешение",
     description="Изменяет действие существующего разрешения. Только для администраторов.",
 )
@@ -259,14 +304,16 @@ def update_permission(perm_id: int, payload: PermissionCreate, db: Session = Dep
         raise HTTPException(status_code=404, detail="Permission not found")
     permission.action = payload.action
     db.add(permission)
+    ensure_admin_can_manage(db)
     db.commit()
+    refresh_permissions(db)
     db.refresh(permission)
     return permission
 
 
 @router.delete(
     "/admin/permissions/{perm_id}",
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Удалить разрешение",
     description="Удаляет разрешение из системы. Только для администраторов.",
 )
@@ -275,24 +322,27 @@ def delete_permission(perm_id: int, db: Session = Depends(get_db)):
     if not permission:
         raise HTTPException(status_code=404, detail="Permission not found")
     db.delete(permission)
+    ensure_admin_can_manage(db)
     db.commit()
+    refresh_permissions(db)
     return {"ok": True}
 
 
 @router.post(
     "/admin/role-permissions",
     response_model=RolePermissionRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Назначить разрешение роли",
     description="Создает связь между ролью и разрешением. Доступно только администраторам.",
 )
 def create_role_permission(payload: RolePermissionCreate, db: Session = Depends(get_db)):
     rp = RolePermissionModel()
-    rp.id = generate_unique_id(db, RolePermissionModel)
+    rp.id = next_id()
     rp.roleId = payload.roleId
     rp.permissionId = payload.permissionId
     db.add(rp)
     db.commit()
+    refresh_permissions(db)
     db.refresh(rp)
     return rp
 
@@ -300,7 +350,7 @@ def create_role_permission(payload: RolePermissionCreate, db: Session = Depends(
 @router.get(
     "/admin/role-permissions",
     response_model=list[RolePermissionRead],
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Список назначенных разрешений",
     description="Возвращает все связи ролей и разрешений. Только для администраторов.",
 )
@@ -311,7 +361,7 @@ def list_role_permissions(db: Session = Depends(get_db)):
 @router.get(
     "/admin/role-permissions/{rp_id}",
     response_model=RolePermissionRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Получить назначенное разрешение",
     description="Возвращает конкретную связь роли и разрешения по идентификатору. Только для администраторов.",
 )
@@ -325,7 +375,7 @@ def get_role_permission(rp_id: int, db: Session = Depends(get_db)):
 @router.put(
     "/admin/role-permissions/{rp_id}",
     response_model=RolePermissionRead,
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Обновить назначение разрешения",
     description="Изменяет связь между ролью и разрешением. Только для администраторов.",
 )
@@ -336,14 +386,16 @@ def update_role_permission(rp_id: int, payload: RolePermissionCreate, db: Sessio
     rp.roleId = payload.roleId
     rp.permissionId = payload.permissionId
     db.add(rp)
+    ensure_admin_can_manage(db)
     db.commit()
+    refresh_permissions(db)
     db.refresh(rp)
     return rp
 
 
 @router.delete(
     "/admin/role-permissions/{rp_id}",
-    dependencies=[Depends(require_role("admin"))],
+    dependencies=[Depends(require_permission(MANAGE_PERMISSIONS))],
     summary="Удалить назначение разрешения",
     description="Удаляет связь роли и разрешения. Только для администраторов.",
 )
@@ -352,7 +404,9 @@ def delete_role_permission(rp_id: int, db: Session = Depends(get_db)):
     if not rp:
         raise HTTPException(status_code=404, detail="RolePermission not found")
     db.delete(rp)
+    ensure_admin_can_manage(db)
     db.commit()
+    refresh_permissions(db)
     return {"ok": True}
 
 
@@ -360,10 +414,22 @@ def delete_role_permission(rp_id: int, db: Session = Depends(get_db)):
     "/admin/enrollments",
     dependencies=[Depends(require_role("admin"))],
     summary="Список всех записей на курсы",
-    description="Возвращает все записи студентов на курсы. Доступно только администраторам.",
+    description="Возвращает записи студентов на курсы. Доступно только администраторам. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.",
 )
-def admin_list_enrollments(db: Session = Depends(get_db)):
-    return db.query(CourseEnrollmentModel).all()
+def admin_list_enrollments(
+    response: Response,
+    userId: int | None = None,
+    courseId: int | None = None,
+    after_id: int | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    query = db.query(CourseEnrollmentModel)
+    if userId is not None:
+        query = query.filter(CourseEnrollmentModel.userId == userId)
+    if courseId is not None:
+        query = query.filter(CourseEnrollmentModel.courseId == courseId)
+    return _keyset_page(query, CourseEnrollmentModel, after_id, limit, response)
 
 
 @router.get(
@@ -398,10 +464,25 @@ def admin_delete_enrollment(enroll_id: int, db: Session = Depends(get_db)):
     "/admin/module-passed",
     dependencies=[Depends(require_role("admin"))],
     summary="Список статусов прохождения модулей",
-    description="Возвращает все записи о прохождении модулей пользователями. Только для администраторов.",
+    description="Возвращает записи о прохождении модулей пользователями. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.",
 )
-def admin_list_module_passed(db: Session = Depends(get_db)):
-    return db.query(ModulePassedModel).all()
+def admin_list_module_passed(
+    response: Response,
+    userId: int | None = None,
+    moduleId: int | None = None,
+    isPassed: bool | None = None,
+    after_id: int | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    query = db.query(ModulePassedModel)
+    if userId is not None:
+        query = query.filter(ModulePassedModel.userId == userId)
+    if moduleId is not None:
+        query = query.filter(ModulePassedModel.moduleId == moduleId)
+    if isPassed is not None:
+        query = query.filter(ModulePassedModel.isPassed == isPassed)
+    return _keyset_page(query, ModulePassedModel, after_id, limit, response)
 
 
 @router.get(
@@ -423,9 +504,12 @@ def admin_get_module_passed(mp_id: int, db: Session = Depends(get_db)):
     summary="Мои результаты тестов",
     description="Возвращает результаты тестов для текущего пользователя.",
 )
-def my_results(current=Depends(get_current_user), db: Session = Depends(get_db)):
+async def my_results(current=Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     uid = int(current.id)
-    return db.query(TestResultModel).filter(TestResultModel.userId == uid).order_by(TestResultModel.created_at.desc()).all()
+    results = await db.scalars(
+        select(TestResultModel).where(TestResultModel.userId == uid).order_by(TestResultModel.created_at.desc())
+    )
+    return results.all()
 
 
 @router.get(
@@ -457,6 +541,60 @@ def get_result(result_id: int, current=Depends(get_current_user), db: Session =
     raise HTTPException(status_code=403, detail="Not authorized")
 
 
+@router.get(
+    "/results/{result_id}/knowledge",
+    summary="Знания после попытки теста",
+    description="Возвращает флаг готовности и пересчитанные уровни знаний по модулю и курсу для попытки текущего пользователя.",
+)
+async def get_result_knowledge(
+    result_id: int,
+    background_tasks: BackgroundTasks,
+    current=Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    result = await db.get(TestResultModel, result_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="TestResult not found")
+    if result.userId != int(current.id) and current.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    if result.knowledgeUpdatedAt is None:
+        age = datetime.now(timezone.utc) - result.created_at
+        if age >= timedelta(seconds=KNOWLEDGE_JOB_STALE_SECONDS):
+            # Фоновая задача могла потеряться (например, процесс перезапустился) — ставим её снова.
+            # Та же задача, что и после submit_test: блокировка по id попытки не даст посчитать дважды.
+            background_tasks.add_task(run_knowledge_job, result.id)
+        return {"result_id": result.id, "knowledge_ready": False, "module_knowledge": None, "course_knowledge": None}
+
+    test = await db.get(TestModel, result.testId)
+    module_id = getattr(test, "moduleId", None)
+    course_id = getattr(test, "courseId", None)
+    if course_id is None and module_id is not None:
+        module = await db.get(ModuleModel, module_id)
+        course_id = module.courseId if module else None
+
+    module_knowledge = None
+    if module_id:
+        module_knowledge = await db.scalar(
+            select(UserModuleKnowledgeModel.knowledge)
+            .where(UserModuleKnowledgeModel.userId == result.userId, UserModuleKnowledgeModel.moduleId == module_id)
+            .limit(1)
+        )
+    course_knowledge = None
+    if course_id:
+        course_knowledge = await db.scalar(
+            select(UserCourseKnowledgeModel.knowledge)
+            .where(UserCourseKnowledgeModel.userId == result.userId, UserCourseKnowledgeModel.courseId == course_id)
+            .limit(1)
+        )
+    return {
+        "result_id": result.id,
+        "knowledge_ready": True,
+        "module_knowledge": module_knowledge,
+        "course_knowledge": course_knowledge,
+    }
+
+
 @router.post(
     "/courses/{course_id}/enroll",
     response_model=CourseEnrollmentRead,
@@ -478,12 +616,17 @@ def enroll_course(course_id: int, current=Depends(get_current_user), db: Session
     if exists:
         raise HTTPException(status_code=400, detail="Already enrolled")
     enrollment = CourseEnrollmentModel()
-    enrollment.id = generate_unique_id(db, CourseEnrollmentModel)
+    enrollment.id = next_id()
     enrollment.courseId = course_id
     enrollment.userId = uid
     enrollment.dateStarted = date.today()
     db.add(enrollment)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # параллельный запрос уже записал студента (уникальный индекс userId+courseId)
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Already enrolled")
     db.refresh(enrollment)
     return enrollment
 
@@ -507,16 +650,178 @@ def unenroll_course(course_id: int, current=Depends(get_current_user), db: Sessi
     return {"ok": True}
 
 
+@router.get(
+    "/courses/{course_id}/study-view",
+    response_model=CourseStudyView,
+    summary="Курс для прохождения",
+    description="Возвращает курс целиком (модули, темы, тесты) с прогрессом и блокировками текущего пользователя. Доступно автору курса, записанным студентам и администратору.",
+)
+async def get_course_study_view(course_id: int, current=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    course = await db.get(CourseModel, course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    uid = int(current.id)
+    is_author = int(course.authorId) == uid
+    full_access = is_author or current.role == "admin"
+    if not full_access:
+        enrolled = await db.scalar(
+            select(CourseEnrollmentModel.id)
+            .where(CourseEnrollmentModel.courseId == course_id, CourseEnrollmentModel.userId == uid)
+            .limit(1)
+        )
+        if not enrolled:
+            raise HTTPException(status_code=403, detail="Not enrolled")
+    # Структура курса (модули, темы, тесты) — из кэшированного снимка
+    tree = await aget_course_tree(db, course_id, course.treeVersion)
+    return await db.run_sync(_build_study_view, course, tree, uid, is_author, full_access)
+
+
+def _build_study_view(
+    db: Session, course: CourseModel, tree: CourseTree, uid: int, is_author: bool, full_access: bool
+) -> CourseStudyView:
+    course_id = course.id
+    category = db.get(CourseCategoryModel, course.categoryId) if course.categoryId else None
+    modules = tree.modules
+    module_ids = [m.id for m in modules]
+    course_tests = tree.course_tests
+    test_ids = [t.id for t in course_tests] + [t.id for m in modules for t in m.tests]
+
+    best_results = {}
+    if test_ids:
+        best_results = {
+            test_id: (best_percent, best_passed)
+            for test_id, best_percent, best_passed in db.query(
+                TestResultModel.testId,
+                func.max(TestResultModel.result),
+                func.bool_or(TestResultModel.isPassed),
+            )
+            .filter(TestResultModel.userId == uid, TestResultModel.testId.in_(test_ids))
+            .group_by(TestResultModel.testId)
+        }
+
+    knowledge_by_module = {}
+    passed_modules = set()
+    if module_ids:
+        knowledge_by_module = dict(
+            db.query(UserModuleKnowledgeModel.moduleId, UserModuleKnowledgeModel.knowledge)
+            .filter(UserModuleKnowledgeModel.userId == uid, UserModuleKnowledgeModel.moduleId.in_(module_ids))
+        )
+        passed_modules = {
+            module_id
+            for (module_id,) in db.query(ModulePassedModel.moduleId).filter(
+                ModulePassedModel.userId == uid,
+                ModulePassedModel.isPassed == True,
+                ModulePassedModel.moduleId.in_(module_ids),
+            )
+        }
+    unlocked = set(module_ids) if full_access else load_unlocked_modules(db, uid, course_id)
+    course_knowledge = (
+        db.query(UserCourseKnowledgeModel.knowledge)
+        .filter(UserCourseKnowledgeModel.userId == uid, UserCourseKnowledgeModel.courseId == course_id)
+        .limit(1)
+        .scalar()
+    )
+
+    def study_test(test):
+        best_percent, best_passed = best_results.get(test.id, (None, False))
+        return StudyTestRead.model_validate(test).model_copy(
+            update={"bestPercent": best_percent, "bestPassed": bool(best_passed)})
+
+    study_modules = []
+    for module in modules:
+        is_locked = module.id not in unlocked
+        study_modules.append(
+            StudyModuleRead(
+                id=module.id,
+                name=module.name,
+                description=module.description,
+                courseId=module.courseId,
+                knowledge=float(knowledge_by_module.get(module.id) or 0.0),
+                isLocked=is_locked,
+                isPassed=module.id in passed_modules,
+                # Темы заблокированного модуля не отдаём, как и list_topics
+                topics=[] if is_locked else [TopicRead.model_validate(t) for t in module.topics],
+                tests=[study_test(t) for t in module.tests],
+            )
+        )
+
+    return CourseStudyView(
+        course=CourseRead.model_validate(course),
+        category=CourseCategoryRead.model_validate(category) if category else None,
+        isAuthor=is_author,
+        courseKnowledge=float(course_knowledge or 0.0),
+        allModulesPassed=full_access or all(m.isPassed for m in study_modules),
+        courseTest=study_test(course_tests[0]) if course_tests else None,
+        modules=study_modules,
+    )
+
+
+def _build_recommendations(db: Session, test: TestModel, grading: GradingResult, duration_in_minutes: float) -> list[dict]:
+    """Генерация рекомендаций по результатам проверки (без повторных запросов к вопросам)."""
+    recommendations = []
+
+    # Проверяем, вышел ли пользователь за таймаут
+    test_duration = getattr(test, 'durationInMinutes', 0) or 0
+    is_timeout = False
+    if test_duration > 0 and duration_in_minutes > test_duration:
+        is_timeout = True
+        recommendations.append({
+            "type": "timeout",
+            "message": f"Вы превысили отведенное время на тест ({test_duration} минут). Рекомендуем повторить весь материал модуля для лучшего усвоения."
+        })
+
+    # Собираем информацию о неправильных ответах (только сохранённые ответы)
+    incorrect = [g for g in grading.graded if g.recorded and not g.is_correct]
+    topics_with_errors = {g.question.topic_id for g in incorrect if g.question.topic_id}
+    has_incorrect_test = any(g.question.question_type == 'test' for g in incorrect)
+    has_incorrect_open = any(g.question.question_type == 'open' for g in incorrect)
+
+    # Генерируем рекомендации по темам
+    if topics_with_errors:
+        topics = db.query(TopicModel).filter(TopicModel.id.in_(topics_with_errors)).all()
+        topic_names = [topic.name for topic in topics]
+        if topic_names:
+            topics_str = ", ".join(topic_names)
+            recommendations.append({
+                "type": "topics",
+                "message": f"Рекомендуем повторить следующие темы, в которых были допущены ошибки: {topics_str}.",
+                "topic_ids": list(topics_with_errors)
+            })
+
+    # Рекомендации по типам вопросов
+    if has_incorrect_test:
+        recommendations.append({
+            "type": "question_type",
+            "message": "Вы допустили ошибки в тестовых вопросах. Рекомендуем более внимательно изучать материал и практиковаться с тестовыми заданиями."
+        })
+
+    if has_incorrect_open:
+        recommendations.append({
+            "type": "question_type",
+            "message": "Вы допустили ошибки в открытых вопросах. Рекомендуем больше практиковаться в формулировании развернутых ответов и повторно изучить соответствующий материал."
+        })
+
+    # Если ошибок не было
+    if not incorrect and not is_timeout:
+        recommendations.append({
+            "type": "success",
+            "message": "Отлично! Вы хорошо усвоили материал модуля. Можете переходить к следующему модулю."
+        })
+
+    return recommendations
+
+
 @router.post(
     "/tests/{test_id}/submit",
     summary="Сдать тест",
     description="Принимает ответы пользователя, проверяет их и сохраняет результат попытки.",
 )
-def submit_test(
+async def submit_test(
     test_id: int,
+    background_tasks: BackgroundTasks,
     request_body: dict = Body(...),  # Изменено: принимаем весь body как dict
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     uid = int(current_user.id)
 
@@ -539,7 +844,7 @@ def submit_test(
     if duration_in_minutes < 0:
         duration_in_minutes = 0.0
 
-    test = db.get(TestModel, test_id)
+    test = await db.get(TestModel, test_id)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
 
@@ -547,378 +852,113 @@ def submit_test(
     if test.courseId:
         course_id_for_check = test.courseId
     elif test.moduleId:
-        module = db.get(ModuleModel, test.moduleId)
+        module = await db.get(ModuleModel, test.moduleId)
         if not module:
             raise HTTPException(
                 status_code=404, detail="Module for test not found")
         course_id_for_check = module.courseId
 
     if course_id_for_check is not None:
-        enrolled = (
-            db.query(CourseEnrollmentModel)
-            .filter(CourseEnrollmentModel.courseId == course_id_for_check, CourseEnrollmentModel.userId == uid)
-            .first()
+        enrolled = await db.scalar(
+            select(CourseEnrollmentModel.id)
+            .where(CourseEnrollmentModel.courseId == course_id_for_check, CourseEnrollmentModel.userId == uid)
+            .limit(1)
         )
         if not enrolled:
             raise HTTPException(
                 status_code=403, detail="User is not enrolled in the course for this test")
 
-    questions = db.query(QuestionModel).filter(
-        QuestionModel.testId == test_id).all()
-    total_questions = len(questions)
+    # Ключ ответов строится один раз на версию дерева курса и дальше берётся из памяти
+    tree = await aget_course_tree(db, course_id_for_check) if course_id_for_check is not None else None
+    key = answer_key_from_tree(tree, test_id) if tree else None
+    if key is None:
+        key = await db.run_sync(load_answer_key, test_id)
+    total_questions = len(key.questions)
     if total_questions == 0:
         raise HTTPException(status_code=400, detail="Test has no questions")
 
-    # Теперь можно логировать questions, так как они уже определены
-    logger.info(f"Question IDs in test: {[q.id for q in questions]}")
+    logger.info(f"Question IDs in test: {[q.id for q in key.questions]}")
 
-    attempts_count = (
-        db.query(TestResultModel)
-        .filter(TestResultModel.testId == test_id, TestResultModel.userId == uid)
-        .count()
+    attempts_count = await db.scalar(
+        select(func.count(TestResultModel.id))
+        .where(TestResultModel.testId == test_id, TestResultModel.userId == uid)
     )
     if TEST_MAX_ATTEMPTS is not None and attempts_count >= TEST_MAX_ATTEMPTS:
         raise HTTPException(
             status_code=400, detail=f"Max attempts reached ({TEST_MAX_ATTEMPTS})")
 
-    correct = 0
-    for question in questions:
-        provided: Any | None = None
-        if isinstance(answers, dict):
-            # Пробуем получить ответ по числовому ключу (если ключи - числа)
-            provided = answers.get(question.id)
-            # Если не нашли, пробуем строковый ключ (JSON всегда использует строки)
-            if provided is None:
-                provided = answers.get(str(question.id))
-        if provided is None:
-            logger.warning(f"No answer provided for question {question.id}")
-            continue
-
-        # ВАЖНО: Сначала проверяем тип вопроса, потом обрабатываем ответ
-        # Обработка открытых вопросов
-        if question.questionType == 'open':
-            # Для открытых вопросов provided - это текст ответа
-            if not isinstance(provided, str):
-                provided = str(provided)
-
-            # Нормализуем ответ пользователя: убираем пробелы и приводим к нижнему регистру
-            user_answer_normalized = provided.strip().lower()
-
-            # Получаем правильные ответы для этого вопроса
-            correct_answers = db.query(AnswerModel).filter(
-                AnswerModel.questionId == question.id,
-                AnswerModel.isCorrect == True
-            ).all()
-
-            is_correct = False
-            for correct_answer in correct_answers:
-                # Нормализуем правильный ответ
-                correct_text_normalized = correct_answer.text.strip().lower()
-                if user_answer_normalized == correct_text_normalized:
-                    is_correct = True
-                    break
-
-            if is_correct:
-                correct += 1
-                logger.info(
-                    f"Correct open answer for question {question.id}! Total correct: {correct}")
-            else:
-                logger.info(
-                    f"Incorrect open answer for question {question.id}. User: '{user_answer_normalized}', Expected one of: {[ca.text.strip().lower() for ca in correct_answers]}")
-
-        # Обработка тестовых вопросов
-        else:
-            try:
-                answer_id = int(provided)
-                logger.info(f"Question {question.id}: answer_id={answer_id}")
-            except Exception:
-                logger.error(f"Failed to convert answer to int: {provided}")
-                continue
-            answer = db.get(AnswerModel, answer_id)
-            if answer:
-                logger.info(
-                    f"Answer {answer_id}: questionId={answer.questionId}, isCorrect={answer.isCorrect}")
-                if answer.questionId == question.id and answer.isCorrect:
-                    correct += 1
-                    logger.info(f"Correct answer! Total correct: {correct}")
-            else:
-                logger.warning(f"Answer {answer_id} not found in database")
-
+    # Единственный проход проверки: ключ ответов уже в памяти.
+    grading = grade_submission(key, answers, test.durationInMinutes, duration_in_minutes)
+    correct = grading.correct
+    breakdown = grading.breakdown
     logger.info(f"Total correct: {correct} out of {total_questions}")
-
-    percent = int((correct / total_questions) * 100)
-    passed = percent >= TEST_PASS_PERCENT
+    logger.info(
+        "Score breakdown: percent=%s, weighted_points=%s/%s, accuracy=%.2f, time_factor=%.2f",
+        breakdown.percent,
+        breakdown.weighted_points,
+        breakdown.max_points,
+        breakdown.accuracy_ratio,
+        breakdown.time_factor,
+    )
 
     result = TestResultModel()
-    result.id = generate_unique_id(db, TestResultModel)
+    result.id = await anext_id()
+    # Оставляем `scoreInPoints` как количество правильных ответов (raw count)
+    # чтобы интерфейс отображал корректное соотношение "Правильных ответов: X из Y".
+    # В текущей схеме БД нет отдельного поля для хранения взвешенных баллов.
     result.scoreInPoints = correct
-    # initially mark based on raw percent; will update after detailed scoring
-    result.isPassed = passed
+    result.isPassed = breakdown.percent >= TEST_PASS_PERCENT
     result.durationInMinutes = duration_in_minutes  # Используем переданное время
-    result.result = percent
+    result.result = int(round(breakdown.percent))
     result.testId = test_id
     result.userId = uid
     db.add(result)
-    db.commit()
-    db.refresh(result)
+    await db.flush()
 
-    # Bulk-save UserAnswer rows based on provided answers (if any)
     # Вычисляем время на один вопрос (если есть ответы)
     time_per_answer = 0
     if duration_in_minutes > 0 and len(answers) > 0:
         # Распределяем время равномерно между всеми ответами
         time_per_answer = duration_in_minutes / len(answers)
 
-    try:
-        for question in questions:
-            provided: Any | None = None
-            if isinstance(answers, dict):
-                provided = answers.get(question.id)
-                if provided is None:
-                    provided = answers.get(str(question.id))
-            
-            # Если ответ не предоставлен, создаем запись с isCorrect = False
-            if provided is None:
-                ua = UserAnswerModel()
-                ua.id = generate_unique_id(db, UserAnswerModel)
-                ua.userId = uid
-                ua.testResultId = result.id
-                ua.questionId = question.id
-                ua.isCorrect = False  # Незаполненный ответ считается неправильным
-                ua.timeSpentInMinutes = 0
-                db.add(ua)
-                continue
-
-            # ВАЖНО: Сначала проверяем тип вопроса, потом обрабатываем ответ
-            # Обработка открытых вопросов
-            if question.questionType == 'open':
-                if not isinstance(provided, str):
-                    provided = str(provided)
-
-                # Нормализуем ответ пользователя
-                user_answer_normalized = provided.strip().lower()
-
-                # Получаем правильные ответы для этого вопроса
-                correct_answers = db.query(AnswerModel).filter(
-                    AnswerModel.questionId == question.id,
-                    AnswerModel.isCorrect == True
-                ).all()
-
-                is_correct = False
-                for correct_answer in correct_answers:
-                    correct_text_normalized = correct_answer.text.strip().lower()
-                    if user_answer_normalized == correct_text_normalized:
-                        is_correct = True
-                        break
-
-                # Сохраняем UserAnswer для открытого вопроса
-                ua = UserAnswerModel()
-                ua.id = generate_unique_id(db, UserAnswerModel)
-                ua.userId = uid
-                ua.testResultId = result.id
-                ua.questionId = question.id
-                ua.isCorrect = is_correct
-                # Устанавливаем время прохождения для этого ответа
-                if time_per_answer < 1:
-                    ua.timeSpentInMinutes = 0
-                else:
-                    ua.timeSpentInMinutes = int(time_per_answer)
-                db.add(ua)
-
-            # Обработка тестовых вопросов
-            else:
-                try:
-                    answer_id = int(provided)
-                except Exception:
-                    logger.warning(
-                        f"Failed to convert answer to int for question {question.id}: {provided}")
-                    continue
-                answer = db.get(AnswerModel, answer_id)
-                # Only save if the answer belongs to the question
-                if answer and answer.questionId == question.id:
-                    ua = UserAnswerModel()
-                    ua.id = generate_unique_id(db, UserAnswerModel)
-                    ua.userId = uid
-                    ua.testResultId = result.id
-                    ua.questionId = question.id
-                    ua.isCorrect = bool(answer.isCorrect)
-                    # Устанавливаем время прохождения для этого ответа
-                    if time_per_answer < 1:
-                        ua.timeSpentInMinutes = 0
-                    else:
-                        ua.timeSpentInMinutes = int(time_per_answer)
-                    db.add(ua)
-        db.commit()
-    except Exception as e:
-        # Логируем ошибку для отладки
-        logger.error(f"Error saving UserAnswer: {e}", exc_info=True)
-        # don't fail test submission on UserAnswer save error
-        db.rollback()
-
-    # Recompute precise test score using per-question data if available
-    try:
-        # Получаем все ответы пользователя
-        user_answers_all = db.query(UserAnswerModel).filter(
-            UserAnswerModel.testResultId == result.id
-        ).all()
-
-        # Считаем правильные ответы из всех сохраненных
-        correct_from_answers = sum(
-            1 for ua in user_answers_all if ua.isCorrect)
-
-        # Новый пересчет: используем формулу из utils.compute_test_score
-        breakdown = compute_test_score(db, test_id, result.id)
-
-        logger.info(
-            "Score breakdown: percent=%s, weighted_points=%s/%s, accuracy=%.2f, time_factor=%.2f",
-            breakdown.percent,
-            breakdown.weighted_points,
-            breakdown.max_points,
-            breakdown.accuracy_ratio,
-            breakdown.time_factor,
-        )
-
-        result.result = int(round(breakdown.percent))
-        result.isPassed = breakdown.percent >= TEST_PASS_PERCENT
-        # Оставляем `scoreInPoints` как количество правильных ответов (raw count)
-        # чтобы интерфейс отображал корректное соотношение "Правильных ответов: X из Y".
-        # Подробная разбивка (weighted points, time_factor и т.д.) логируется выше,
-        # но в текущей схеме БД нет отдельного поля для хранения взвешенных баллов.
-        result.scoreInPoints = int(correct)
-
-        logger.info(
-            f"Final result: percent={result.result}, isPassed={result.isPassed}, scoreInPoints={result.scoreInPoints}")
-
-        db.add(result)
-        db.commit()
-        db.refresh(result)
-        
-        # Убеждаемся, что результат действительно обновлен
-        logger.info(f"After commit, result.result = {result.result}")
-    except Exception as e:
-        # Логируем ошибку для отладки
-        logger.error(f"Error recomputing test score: {e}", exc_info=True)
-        # ignore recalculation errors to avoid breaking submission
-        db.rollback()
-        # Если пересчет не удался, оставляем исходные значения
-        logger.info(
-            f"Keeping original values: percent={percent}, isPassed={passed}, scoreInPoints={correct}")
-
-    # NOTE: ModulePassed теперь полностью управляется функцией compute_module_knowledge,
-    # которая вызывается ниже. Это обеспечивает корректное обновление статуса прохождения
-    # модуля на основе агрегированного знания (среднего по всем тестам модуля).
-
-    # Trigger recompute of aggregated module/course knowledge for this user
-    computed_knowledge = None
-    computed_course_knowledge = None
-    try:
-        # Убеждаемся, что result обновлен в базе данных
-        # Делаем еще один refresh после всех коммитов
-        db.refresh(result)
-        
-        # Логируем перед вызовом compute_module_knowledge
-        logger.info(f"Before compute_module_knowledge: test_id={test_id}, result.id={result.id}, result.result={result.result}, test.moduleId={test.moduleId if test else None}")
-        
-        if test and test.moduleId:
-            # Вызываем с правильным количеством аргументов (только 3)
-            computed_knowledge = compute_module_knowledge(db, uid, test.moduleId)
-            logger.info(f"Computed module knowledge: {computed_knowledge}%")
-        # derive course id
-        course_id_for_calc = None
-        if test and test.courseId:
-            course_id_for_calc = test.courseId
-        elif test and test.moduleId:
-            mod = db.get(ModuleModel, test.moduleId)
-            course_id_for_calc = getattr(
-                mod, 'courseId', None) if mod else None
-        if course_id_for_calc:
-            computed_course_knowledge = compute_course_knowledge(db, uid, course_id_for_calc)
-            logger.info(f"Computed course knowledge: {computed_course_knowledge}%")
-    except Exception as e:
-        # Логируем ошибку для отладки
-        logger.error(f"Error recomputing module/course knowledge: {e}", exc_info=True)
-        # don't fail submission on aggregate recalculation error
-        pass
-
-    # Генерация рекомендаций
-    recommendations = []
-
-    # Получаем все ответы пользователя для этого теста
-    user_answers = db.query(UserAnswerModel).filter(
-        UserAnswerModel.testResultId == result.id
-    ).all()
-
-    # Проверяем, вышел ли пользователь за таймаут
-    test_duration = getattr(test, 'durationInMinutes', 0) or 0
-    is_timeout = False
-    if test_duration > 0 and duration_in_minutes > test_duration:
-        is_timeout = True
-        recommendations.append({
-            "type": "timeout",
-            "message": f"Вы превысили отведенное время на тест ({test_duration} минут). Рекомендуем повторить весь материал модуля для лучшего усвоения."
-        })
-
-    # Собираем информацию о неправильных ответах
-    incorrect_answers = [ua for ua in user_answers if not ua.isCorrect]
-    incorrect_test_questions = []
-    incorrect_open_questions = []
-    topics_with_errors = set()
-
-    for ua in incorrect_answers:
-        question = db.get(QuestionModel, ua.questionId)
-        if question:
-            if question.topicId:
-                topics_with_errors.add(question.topicId)
-
-            if question.questionType == 'test':
-                incorrect_test_questions.append(question)
-            elif question.questionType == 'open':
-                incorrect_open_questions.append(question)
-
-    # Генерируем рекомендации по темам
-    if topics_with_errors:
-        topic_names = []
-        for topic_id in topics_with_errors:
-            topic = db.get(TopicModel, topic_id)
-            if topic:
-                topic_names.append(topic.name)
-
-        if topic_names:
-            topics_str = ", ".join(topic_names)
-            recommendations.append({
-                "type": "topics",
-                "message": f"Рекомендуем повторить следующие темы, в которых были допущены ошибки: {topics_str}.",
-                "topic_ids": list(topics_with_errors)
-            })
-
-    # Рекомендации по типам вопросов
-    if incorrect_test_questions:
-        recommendations.append({
-            "type": "question_type",
-            "message": "Вы допустили ошибки в тестовых вопросах. Рекомендуем более внимательно изучать материал и практиковаться с тестовыми заданиями."
-        })
-
-    if incorrect_open_questions:
-        recommendations.append({
-            "type": "question_type",
-            "message": "Вы допустили ошибки в открытых вопросах. Рекомендуем больше практиковаться в формулировании развернутых ответов и повторно изучить соответствующий материал."
-        })
-
-    # Если ошибок не было
-    if not incorrect_answers and not is_timeout:
-        recommendations.append({
-            "type": "success",
-            "message": "Отлично! Вы хорошо усвоили материал модуля. Можете переходить к следующему модулю."
-        })
+    # Все ответы попытки пишутся одним многострочным INSERT; id выдаёт
+    # последовательность "UserAnswer_id_seq", поэтому проверочные SELECT не нужны.
+    user_answer_rows = [
+        {
+            "userId": uid,
+            "testResultId": result.id,
+            "questionId": graded.question.id,
+            "isCorrect": graded.is_correct,
+            "timeSpentInMinutes": int(time_per_answer) if graded.answered else 0,
+        }
+        for graded in grading.graded
+        if graded.recorded
+    ]
+    if user_answer_rows:
+        await db.execute(insert(UserAnswerModel).values(user_answer_rows))
+    # Последняя попытка по тесту: знания модуля усредняются по этим значениям
+    await db.run_sync(record_test_score, result)
+    await db.commit()
+    await db.refresh(result)
+    logger.info(
+        f"Final result: percent={result.result}, isPassed={result.isPassed}, scoreInPoints={result.scoreInPoints}")
+
+    # Пересчёт знаний по модулю/курсу (и ModulePassed) выполняется после отправки
+    # ответа: клиент узнаёт о готовности через GET /full/results/{id}/knowledge.
+    background_tasks.add_task(run_knowledge_job, result.id)
+
+    recommendations = await db.run_sync(_build_recommendations, test, grading, duration_in_minutes)
 
     return {
         "score": result.scoreInPoints,
         "percent": result.result,
         "passed": result.isPassed,
         "attempts": attempts_count + 1,
-        "recommendations": recommendations,  # Добавить рекомендации
-        "module_knowledge": computed_knowledge,
-        "course_knowledge": computed_course_knowledge,
+        "recommendations": recommendations,
+        "result_id": result.id,
+        "knowledge_ready": False,
+        "module_knowledge": None,
+        "course_knowledge": None,
     }
 
 
@@ -935,7 +975,6 @@ def create_user_answer(payload: UserAnswerCreate, current=Depends(get_current_us
         raise HTTPException(
             status_code=403, detail="Cannot create answers for other users")
     ua = UserAnswerModel()
-    ua.id = generate_unique_id(db, UserAnswerModel)
     ua.userId = payload.userId
     ua.testResultId = payload.testResultId
     ua.questionId = payload.questionId
@@ -989,10 +1028,55 @@ def my_answers(current=Depends(get_current_user), db: Session = Depends(get_db))
     response_model=list[UserAnswerRead],
     dependencies=[Depends(require_role("admin"))],
     summary="Список всех ответов",
-    description="Возвращает все записи UserAnswer. Только для администраторов.",
+    description="Возвращает записи UserAnswer. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.",
 )
-def admin_list_answers(db: Session = Depends(get_db)):
-    return db.query(UserAnswerModel).all()
+def admin_list_answers(
+    response: Response,
+    userId: int | None = None,
+    testResultId: int | None = None,
+    questionId: int | None = None,
+    after_id: int | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    query = db.query(UserAnswerModel)
+    if userId is not None:
+        query = query.filter(UserAnswerModel.userId == userId)
+    if testResultId is not None:
+        query = query.filter(UserAnswerModel.testResultId == testResultId)
+    if questionId is not None:
+        query = query.filter(UserAnswerModel.questionId == questionId)
+    return _keyset_page(query, UserAnswerModel, after_id, limit, response)
+
+
+@router.get(
+    "/admin/answers/export",
+    dependencies=[Depends(require_role("admin"))],
+    summary="Выгрузка ответов пользователей",
+    description="Потоково выгружает записи UserAnswer в формате NDJSON или CSV (format=ndjson|csv) "
+    "с теми же фильтрами, что и список. Только для администраторов.",
+)
+def admin_export_answers(
+    format: str = "ndjson",
+    userId: int | None = None,
+    testResultId: int | None = None,
+    questionId: int | None = None,
+):
+    stmt = select(
+        UserAnswerModel.id,
+        UserAnswerModel.userId,
+        UserAnswerModel.testResultId,
+        UserAnswerModel.questionId,
+        UserAnswerModel.isCorrect,
+        UserAnswerModel.timeSpentInMinutes,
+    ).order_by(UserAnswerModel.id)
+    if userId is not None:
+        stmt = stmt.where(UserAnswerModel.userId == userId)
+    if testResultId is not None:
+        stmt = stmt.where(UserAnswerModel.testResultId == testResultId)
+    if questionId is not None:
+        stmt = stmt.where(UserAnswerModel.questionId == questionId)
+    return export_response(stmt, format, "answers")
 
 
 @router.get(
@@ -1028,7 +1112,7 @@ def admin_delete_answer(ua_id: int, db: Session = Depends(get_db)):
     summary="Уровень знаний по модулям (мои)",
     description="Возвращает агрегированные знания пользователя по модулям.",
 )
-def my_module_knowledge(current=Depends(get_current_user), db: Session = Depends(get_db)):
+def my_module_knowledge(current=Depends(get_current_user), db: Session = Depends(get_read_db)):
     uid = int(current.id)
     return db.query(UserModuleKnowledgeModel).filter(UserModuleKnowledgeModel.userId == uid).all()
 
@@ -1038,10 +1122,22 @@ def my_module_knowledge(current=Depends(get_current_user), db: Session = Depends
     response_model=list[UserModuleKnowledgeRead],
     dependencies=[Depends(require_role("admin"))],
     summary="Список знаний по модулям",
-    description="Возвращает все записи UserModuleKnowledge. Только для администраторов.",
+    description="Возвращает записи UserModuleKnowledge. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.",
 )
-def admin_list_module_knowledge(db: Session = Depends(get_db)):
-    return db.query(UserModuleKnowledgeModel).all()
+def admin_list_module_knowledge(
+    response: Response,
+    userId: int | None = None,
+    moduleId: int | None = None,
+    after_id: int | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    query = db.query(UserModuleKnowledgeModel)
+    if userId is not None:
+        query = query.filter(UserModuleKnowledgeModel.userId == userId)
+    if moduleId is not None:
+        query = query.filter(UserModuleKnowledgeModel.moduleId == moduleId)
+    return _keyset_page(query, UserModuleKnowledgeModel, after_id, limit, response)
 
 
 @router.get(
@@ -1065,27 +1161,8 @@ def admin_get_module_knowledge(umk_id: int, db: Session = Depends(get_db)):
     summary="Создать/обновить UserModuleKnowledge",
 )
 def admin_create_module_knowledge(payload: UserModuleKnowledgeCreate, db: Session = Depends(get_db)):
-    existing = (
-        db.query(UserModuleKnowledgeModel)
-        .filter(UserModuleKnowledgeModel.userId == payload.userId, UserModuleKnowledgeModel.moduleId == payload.moduleId)
-        .first()
-    )
-    if existing:
-        existing.knowledge = payload.knowledge
-        existing.lastUpdated = date.today()
-        db.add(existing)
-        db.commit()
-        db.refresh(existing)
-        return existing
-    umk = UserModuleKnowledgeModel()
-    umk.id = generate_unique_id(db, UserModuleKnowledgeModel)
-    umk.userId = payload.userId
-    umk.moduleId = payload.moduleId
-    umk.knowledge = payload.knowledge
-    umk.lastUpdated = date.today()
-    db.add(umk)
+    umk = upsert_module_knowledge(db, payload.userId, payload.moduleId, payload.knowledge)
     db.commit()
-    db.refresh(umk)
     return umk
 
 
@@ -1094,7 +1171,7 @@ def admin_create_module_knowledge(payload: UserModuleKnowledgeCreate, db: Sessio
     response_model=list[UserCourseKnowledgeRead],
     summary="Уровень знаний по курсам (мои)",
 )
-def my_course_knowledge(current=Depends(get_current_user), db: Session = Depends(get_db)):
+def my_course_knowledge(current=Depends(get_current_user), db: Session = Depends(get_read_db)):
     uid = int(current.id)
     return db.query(UserCourseKnowledgeModel).filter(UserCourseKnowledgeModel.userId == uid).all()
 
@@ -1104,9 +1181,22 @@ def my_course_knowledge(current=Depends(get_current_user), db: Session = Depends
     response_model=list[UserCourseKnowledgeRead],
     dependencies=[Depends(require_role("admin"))],
     summary="Список знаний по курсам",
+    description="Возвращает записи UserCourseKnowledge. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.",
 )
-def admin_list_course_knowledge(db: Session = Depends(get_db)):
-    return db.query(UserCourseKnowledgeModel).all()
+def admin_list_course_knowledge(
+    response: Response,
+    userId: int | None = None,
+    courseId: int | None = None,
+    after_id: int | None = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+):
+    query = db.query(UserCourseKnowledgeModel)
+    if userId is not None:
+        query = query.filter(UserCourseKnowledgeModel.userId == userId)
+    if courseId is not None:
+        query = query.filter(UserCourseKnowledgeModel.courseId == courseId)
+    return _keyset_page(query, UserCourseKnowledgeModel, after_id, limit, response)
 
 
 @router.get(
@@ -1128,27 +1218,8 @@ def admin_get_course_knowledge(uck_id: int, db: Session = Depends(get_db)):
     dependencies=[Depends(require_role("admin"))],
 )
 def admin_create_course_knowledge(payload: UserCourseKnowledgeCreate, db: Session = Depends(get_db)):
-    existing = (
-        db.query(UserCourseKnowledgeModel)
-        .filter(UserCourseKnowledgeModel.userId == payload.userId, UserCourseKnowledgeModel.courseId == payload.courseId)
-        .first()
-    )
-    if existing:
-        existing.knowledge = payload.knowledge
-        existing.lastUpdated = date.today()
-        db.add(existing)
-        db.commit()
-        db.refresh(existing)
-        return existing
-    uck = UserCourseKnowledgeModel()
-    uck.id = generate_unique_id(db, UserCourseKnowledgeModel)
-    uck.userId = payload.userId
-    uck.courseId = payload.courseId
-    uck.knowledge = payload.knowledge
-    uck.lastUpdated = date.today()
-    db.add(uck)
+    uck = upsert_course_knowledge(db, payload.userId, payload.courseId, payload.knowledge)
     db.commit()
-    db.refresh(uck)
     return uck
 
 
@@ -1159,7 +1230,7 @@ def admin_create_course_knowledge(payload: UserCourseKnowledgeCreate, db: Sessio
     summary="Статусы знаний студентов по курсу (для преподавателя)",
     description="Возвращает уровень знаний всех студентов по курсу. Доступно только автору курса (преподавателю).",
 )
-def teacher_list_students_course_knowledge(course_id: int, current=Depends(get_current_user), db: Session = Depends(get_db)):
+def teacher_list_students_course_knowledge(course_id: int, current=Depends(get_current_user), db: Session = Depends(get_read_db)):
     # only the course author (teacher) or admin can view
     course = db.get(CourseModel, course_id)
     if not course:
@@ -1186,7 +1257,7 @@ def teacher_list_students_course_knowledge(course_id: int, current=Depends(get_c
     dependencies=[Depends(require_role("teacher"))],
     summary="Уровень знаний конкретного студента по курсу (для преподавателя)",
 )
-def teacher_get_student_course_knowledge(course_id: int, user_id: int, current=Depends(get_current_user), db: Session = Depends(get_db)):
+def teacher_get_student_course_knowledge(course_id: int, user_id: int, current=Depends(get_current_user), db: Session = Depends(get_read_db)):
     course = db.get(CourseModel, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
@@ -1210,7 +1281,7 @@ def teacher_get_student_course_knowledge(course_id: int, user_id: int, current=D
     dependencies=[Depends(require_role("teacher"))],
     summary="Уровень знаний студента по модулю (для преподавателя)",
 )
-def teacher_get_student_module_knowledge(module_id: int, user_id: int, current=Depends(get_current_user), db: Session = Depends(get_db)):
+def teacher_get_student_module_knowledge(module_id: int, user_id: int, current=Depends(get_current_user), db: Session = Depends(get_read_db)):
     module = db.get(ModuleModel, module_id)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
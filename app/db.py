@@ -1,16 +1,245 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import threading
+import time
 
 db_name = os.getenv('POSTGRES_DB') or os.getenv('POSTGRES_DB_NAME') or 'tests'
 #DATABASE_URL = f"postgresql://{os.getenv('POSTGRES_USER','postgres')}:{os.getenv('POSTGRES_PASSWORD','1234')}@{os.getenv('POSTGRES_HOST','db')}:{os.getenv('POSTGRES_PORT','5432')}/{db_name}"
 DATABASE_URL = f"postgresql://{os.getenv('POSTGRES_USER','postgres')}:{os.getenv('POSTGRES_PASSWORD','1234')}@{os.getenv('POSTGRES_HOST','localhost')}:{os.getenv('POSTGRES_PORT','5432')}/{db_name}"
-engine = create_engine(DATABASE_URL, future=True)
+# Same database through asyncpg for the async endpoints
+ASYNC_DATABASE_URL = DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+# Optional read replica for read-only endpoints (unset = read from the primary)
+REPLICA_HOST = os.getenv('POSTGRES_REPLICA_HOST')
+REPLICA_DATABASE_URL = (
+    f"postgresql://{os.getenv('POSTGRES_USER','postgres')}:{os.getenv('POSTGRES_PASSWORD','1234')}@{REPLICA_HOST}:{os.getenv('POSTGRES_REPLICA_PORT') or os.getenv('POSTGRES_PORT','5432')}/{os.getenv('POSTGRES_REPLICA_DB') or db_name}"
+    if REPLICA_HOST else None
+)
+# Seconds after a write during which the writer's reads stay on the primary
+# (read-your-writes); should exceed the usual replication lag.
+REPLICA_MAX_LAG = float(os.getenv('POSTGRES_REPLICA_MAX_LAG', '5'))
+
+# Connection pool settings
+POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', '5'))
+POOL_MAX_OVERFLOW = int(os.getenv('POSTGRES_POOL_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', '30'))  # seconds to wait for a free connection
+POOL_RECYCLE = int(os.getenv('POSTGRES_POOL_RECYCLE', '1800'))  # seconds, -1 disables
+POOL_PRE_PING = os.getenv('POSTGRES_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no')
+STATEMENT_TIMEOUT_MS = int(os.getenv('POSTGRES_STATEMENT_TIMEOUT_MS', '0'))  # 0 = server default
+
+
+class PoolStats:
+    """Counters of connection checkouts from the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_peak = 0
+
+    def record(self, wait: float, overflow: int, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.overflow_peak = max(self.overflow_peak, overflow)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': (self.wait_total / self.checkouts * 1000.0) if self.checkouts else 0.0,
+                'wait_max_ms': self.wait_max * 1000.0,
+                'overflow_peak': self.overflow_peak,
+            }
+
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+replica_pool_stats = PoolStats()
+async_replica_pool_stats = PoolStats()
+
+
+class _InstrumentedPoolMixin:
+    """Records how long every checkout waited for a connection.
+
+    The measured time includes opening a new connection when the pool grows.
+    """
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.record(time.perf_counter() - started, max(self.overflow(), 0), timed_out)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    stats = pool_stats
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = async_pool_stats
+
+
+class InstrumentedReplicaQueuePool(_InstrumentedPoolMixin, QueuePool):
+    stats = replica_pool_stats
+
+
+class InstrumentedAsyncReplicaQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    stats = async_replica_pool_stats
+
+
+def _pool_state(pool, stats: PoolStats) -> dict:
+    return {
+        'size': pool.size(),
+        'max_overflow': POOL_MAX_OVERFLOW,
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+        **stats.snapshot(),
+    }
+
+
+def pool_metrics() -> dict:
+    """Current pool state plus counters collected since start.
+
+    Sync pool of the primary at the top level, its async pool under 'async';
+    the replica pools (if a replica is configured) under 'replica' in the same shape.
+    """
+    metrics = {
+        **_pool_state(engine.pool, pool_stats),
+        'async': _pool_state(async_engine.sync_engine.pool, async_pool_stats),
+    }
+    if read_engine is not engine:
+        metrics['replica'] = {
+            **_pool_state(read_engine.pool, replica_pool_stats),
+            'async': _pool_state(async_read_engine.sync_engine.pool, async_replica_pool_stats),
+        }
+    return metrics
+
+
+connect_args = {}
+if STATEMENT_TIMEOUT_MS > 0:
+    connect_args['options'] = f'-c statement_timeout={STATEMENT_TIMEOUT_MS}'
+
+async_connect_args = {}
+if STATEMENT_TIMEOUT_MS > 0:
+    async_connect_args['server_settings'] = {'statement_timeout': str(STATEMENT_TIMEOUT_MS)}
+
+_pool_options = dict(
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_recycle=POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+)
+
+engine = create_engine(
+    DATABASE_URL,
+    future=True,
+    poolclass=InstrumentedQueuePool,
+    connect_args=connect_args,
+    **_pool_options,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncQueuePool,
+    connect_args=async_connect_args,
+    **_pool_options,
+)
+# expire_on_commit=False: loaded attributes stay usable after commit without
+# an implicit (and in async code, forbidden) lazy refresh.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if REPLICA_DATABASE_URL:
+    read_engine = create_engine(
+        REPLICA_DATABASE_URL,
+        future=True,
+        poolclass=InstrumentedReplicaQueuePool,
+        connect_args=connect_args,
+        **_pool_options,
+    )
+    async_read_engine = create_async_engine(
+        REPLICA_DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1),
+        poolclass=InstrumentedAsyncReplicaQueuePool,
+        connect_args=async_connect_args,
+        **_pool_options,
+    )
+else:
+    read_engine = engine
+    async_read_engine = async_engine
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+# user_id -> monotonic time until which the user's reads go to the primary.
+# In-process only: with several workers a write is guaranteed visible to
+# later reads of the same worker; other workers fall back to the lag of the replica.
+_recent_writers: dict[int, float] = {}
+_recent_writers_lock = threading.Lock()
+
+
+def mark_user_write(user_id: int) -> None:
+    """Route the user's reads to the primary for the next REPLICA_MAX_LAG seconds."""
+    if read_engine is engine:
+        return
+    with _recent_writers_lock:
+        _recent_writers[user_id] = time.monotonic() + REPLICA_MAX_LAG
+
+
+def reads_from_primary(user_id: int | None) -> bool:
+    if read_engine is engine:
+        return True
+    if user_id is None:
+        return False
+    now = time.monotonic()
+    with _recent_writers_lock:
+        until = _recent_writers.get(user_id)
+        if until is not None and until <= now:
+            del _recent_writers[user_id]
+            until = None
+    return until is not None
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_read_db_for(user_id: int | None = None):
+    """Sync session for read-only work: the replica unless the user has just written."""
+    db = SessionLocal() if reads_from_primary(user_id) else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db_for(user_id: int | None = None):
+    """Async session for read-only work: the replica unless the user has just written."""
+    factory = AsyncSessionLocal if reads_from_primary(user_id) else AsyncReadSessionLocal
+    async with factory() as db:
+        yield db
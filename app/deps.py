@@ -1,12 +1,29 @@
-from fastapi import Depends, HTTPException
+import os
+import threading
+import time
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from .db import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .db import get_async_db, get_async_read_db_for, get_read_db_for
 from .models import User as UserModel, Role as RoleModel
 from .auth import decode_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/users/login-form')
 
+# Trust the signed claims of the token (role, login, name) instead of loading
+# the user on every request. Deleted users and role changes are still noticed
+# through a small per-user cache refreshed every AUTH_USER_CHECK_TTL seconds.
+AUTH_STATELESS = os.getenv('AUTH_STATELESS', '1').lower() not in ('0', 'false', 'no')
+AUTH_USER_CHECK_TTL = float(os.getenv('AUTH_USER_CHECK_TTL', '30'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+
+# user_id -> (expires_at, exists, roleId), oldest first
+_user_state_cache: dict[int, tuple[float, bool, int | None]] = {}
+_user_state_lock = threading.Lock()
+
 class CurrentUser:
     def __init__(self, id: int, role_id: int | None, role: str | None, login: str | None, name: str | None, surname: str | None):
         self.id = id
@@ -16,7 +33,33 @@ class CurrentUser:
         self.name = name
         self.surname = surname
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CurrentUser:
+async def _user_state(db: AsyncSession, user_id: int) -> tuple[bool, int | None]:
+    """Return (exists, roleId) of a user, cached for AUTH_USER_CHECK_TTL seconds."""
+    now = time.monotonic()
+    with _user_state_lock:
+        cached = _user_state_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+    row = (await db.execute(select(UserModel.roleId).where(UserModel.id == user_id))).first()
+    exists = row is not None
+    role_id = row.roleId if row else None
+    with _user_state_lock:
+        _user_state_cache.pop(user_id, None)
+        _user_state_cache[user_id] = (now + AUTH_USER_CHECK_TTL, exists, role_id)
+        # все записи живут одинаковый TTL, поэтому просроченные всегда в начале словаря
+        while _user_state_cache:
+            oldest = next(iter(_user_state_cache))
+            if len(_user_state_cache) <= AUTH_USER_CACHE_SIZE and _user_state_cache[oldest][0] > now:
+                break
+            del _user_state_cache[oldest]
+    return exists, role_id
+
+def forget_user(user_id: int) -> None:
+    """Drop the cached state of a user after its role changed or it was deleted."""
+    with _user_state_lock:
+        _user_state_cache.pop(user_id, None)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
     payload = decode_token(token)
     if not payload or 'sub' not in payload:
         raise HTTPException(status_code=401, detail='Invalid token')
@@ -28,32 +71,64 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     name = payload.get('name')
     surname = payload.get('surname')
 
+    if AUTH_STATELESS and role_name is not None and login is not None:
+        # Подпись токена проверена — доверяем claims; в БД сверяем только то,
+        # что пользователь существует и его роль не менялась (с кэшем).
+        exists, current_role_id = await _user_state(db, user_id)
+        if not exists:
+            raise HTTPException(status_code=401, detail='User not found')
+        if current_role_id != role_id:
+            raise HTTPException(status_code=401, detail='Token is outdated')
+        return CurrentUser(id=user_id, role_id=role_id, role=role_name, login=login, name=name, surname=surname)
+
     # Basic verification: ensure user exists in DB
-    user = db.get(UserModel, user_id)
+    user = await db.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=401, detail='User not found')
 
     # If token lacks role name but user has roleId, try to fetch role name
     if not role_name and getattr(user, 'roleId', None):
-        r = db.get(RoleModel, user.roleId)
+        r = await db.get(RoleModel, user.roleId)
         role_name = r.name if r else None
 
     return CurrentUser(id=user_id, role_id=role_id or getattr(user, 'roleId', None), role=role_name, login=login or user.login, name=name or user.name, surname=surname or user.surname)
 
 def require_role(role_name: str):
-    def inner(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+    async def inner(current_user=Depends(get_current_user)):
         # Use role info from token/current_user first
         if current_user.role is not None:
             if current_user.role != role_name:
                 raise HTTPException(status_code=403, detail='Insufficient role')
             return current_user
 
-        # Fall back to DB lookup
+        # Fall back to the role names compiled by app/rbac.py instead of a query
         if current_user.roleId is None:
             raise HTTPException(status_code=403, detail='No role assigned')
-        role = db.get(RoleModel, current_user.roleId)
-        if not role or role.name != role_name:
+        from .rbac import current as compiled_permissions  # rbac depends on this module
+
+        # a stale snapshot is reloaded with a blocking query: keep it off the event loop
+        compiled = await run_in_threadpool(compiled_permissions)
+        if compiled.role_ids.get(role_name) != int(current_user.roleId):
             raise HTTPException(status_code=403, detail='Insufficient role')
         return current_user
 
     return inner
+
+def request_user_id(request: Request) -> int | None:
+    """User id from a valid bearer token of the request, without touching the database."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    payload = decode_token(token)
+    try:
+        return int(payload['sub']) if payload else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def get_read_db(request: Request):
+    """Read-only session: replica, or the primary right after this user wrote something."""
+    yield from get_read_db_for(request_user_id(request))
+
+async def get_async_read_db(request: Request):
+    async for db in get_async_read_db_for(request_user_id(request)):
+        yield db
@@ -0,0 +1,71 @@
+"""Streaming NDJSON/CSV exports.
+
+Rows are read through a server-side cursor (``yield_per``) and written to the
+response one batch at a time, so memory use does not depend on the size of
+the export. The generator opens and closes its own session: the request
+session from ``get_db`` is already closed while a ``StreamingResponse`` is
+being sent.
+"""
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Iterator
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from .db import ReadSessionLocal, SessionLocal, reads_from_primary
+
+# Rows fetched from the cursor (and written to the response) per round trip
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "2000"))
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_lines(columns: list[str], rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n" for row in rows
+    )
+
+
+def _csv_lines(rows) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerows([_plain(v) for v in row] for row in rows)
+    return buf.getvalue()
+
+
+def iter_export(stmt: Select, fmt: str, user_id: int | None = None) -> Iterator[str]:
+    """Yield `stmt` rows as NDJSON lines or CSV (with a header row)."""
+    db = SessionLocal() if reads_from_primary(user_id) else ReadSessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        if fmt == "csv":
+            yield _csv_lines([columns])
+        for batch in result.partitions():
+            yield _csv_lines(batch) if fmt == "csv" else _ndjson_lines(columns, batch)
+    finally:
+        db.close()
+
+
+def export_response(stmt: Select, fmt: str, filename: str, user_id: int | None = None) -> StreamingResponse:
+    """StreamingResponse with the rows of `stmt`; `fmt` is "ndjson" or "csv"."""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    return StreamingResponse(
+        iter_export(stmt, fmt, user_id),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,171 @@
+"""Single-pass grading of test submissions.
+
+The answer key of a test (weights, correct option ids, normalized open
+answers) is built once per course tree version from the cached snapshot
+(`answer_key_from_tree`), or loaded with two queries for tests outside a
+course. Every submitted answer is then graded with dict and set lookups
+exactly once. The result carries both the score and the per-question outcomes
+that `submit_test` persists as `UserAnswer` rows.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from .cache import CourseTree
+from .models import Answer as AnswerModel, Question as QuestionModel
+from .utils import TestScoreBreakdown, question_points, score_breakdown, time_factor_for
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class KeyQuestion:
+    id: int
+    # id as it appears in a JSON body (object keys are strings)
+    json_key: str
+    question_type: str
+    topic_id: int | None
+    points: float
+    # ids of every answer option of the question (closed questions)
+    option_ids: frozenset[int]
+    correct_ids: frozenset[int]
+    # normalized texts of the correct answers (open questions)
+    accepted_texts: frozenset[str]
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    test_id: int
+    questions: tuple[KeyQuestion, ...]
+
+
+@dataclass(slots=True)
+class GradedQuestion:
+    question: KeyQuestion
+    answered: bool
+    is_correct: bool
+    # False when the submitted value is unusable (not an id, foreign option):
+    # such answers are not stored as UserAnswer rows.
+    recorded: bool
+
+
+@dataclass
+class GradingResult:
+    graded: list[GradedQuestion]
+    correct: int
+    total: int
+    breakdown: TestScoreBreakdown
+
+    @property
+    def raw_percent(self) -> int:
+        return int((self.correct / self.total) * 100) if self.total else 0
+
+
+def normalize_open_answer(text: Any) -> str:
+    """Normalize an open answer: trim whitespace and ignore case."""
+    if not isinstance(text, str):
+        text = str(text)
+    return text.strip().lower()
+
+
+def build_answer_key(test_id: int, questions, answers) -> AnswerKey:
+    """Build an answer key from already loaded Question and Answer rows."""
+    answers_by_question: dict[int, list] = {}
+    for answer in answers:
+        answers_by_question.setdefault(answer.questionId, []).append(answer)
+
+    key_questions = []
+    for question in questions:
+        options = answers_by_question.get(question.id, [])
+        correct = [a for a in options if a.isCorrect]
+        key_questions.append(
+            KeyQuestion(
+                id=question.id,
+                json_key=str(question.id),
+                question_type=question.questionType,
+                topic_id=question.topicId,
+                points=question_points(question),
+                option_ids=frozenset(a.id for a in options),
+                correct_ids=frozenset(a.id for a in correct),
+                accepted_texts=frozenset(normalize_open_answer(a.text) for a in correct),
+            )
+        )
+    return AnswerKey(test_id=test_id, questions=tuple(key_questions))
+
+
+def answer_key_from_tree(tree: CourseTree, test_id: int) -> AnswerKey | None:
+    """Answer key of a test of the course snapshot, built once per tree version.
+
+    Question and Answer writes bump the tree version, so a cached key never
+    outlives the data it was built from. None if the test is not in the course.
+    """
+    cache_key = ("answer_key", test_id)
+    key = tree.derived.get(cache_key)
+    if key is None:
+        test = tree.test(test_id)
+        if test is None:
+            return None
+        key = build_answer_key(test_id, test.questions, [a for q in test.questions for a in q.answers])
+        tree.derived[cache_key] = key
+    return key
+
+
+def load_answer_key(db: Session, test_id: int) -> AnswerKey:
+    """Load questions and answers of a test in two queries."""
+    questions = db.query(QuestionModel).filter(QuestionModel.testId == test_id).all()
+    answers = []
+    if questions:
+        answers = (
+            db.query(AnswerModel)
+            .filter(AnswerModel.questionId.in_([q.id for q in questions]))
+            .all()
+        )
+    return build_answer_key(test_id, questions, answers)
+
+
+def _provided_answer(answers: dict, question: KeyQuestion) -> Any | None:
+    # JSON-ключи всегда строки, int-ключи — при вызове из Python
+    provided = answers.get(question.json_key)
+    if provided is None:
+        provided = answers.get(question.id)
+    return provided
+
+
+def grade_question(question: KeyQuestion, provided: Any | None) -> GradedQuestion:
+    if provided is None:
+        # Незаполненный ответ считается неправильным
+        return GradedQuestion(question=question, answered=False, is_correct=False, recorded=True)
+
+    if question.question_type == 'open':
+        is_correct = normalize_open_answer(provided) in question.accepted_texts
+        return GradedQuestion(question=question, answered=True, is_correct=is_correct, recorded=True)
+
+    try:
+        answer_id = int(provided)
+    except Exception:
+        logger.warning(f"Failed to convert answer to int for question {question.id}: {provided}")
+        return GradedQuestion(question=question, answered=True, is_correct=False, recorded=False)
+    if answer_id not in question.option_ids:
+        logger.warning(f"Answer {answer_id} does not belong to question {question.id}")
+        return GradedQuestion(question=question, answered=True, is_correct=False, recorded=False)
+    return GradedQuestion(
+        question=question,
+        answered=True,
+        is_correct=answer_id in question.correct_ids,
+        recorded=True,
+    )
+
+
+def grade_submission(key: AnswerKey, answers: Any, expected_minutes: float, actual_minutes: float) -> GradingResult:
+    """Grade every question of the key once and compute the weighted score."""
+    if not isinstance(answers, dict):
+        answers = {}
+    graded = [grade_question(q, _provided_answer(answers, q)) for q in key.questions]
+    correct = sum(1 for g in graded if g.is_correct)
+    breakdown = score_breakdown(
+        ((g.question.points, g.is_correct) for g in graded),
+        time_factor_for(expected_minutes, actual_minutes),
+    )
+    return GradingResult(graded=graded, correct=correct, total=len(graded), breakdown=breakdown)
@@ -0,0 +1,362 @@
+"""Collision-free primary key allocation.
+
+Every generated id fits in Postgres BIGINT and in JavaScript's safe integer
+range (2**53 - 1), and no SELECT is needed to check it is free.
+
+Two allocators are available, selected with ``ID_ALLOCATOR``:
+
+- ``snowflake`` (default): ``timestamp | worker | sequence`` packed into 53
+  bits and computed in-process. Ids grow with creation time, so ordering by
+  ``id`` still means "older first" (modules of a course rely on it). The
+  worker id comes from ``ID_WORKER_ID`` or is leased once per process; either
+  way the slot is held with a Postgres advisory lock on a connection kept
+  open for the life of the process, so two live processes never share it.
+  Ids never run ahead of the wall clock: when a millisecond's sequence is
+  used up, or the clock steps back, ``next_id`` waits. Each slot also keeps a
+  high-water mark in ``lms_id_worker_slots``, reserved ahead of use, so a
+  process that leases the slot after its holder died waits until the clock
+  is past every id the dead process could have issued.
+- ``sequence``: blocks of ids prefetched from the ``lms_id_seq`` sequence
+  (one ``nextval`` per block, block size = the sequence increment). Ids are
+  unique but only ordered within a process.
+
+Async handlers use ``anext_id``: the block refill runs in the thread pool,
+and the worker slot is leased by the app's start-up hook.
+
+Do not switch allocators on a live database without moving ``lms_id_seq``
+past the largest existing id.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Protocol
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+# Keep IDs within JavaScript's integer precision so Swagger/UI clients display them correctly.
+MAX_SAFE_ID = (1 << 53) - 1
+
+# Above every id the former microsecond-based generator produced, so new rows
+# still sort after old ones.
+ID_BASE = 1 << 51
+ID_EPOCH_MS = 1767225600000  # 2026-01-01T00:00:00Z
+
+WORKER_BITS = 6
+SEQUENCE_BITS = 6
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+# First key of pg_try_advisory_lock(int, int); the second one is the worker slot
+WORKER_LOCK_NAMESPACE = 0x4C4D5357  # 'LMSW'
+_SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+# A leased slot reserves its high-water mark this far ahead of the clock (and
+# renews it every third of that); ids are never issued past the reservation.
+ID_RESERVE_MS = int(os.getenv('ID_RESERVE_MS', '3000'))
+# Longest wait for the clock (stepped back, reservation not renewed, previous
+# holder's mark ahead) before ClockBehindError is raised.
+ID_CLOCK_MAX_WAIT_MS = int(os.getenv('ID_CLOCK_MAX_WAIT_MS', '10000'))
+
+logger = logging.getLogger(__name__)
+
+
+def _clock_ms(clock) -> int:
+    """Wall time in ms since ID_EPOCH_MS."""
+    return int(clock() * 1000) - ID_EPOCH_MS
+
+
+class IdAllocator(Protocol):
+    def next_id(self) -> int:
+        ...
+
+    async def anext_id(self) -> int:
+        ...
+
+
+class ClockBehindError(RuntimeError):
+    pass
+
+
+class SnowflakeAllocator:
+    """In-process time-ordered ids: 64 workers x 64 ids per millisecond."""
+
+    def __init__(self, worker_id: int, clock=time.time, lease: "WorkerLease | None" = None):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be in [0, {MAX_WORKER_ID}]")
+        self.worker_id = worker_id
+        self._clock = clock
+        self._lease = lease
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self) -> int:
+        with self._lock:
+            ms = self._wait_for_ms()
+            if ms == self._last_ms:
+                self._sequence += 1
+            else:
+                self._sequence = 0
+            self._last_ms = ms
+            sequence = self._sequence
+
+        value = ID_BASE + ((ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | sequence)
+        if value > MAX_SAFE_ID:
+            raise OverflowError("Snowflake id space exhausted")
+        return value
+
+    async def anext_id(self) -> int:
+        # no I/O: at most a sub-millisecond wait for the next clock tick
+        return self.next_id()
+
+    def _wait_for_ms(self) -> int:
+        """The current millisecond once it can be used (called under self._lock).
+
+        Future milliseconds are never borrowed: with the sequence used up, the
+        clock behind the last issued id or past the slot's reservation, this
+        waits for the clock instead.
+        """
+        deadline = None
+        while True:
+            if self._lease is not None and self._lease.closed:
+                raise RuntimeError(f"Snowflake worker slot {self.worker_id} was released")
+            ms = _clock_ms(self._clock)
+            if ms > self._last_ms or (ms == self._last_ms and self._sequence < _SEQUENCE_MASK):
+                if self._lease is None or ms <= self._lease.high_water_ms:
+                    return ms
+            if deadline is None:
+                deadline = time.monotonic() + ID_CLOCK_MAX_WAIT_MS / 1000
+            elif time.monotonic() > deadline:
+                raise ClockBehindError(
+                    f"Snowflake worker {self.worker_id}: clock at {ms} ms, last id at {self._last_ms} ms, "
+                    f"reserved up to {self._lease.high_water_ms if self._lease else '-'} ms"
+                )
+            time.sleep(0.0002)
+
+    def close(self) -> None:
+        """Release the leased slot, keeping the last issued millisecond as its mark."""
+        with self._lock:
+            if self._lease is not None and not self._lease.closed:
+                self._lease.release(self._last_ms)
+
+
+class SequenceBlockAllocator:
+    """Ids prefetched in blocks from a Postgres sequence."""
+
+    def __init__(self, engine, sequence: str = 'lms_id_seq'):
+        self._engine = engine
+        self._sequence = sequence
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0  # exclusive
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._fetch_block()
+            value = self._next
+            self._next += 1
+        if value > MAX_SAFE_ID:
+            raise OverflowError("Id sequence left the JavaScript safe range")
+        return value
+
+    async def anext_id(self) -> int:
+        # the refill's nextval runs in the thread pool, not in the event loop
+        while True:
+            with self._lock:
+                if self._next < self._end:
+                    value = self._next
+                    self._next += 1
+                    break
+            block = await run_in_threadpool(self._fetch_block)
+            with self._lock:
+                # another coroutine may have refilled meanwhile; the spare block is just a gap
+                if self._next >= self._end:
+                    self._next, self._end = block
+        if value > MAX_SAFE_ID:
+            raise OverflowError("Id sequence left the JavaScript safe range")
+        return value
+
+    def _fetch_block(self) -> tuple[int, int]:
+        with self._engine.connect() as conn:
+            start = conn.execute(text("SELECT nextval(:seq)"), {'seq': self._sequence}).scalar_one()
+            block = conn.execute(
+                text("SELECT increment_by FROM pg_sequences WHERE sequencename = :seq"),
+                {'seq': self._sequence},
+            ).scalar_one()
+        return int(start), int(start) + int(block)
+
+
+class WorkerSlotsExhausted(RuntimeError):
+    pass
+
+
+class WorkerLease:
+    """A locked worker slot and its high-water mark in lms_id_worker_slots.
+
+    `high_water_ms` (ms since ID_EPOCH_MS) is persisted before any id up to
+    it is issued and pushed forward by a daemon thread. The connection holds
+    the slot's advisory lock, so it stays open until `release`.
+    """
+
+    def __init__(self, conn, worker_id: int, clock=time.time):
+        self.conn = conn
+        self.worker_id = worker_id
+        self.high_water_ms = -1
+        self.closed = False
+        self._clock = clock
+        self._lock = threading.Lock()  # the connection is shared with the renewal thread
+        self._stop = threading.Event()
+
+    def _store(self, high_water_ms: int, *, lower: bool = False) -> None:
+        # called with self._lock held
+        self.conn.execute(
+            text(
+                "INSERT INTO lms_id_worker_slots (worker_id, high_water_ms) VALUES (:slot, :ms) "
+                "ON CONFLICT (worker_id) DO UPDATE SET high_water_ms = "
+                + ("EXCLUDED.high_water_ms" if lower else "GREATEST(lms_id_worker_slots.high_water_ms, EXCLUDED.high_water_ms)")
+            ),
+            {'slot': self.worker_id, 'ms': high_water_ms},
+        )
+        self.conn.commit()
+
+    def extend(self) -> None:
+        """Reserve ID_RESERVE_MS ahead of the clock (persisted before it is used)."""
+        with self._lock:
+            if self.closed:
+                return
+            high_water_ms = _clock_ms(self._clock) + ID_RESERVE_MS
+            self._store(high_water_ms)
+            self.high_water_ms = max(self.high_water_ms, high_water_ms)
+
+    def _renew(self) -> None:
+        while not self._stop.wait(ID_RESERVE_MS / 3000):
+            try:
+                self.extend()
+            except Exception:
+                # next_id stops at the old mark, so a failed renewal never risks a duplicate
+                logger.exception("Could not extend the high-water mark of worker slot %s", self.worker_id)
+
+    def start_renewal(self) -> None:
+        threading.Thread(target=self._renew, name=f"id-worker-{self.worker_id}", daemon=True).start()
+
+    def release(self, last_ms: int) -> None:
+        """Lower the mark to the last issued millisecond and unlock the slot."""
+        self._stop.set()
+        with self._lock:
+            self.closed = True
+            try:
+                if last_ms >= 0:
+                    self._store(last_ms, lower=True)
+            finally:
+                self.conn.close()
+
+
+def _try_lock_slot(conn, worker_id: int) -> bool:
+    return bool(conn.execute(
+        text("SELECT pg_try_advisory_lock(:ns, :slot)"),
+        {'ns': WORKER_LOCK_NAMESPACE, 'slot': worker_id},
+    ).scalar_one())
+
+
+def lease_worker_id(engine, worker_id: int | None = None, clock=time.time) -> WorkerLease:
+    """Lock a worker slot for the lifetime of the process.
+
+    With `worker_id` only that slot is tried; otherwise the scan starts at the
+    next value of `lms_id_worker_seq` (so restarts spread over the slots) and
+    takes the first free one. Raises `WorkerSlotsExhausted` if none is free.
+    Before returning, waits until the clock is past the slot's high-water mark
+    (or raises `ClockBehindError` if that is more than ID_CLOCK_MAX_WAIT_MS away).
+    """
+    if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"worker_id must be in [0, {MAX_WORKER_ID}]")
+    # a dedicated connection outside the pool: it is held until the process exits
+    conn = create_engine(engine.url, poolclass=NullPool).connect()
+    try:
+        if worker_id is not None:
+            candidates = [worker_id]
+        else:
+            start = int(conn.execute(text("SELECT nextval('lms_id_worker_seq')")).scalar_one())
+            candidates = [(start + i) % (MAX_WORKER_ID + 1) for i in range(MAX_WORKER_ID + 1)]
+        leased = next((slot for slot in candidates if _try_lock_slot(conn, slot)), None)
+        previous_mark = None
+        if leased is not None:
+            previous_mark = conn.execute(
+                text("SELECT high_water_ms FROM lms_id_worker_slots WHERE worker_id = :slot"),
+                {'slot': leased},
+            ).scalar()
+        # session-level advisory locks survive the end of the transaction
+        conn.commit()
+        if leased is None:
+            if worker_id is not None:
+                raise WorkerSlotsExhausted(f"Snowflake worker slot {worker_id} is held by another process")
+            raise WorkerSlotsExhausted(f"All {MAX_WORKER_ID + 1} Snowflake worker slots are taken")
+        if previous_mark is not None:
+            # the previous holder may have issued ids up to its mark (it may have
+            # died without lowering it, or our clock may be behind theirs)
+            behind = int(previous_mark) - _clock_ms(clock)
+            if behind >= ID_CLOCK_MAX_WAIT_MS:
+                raise ClockBehindError(
+                    f"Snowflake worker slot {leased} has ids up to {behind} ms ahead of the system clock"
+                )
+            if behind >= 0:
+                time.sleep((behind + 1) / 1000)
+        lease = WorkerLease(conn, leased, clock)
+        lease.extend()
+    except BaseException:
+        conn.close()
+        raise
+    lease.start_renewal()
+    return lease
+
+
+_allocator: IdAllocator | None = None
+_allocator_lock = threading.Lock()
+
+
+def _create_allocator() -> IdAllocator:
+    from .db import engine  # local import: scripts may use the allocators without a configured app DB
+
+    kind = os.getenv('ID_ALLOCATOR', 'snowflake').lower()
+    if kind == 'sequence':
+        return SequenceBlockAllocator(engine)
+    if kind != 'snowflake':
+        raise ValueError(f"Unknown ID_ALLOCATOR: {kind}")
+    worker_env = os.getenv('ID_WORKER_ID')
+    lease = lease_worker_id(engine, int(worker_env) if worker_env else None)
+    allocator = SnowflakeAllocator(lease.worker_id, lease=lease)
+    # a clean exit lowers the slot's mark, so the next holder need not wait out the reservation
+    atexit.register(allocator.close)
+    return allocator
+
+
+def get_allocator() -> IdAllocator:
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = _create_allocator()
+    return _allocator
+
+
+def set_allocator(allocator: IdAllocator | None) -> None:
+    """Replace the process-wide allocator (None re-reads the configuration)."""
+    global _allocator
+    with _allocator_lock:
+        _allocator = allocator
+
+
+def next_id() -> int:
+    """Allocate a new primary key value."""
+    return get_allocator().next_id()
+
+
+async def anext_id() -> int:
+    """`next_id` for async handlers: no database round trip runs in the event loop."""
+    allocator = _allocator
+    if allocator is None:
+        # normally set up by the start-up hook; leasing a worker slot is a blocking query
+        allocator = await run_in_threadpool(get_allocator)
+    return await allocator.anext_id()
@@ -1,4 +1,10 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import Depends, FastAPI, Request
+from .db import mark_user_write, pool_metrics
+from .deps import request_user_id, require_role
+from .ids import get_allocator
+from .rbac import refresh as refresh_permissions
 from .users import router as users_router
 from .courses_full import router as courses_full_router
 from .teaching import router as teaching_router
@@ -9,6 +15,41 @@ app.include_router(teaching_router)
 app.include_router(courses_full_router)
 
 
+@app.on_event('startup')
+def compile_permissions():
+    # Права ролей собираются в битовые маски один раз, а не на каждый запрос.
+    # Без базы приложение всё равно стартует: rbac.current() загрузит их при первой проверке.
+    try:
+        refresh_permissions()
+    except Exception:
+        logging.exception('Could not compile role permissions at start-up; they will be loaded on first use')
+
+
+@app.on_event('startup')
+def lease_id_worker():
+    # Слот воркера (или первый блок id) берётся при старте, а не в async-обработчике первого запроса.
+    try:
+        get_allocator()
+    except Exception:
+        logging.exception('Could not set up the id allocator at start-up; it will be retried on first use')
+
+
+@app.middleware('http')
+async def route_reads_after_writes(request: Request, call_next):
+    response = await call_next(request)
+    # После изменяющего запроса чтения пользователя какое-то время идут на primary
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        user_id = request_user_id(request)
+        if user_id is not None:
+            mark_user_write(user_id)
+    return response
+
+
 @app.get('/')
 def root():
     return {'ok': True}
+
+
+@app.get('/metrics/db-pool', dependencies=[Depends(require_role('admin'))])
+def db_pool_metrics():
+    return pool_metrics()
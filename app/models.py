@@ -1,6 +1,6 @@
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy import Column, BigInteger, Boolean, Text, Date, ForeignKey, Integer
-from sqlalchemy import Float, DateTime
+from sqlalchemy import Float, DateTime, Sequence, UniqueConstraint
 from sqlalchemy.sql import func
 
 Base = declarative_base()
@@ -30,6 +30,8 @@ class Course(Base):
     authorId = Column(BigInteger, ForeignKey('User.id'))
     picture = Column(Text)
     isPublished = Column(Boolean, nullable=False, default=False)
+    # Bumped by every change of modules/topics/tests/questions/answers (see app/cache.py)
+    treeVersion = Column(BigInteger, nullable=False, server_default='0', default=0)
 
 class Module(Base):
     __tablename__ = 'Module'
@@ -45,6 +47,7 @@ class ModulePassed(Base):
     isPassed = Column(Boolean, nullable=False)
     userId = Column(BigInteger, ForeignKey('User.id'))
     datePassed = Column(Date)
+    __table_args__ = (UniqueConstraint('userId', 'moduleId'),)
 
 class CourseEnrollment(Base):
     __tablename__ = 'CourseEnrollment'
@@ -53,6 +56,7 @@ class CourseEnrollment(Base):
     dateEnded = Column(Date)
     courseId = Column(BigInteger, ForeignKey('Course.id'))
     userId = Column(BigInteger, ForeignKey('User.id'))
+    __table_args__ = (UniqueConstraint('userId', 'courseId'),)
 
 class Topic(Base):
     __tablename__ = 'Topic'
@@ -104,18 +108,33 @@ class TestResult(Base):
     testId = Column(BigInteger, ForeignKey('Test.id'))
     userId = Column(BigInteger, ForeignKey('User.id'))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Set once module/course knowledge has been recomputed for this attempt
+    knowledgeUpdatedAt = Column(DateTime(timezone=True))
 
 class UserAnswer(Base):
     __tablename__ = 'UserAnswer'
-    id = Column(BigInteger, primary_key=True)
+    # ids come from a DB sequence so answers of an attempt can be bulk-inserted
+    id = Column(BigInteger, Sequence('UserAnswer_id_seq'), primary_key=True)
     userId = Column(BigInteger, ForeignKey('User.id'), nullable=False)
     testResultId = Column(BigInteger, ForeignKey('TestResult.id'), nullable=False)
     questionId = Column(BigInteger, ForeignKey('Question.id'), nullable=False)
     isCorrect = Column(Boolean, nullable=False)
     timeSpentInMinutes = Column(BigInteger)
 
+class UserTestKnowledge(Base):
+    """Latest attempt score per (user, test); module knowledge averages these."""
+    __tablename__ = 'UserTestKnowledge'
+    __table_args__ = (UniqueConstraint('userId', 'testId'),)
+    id = Column(BigInteger, primary_key=True)
+    userId = Column(BigInteger, ForeignKey('User.id'), nullable=False)
+    testId = Column(BigInteger, ForeignKey('Test.id'), nullable=False)
+    testResultId = Column(BigInteger, ForeignKey('TestResult.id'), nullable=False)
+    knowledge = Column(Float, nullable=False, default=0.0)
+    lastUpdated = Column(Date)
+
 class UserModuleKnowledge(Base):
     __tablename__ = 'UserModuleKnowledge'
+    __table_args__ = (UniqueConstraint('userId', 'moduleId'),)
     id = Column(BigInteger, primary_key=True)
     userId = Column(BigInteger, ForeignKey('User.id'), nullable=False)
     moduleId = Column(BigInteger, ForeignKey('Module.id'), nullable=False)
@@ -124,6 +143,7 @@ class UserModuleKnowledge(Base):
 
 class UserCourseKnowledge(Base):
     __tablename__ = 'UserCourseKnowledge'
+    __table_args__ = (UniqueConstraint('userId', 'courseId'),)
     id = Column(BigInteger, primary_key=True)
     userId = Column(BigInteger, ForeignKey('User.id'), nullable=False)
     courseId = Column(BigInteger, ForeignKey('Course.id'), nullable=False)
@@ -0,0 +1,131 @@
+"""Course and author of authoring resources.
+
+`resolve_owner` maps the id of a course, module, topic, topic content, test,
+question or answer to its course and the course author with one query that
+joins up the chain (Answer -> Question -> Test -> Module -> Course), instead
+of a `db.get` per level. Results are cached in-process: ids are never reused,
+so an entry only goes stale when a resource moves to another course
+(`update_test`) or is deleted; those writes call `forget` / `forget_course`,
+and entries expire after ``OWNERSHIP_CACHE_TTL`` seconds so other worker
+processes pick such changes up.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import (
+    Answer as AnswerModel,
+    Course as CourseModel,
+    Module as ModuleModel,
+    Question as QuestionModel,
+    Test as TestModel,
+    Topic as TopicModel,
+    TopicContent as TopicContentModel,
+)
+
+OWNERSHIP_CACHE_TTL = float(os.environ.get("OWNERSHIP_CACHE_TTL", "60"))
+OWNERSHIP_CACHE_SIZE = int(os.environ.get("OWNERSHIP_CACHE_SIZE", "100000"))
+
+RESOURCE_KINDS = ("course", "module", "topic", "topic_content", "test", "question", "answer")
+
+
+@dataclass(frozen=True)
+class Owner:
+    course_id: int
+    author_id: int
+
+
+# (kind, resource id) -> (expires_at, owner)
+_owners: dict[tuple[str, int], tuple[float, Owner]] = {}
+_lock = threading.Lock()
+
+
+def _owner_query(kind: str, resource_id: int):
+    columns = (CourseModel.id, CourseModel.authorId)
+    if kind == "course":
+        return select(*columns).where(CourseModel.id == resource_id)
+    if kind in ("module", "topic", "topic_content"):
+        stmt = select(*columns).select_from(ModuleModel).join(CourseModel, CourseModel.id == ModuleModel.courseId)
+        if kind == "module":
+            return stmt.where(ModuleModel.id == resource_id)
+        stmt = stmt.join(TopicModel, TopicModel.moduleId == ModuleModel.id)
+        if kind == "topic":
+            return stmt.where(TopicModel.id == resource_id)
+        return stmt.join(TopicContentModel, TopicContentModel.topicId == TopicModel.id).where(
+            TopicContentModel.id == resource_id)
+    if kind not in ("test", "question", "answer"):
+        raise ValueError(f"Unknown resource kind: {kind}")
+    # итоговый тест ссылается на курс, тест модуля — на модуль (как course_id_for_test)
+    stmt = (
+        select(*columns)
+        .select_from(TestModel)
+        .outerjoin(ModuleModel, ModuleModel.id == TestModel.moduleId)
+        .join(CourseModel, CourseModel.id == func.coalesce(TestModel.courseId, ModuleModel.courseId))
+    )
+    if kind == "test":
+        return stmt.where(TestModel.id == resource_id)
+    stmt = stmt.join(QuestionModel, QuestionModel.testId == TestModel.id)
+    if kind == "question":
+        return stmt.where(QuestionModel.id == resource_id)
+    return stmt.join(AnswerModel, AnswerModel.questionId == QuestionModel.id).where(AnswerModel.id == resource_id)
+
+
+def resolve_owner(db: Session, kind: str, resource_id: int) -> Owner | None:
+    """Course and author of a resource; None if it does not exist or has no course."""
+    key = (kind, int(resource_id))
+    now = time.monotonic()
+    with _lock:
+        cached = _owners.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    row = db.execute(_owner_query(kind, resource_id)).first()
+    if row is None:
+        # промахи не кэшируются: ресурс может появиться сразу после проверки
+        return None
+    owner = Owner(course_id=int(row[0]), author_id=int(row[1]))
+    with _lock:
+        _owners.pop(key, None)
+        _owners[key] = (now + OWNERSHIP_CACHE_TTL, owner)
+        while len(_owners) > OWNERSHIP_CACHE_SIZE:
+            del _owners[next(iter(_owners))]
+    return owner
+
+
+def ensure_author(
+    db: Session,
+    kind: str,
+    resource_id: int,
+    current,
+    detail: str = "Not authorized",
+    allow_admin: bool = False,
+) -> Owner | None:
+    """Raise 403 unless the user is the author of the resource's course (or an admin, if allowed).
+
+    Resources without a course pass, as the inline checks this replaces did.
+    """
+    owner = resolve_owner(db, kind, resource_id)
+    if owner is None:
+        return None
+    if allow_admin and getattr(current, "role", None) == "admin":
+        return owner
+    if int(current.id) != owner.author_id:
+        raise HTTPException(status_code=403, detail=detail)
+    return owner
+
+
+def forget(kind: str, resource_id: int) -> None:
+    with _lock:
+        _owners.pop((kind, int(resource_id)), None)
+
+
+def forget_course(course_id: int) -> None:
+    """Drop every cached resource of a course (the course is deleted or a subtree moved out of it)."""
+    with _lock:
+        for key in [k for k, (_, owner) in _owners.items() if owner.course_id == course_id]:
+            del _owners[key]
@@ -0,0 +1,153 @@
+"""Role permissions compiled into in-memory bitsets.
+
+Every `Permissions.action` gets a bit (in order of permission id) and every
+role an integer mask of the bits granted to it in `RolePermissions`, so
+`require_permission(action)` is a dict lookup and a bitwise AND on the role
+id from the token — no query per request. The tables are loaded at start-up
+and reloaded right after admin CRUD of roles, permissions or role
+permissions; the snapshot is also reloaded once it is older than
+``RBAC_REFRESH_INTERVAL`` seconds so other worker processes pick such
+changes up.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .deps import get_current_user
+from .models import (
+    Permission as PermissionModel,
+    Role as RoleModel,
+    RolePermission as RolePermissionModel,
+)
+
+logger = logging.getLogger(__name__)
+
+RBAC_REFRESH_INTERVAL = float(os.environ.get("RBAC_REFRESH_INTERVAL", "300"))
+
+# Action that guards the admin CRUD of roles, permissions and role permissions
+MANAGE_PERMISSIONS = "manage_permissions"
+
+
+@dataclass(frozen=True)
+class Compiled:
+    bits: dict[str, int] = field(default_factory=dict)  # action -> bit
+    role_masks: dict[int, int] = field(default_factory=dict)  # role id -> mask
+    role_ids: dict[str, int] = field(default_factory=dict)  # role name -> id
+    loaded_at: float = float("-inf")
+
+    def mask_for(self, role_id: int | None, role_name: str | None = None) -> int:
+        if role_id is None and role_name is not None:
+            role_id = self.role_ids.get(role_name)
+        return self.role_masks.get(int(role_id), 0) if role_id is not None else 0
+
+    def allows(self, role_id: int | None, action: str, role_name: str | None = None) -> bool:
+        bit = self.bits.get(action)
+        return bit is not None and bool(self.mask_for(role_id, role_name) >> bit & 1)
+
+
+_compiled = Compiled()
+_lock = threading.Lock()
+
+
+def build_compiled(actions, roles, pairs, loaded_at: float | None = None) -> Compiled:
+    """Bitsets from `(permission id, action)`, `(role id, name)` and `(role id, permission id)` rows."""
+    bits: dict[str, int] = {}
+    bit_by_permission: dict[int, int] = {}
+    for permission_id, action in sorted(actions, key=lambda row: row[0]):
+        # одно действие может быть заведено несколькими строками — у них общий бит
+        bit = bits.setdefault(action, len(bits))
+        bit_by_permission[int(permission_id)] = bit
+    role_masks = {int(role_id): 0 for role_id, _ in roles}
+    for role_id, permission_id in pairs:
+        if role_id is None or permission_id is None or int(permission_id) not in bit_by_permission:
+            continue
+        role_masks[int(role_id)] = role_masks.get(int(role_id), 0) | 1 << bit_by_permission[int(permission_id)]
+    return Compiled(
+        bits=bits,
+        role_masks=role_masks,
+        role_ids={name: int(role_id) for role_id, name in roles},
+        loaded_at=time.monotonic() if loaded_at is None else loaded_at,
+    )
+
+
+def compile_permissions(db: Session) -> Compiled:
+    """Read the three tables and build the bitsets (three small queries)."""
+    return build_compiled(
+        db.execute(select(PermissionModel.id, PermissionModel.action)).all(),
+        db.execute(select(RoleModel.id, RoleModel.name)).all(),
+        db.execute(select(RolePermissionModel.roleId, RolePermissionModel.permissionId)).all(),
+    )
+
+
+def refresh(db: Session | None = None) -> Compiled:
+    """Recompile the bitsets; with no session a short-lived one is opened."""
+    global _compiled
+    if db is not None:
+        compiled = compile_permissions(db)
+    else:
+        with SessionLocal() as session:
+            compiled = compile_permissions(session)
+    with _lock:
+        _compiled = compiled
+    return compiled
+
+
+def current() -> Compiled:
+    """The compiled snapshot, reloaded when it is older than RBAC_REFRESH_INTERVAL.
+
+    If the reload fails, a snapshot that was loaded before keeps being used
+    (and the next call retries); with none loaded yet the error propagates.
+    """
+    compiled = _compiled
+    if time.monotonic() - compiled.loaded_at > RBAC_REFRESH_INTERVAL:
+        try:
+            compiled = refresh()
+        except Exception:
+            if compiled.loaded_at == float("-inf"):
+                raise
+            logger.exception("Could not reload role permissions; using the snapshot loaded before")
+    return compiled
+
+
+def has_permission(user, action: str) -> bool:
+    return current().allows(getattr(user, "roleId", None), action, getattr(user, "role", None))
+
+
+def ensure_admin_can_manage(db: Session) -> None:
+    """Refuse a pending change that leaves the admin role without MANAGE_PERMISSIONS.
+
+    The role and permission endpoints require it themselves, so such a change
+    could not be undone through the API. Flushes the session; rolls it back
+    and raises 409 if no grant would remain.
+    """
+    db.flush()
+    kept = db.execute(
+        select(RolePermissionModel.id)
+        .join(RoleModel, RoleModel.id == RolePermissionModel.roleId)
+        .join(PermissionModel, PermissionModel.id == RolePermissionModel.permissionId)
+        .where(RoleModel.name == "admin", PermissionModel.action == MANAGE_PERMISSIONS)
+        .limit(1)
+    ).first()
+    if kept is None:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail=f"The admin role must keep the '{MANAGE_PERMISSIONS}' permission",
+        )
+
+
+def require_permission(action: str):
+    # sync dependency: a reload (rare) runs in the thread pool, not in the event loop
+    def inner(current_user=Depends(get_current_user)):
+        if not has_permission(current_user, action):
+            raise HTTPException(status_code=403, detail="Insufficient permissions")
+        return current_user
+
+    return inner
@@ -256,6 +256,69 @@ class RolePermissionRead(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class StudyTestRead(TestRead):
+    bestPercent: Optional[int] = None
+    bestPassed: bool = False
+
+class StudyModuleRead(ModuleRead):
+    knowledge: float
+    isLocked: bool
+    isPassed: bool
+    topics: list[TopicRead]
+    tests: list[StudyTestRead]
+
+class CourseStudyView(BaseModel):
+    course: CourseRead
+    category: Optional[CourseCategoryRead]
+    isAuthor: bool
+    courseKnowledge: float
+    allModulesPassed: bool
+    courseTest: Optional[StudyTestRead]
+    modules: list[StudyModuleRead]
+
+class PaperAnswerRead(BaseModel):
+    id: int
+    text: str
+
+class PaperQuestionRead(BaseModel):
+    id: int
+    text: str
+    picture: Optional[str]
+    complexityPoints: int
+    questionType: str
+    topicId: Optional[int]
+    # варианты без признака правильности; у открытых вопросов список пуст
+    answers: list[PaperAnswerRead]
+
+class TestPaperRead(TestRead):
+    questions: list[PaperQuestionRead]
+
+class AnswerTreeIn(BaseModel):
+    id: Optional[int] = None  # None — новый вариант
+    text: str
+    isCorrect: bool
+
+class QuestionTreeIn(BaseModel):
+    id: Optional[int] = None  # None — новый вопрос
+    text: str
+    complexityPoints: int
+    questionType: Literal['test', 'open'] = 'test'
+    topicId: Optional[int] = None
+    answers: list[AnswerTreeIn] = []
+
+class TestTreeIn(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    durationInMinutes: Optional[int] = None
+    # полный список вопросов теста: отсутствующие в нём вопросы и ответы удаляются
+    questions: list[QuestionTreeIn]
+
+class QuestionTreeRead(QuestionRead):
+    answers: list[AnswerRead]
+
+class TestTreeRead(TestRead):
+    questions: list[QuestionTreeRead]
+
 # Backwards-compatible aliases used by other modules (previous naming)
 CourseIn = CourseCreate
 CourseOut = CourseRead
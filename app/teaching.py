@@ -2,24 +2,28 @@ import os
 import uuid
 import shutil
 import logging
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette.responses import FileResponse
 
-from .db import get_db
-from .deps import get_current_user, require_role
+from .db import get_async_db, get_db
+from .deps import get_async_read_db, get_current_user, get_read_db, require_role
 from .models import (
     Answer as AnswerModel,
     Course as CourseModel,
     CourseEnrollment as CourseEnrollmentModel,
     Module as ModuleModel,
-    ModulePassed as ModulePassedModel,
     Question as QuestionModel,
     Test as TestModel,
     TestResult as TestResultModel,
     Topic as TopicModel,
     TopicContent as TopicContentModel,
+    UserAnswer as UserAnswerModel,
 )
 from .schemas import (
     AnswerIn,
@@ -28,17 +32,28 @@ from .schemas import (
     CourseOut,
     ModuleIn,
     ModuleOut,
+    PaperAnswerRead,
+    PaperQuestionRead,
     QuestionIn,
     QuestionRead,
+    QuestionTreeRead,
     TestIn,
     TestOut,
+    TestPaperRead,
     TestResultRead,
+    TestTreeIn,
+    TestTreeRead,
     TopicContentCreate,
     TopicContentRead,
     TopicCreate,
     TopicRead,
 )
-from .utils import generate_unique_id
+from .access import ensure_module_access, invalidate_module_unlocks
+from .cache import aget_course_tree, bump_tree_version, course_id_for_test, get_course_tree
+from .exports import export_response
+from .ids import next_id
+from .ownership import ensure_author, forget, forget_course, resolve_owner
+from .utils import recompute_course_knowledge
 
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -51,46 +66,6 @@ os.makedirs(QUESTIONS_UPLOAD_DIR, exist_ok=True)
 
 router = APIRouter(prefix="/full", tags=["teaching"])
 
-def _ensure_module_access(db: Session, course: CourseModel, module: ModuleModel, user_id: int) -> None:
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    if not module:
-        raise HTTPException(status_code=404, detail="Module not found")
-    if int(course.authorId) == user_id:
-        return
-    enrolled = (
-        db.query(CourseEnrollmentModel)
-        .filter(
-            CourseEnrollmentModel.courseId == course.id,
-            CourseEnrollmentModel.userId == user_id,
-        )
-        .first()
-    )
-    if not enrolled:
-        raise HTTPException(status_code=403, detail="Not enrolled")
-    modules = (
-        db.query(ModuleModel)
-        .filter(ModuleModel.courseId == course.id)
-        .order_by(ModuleModel.id.asc())
-        .all()
-    )
-    idx = next((i for i, m in enumerate(modules) if m.id == module.id), None)
-    if idx is None:
-        raise HTTPException(status_code=404, detail="Module not found")
-    if idx > 0:
-        prev_module = modules[idx - 1]
-        mp = (
-            db.query(ModulePassedModel)
-            .filter(
-                ModulePassedModel.moduleId == prev_module.id,
-                ModulePassedModel.userId == user_id,
-                ModulePassedModel.isPassed == True,
-            )
-            .first()
-        )
-        if not mp:
-            raise HTTPException(status_code=403, detail="Module locked")
-
 @router.post(
     "/courses",
     response_model=CourseOut,
@@ -103,7 +78,7 @@ def create_course(
     current=Depends(require_role("teacher")),
 ):
     course = CourseModel()
-    course.id = generate_unique_id(db, CourseModel)
+    course.id = next_id()
     course.name = payload.name
     course.description = payload.description
     course.categoryId = payload.categoryId
@@ -126,7 +101,7 @@ def list_courses(
     categoryId: int | None = None,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     query = db.query(CourseModel)
     if published is not None:
@@ -144,8 +119,8 @@ def list_courses(
     summary="Получить курс по идентификатору",
     description="Возвращает полную информацию о конкретном курсе по его идентификатору.",
 )
-def get_course(course_id: int, db: Session = Depends(get_db)):
-    course = db.get(CourseModel, course_id)
+async def get_course(course_id: int, db: AsyncSession = Depends(get_async_db)):
+    course = await db.get(CourseModel, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     return course
@@ -192,6 +167,7 @@ def delete_course(
         raise HTTPException(status_code=403, detail="Only author can delete course")
     db.delete(course)
     db.commit()
+    forget_course(course_id)
     return {"ok": True}
 
 @router.patch(
@@ -216,6 +192,24 @@ def publish_course(
     db.refresh(course)
     return course
 
+@router.post(
+    "/courses/{course_id}/knowledge/recompute",
+    summary="Пересчитать знания по курсу",
+    description="Пересчитывает уровень знаний по курсу для всех записанных студентов. Доступно автору курса и администратору.",
+)
+def recompute_course_knowledge_for_students(
+    course_id: int,
+    db: Session = Depends(get_db),
+    current=Depends(get_current_user),
+):
+    course = db.get(CourseModel, course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if current.role != "admin" and int(current.id) != int(course.authorId):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    knowledge_by_user = recompute_course_knowledge(db, course_id)
+    return {"courseId": course_id, "students": len(knowledge_by_user)}
+
 @router.post(
     "/modules",
     response_model=ModuleOut,
@@ -233,13 +227,15 @@ def create_module(
     if int(current.id) != int(course.authorId):
         raise HTTPException(status_code=403, detail="Only author can add modules")
     module = ModuleModel()
-    module.id = generate_unique_id(db, ModuleModel)
+    module.id = next_id()
     module.name = payload.name
     module.description = payload.description
     module.courseId = payload.courseId
     db.add(module)
+    bump_tree_version(db, course.id)
     db.commit()
     db.refresh(module)
+    invalidate_module_unlocks(course_id=int(course.id))
     return module
 
 @router.put(
@@ -257,12 +253,11 @@ def update_module(
     module = db.get(ModuleModel, module_id)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
-    course = db.get(CourseModel, module.courseId)
-    if int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can modify module")
+    ensure_author(db, "module", module_id, current, "Only author can modify module")
     module.name = payload.name
     module.description = payload.description
     db.add(module)
+    bump_tree_version(db, module.courseId)
     db.commit()
     db.refresh(module)
     return module
@@ -273,8 +268,8 @@ def update_module(
     summary="Получить модуль по идентификатору",
     description="Возвращает данные модуля вместе с привязкой к курсу.",
 )
-def get_module(module_id: int, db: Session = Depends(get_db)):
-    module = db.get(ModuleModel, module_id)
+async def get_module(module_id: int, db: AsyncSession = Depends(get_async_db)):
+    module = await db.get(ModuleModel, module_id)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
     return module
@@ -285,13 +280,9 @@ def get_module(module_id: int, db: Session = Depends(get_db)):
     summary="Перечислить модули курса",
     description="Возвращает все модули указанного курса в порядке их идентификаторов.",
 )
-def list_modules_for_course(course_id: int, db: Session = Depends(get_db)):
-    return (
-        db.query(ModuleModel)
-        .filter(ModuleModel.courseId == course_id)
-        .order_by(ModuleModel.id.asc())
-        .all()
-    )
+async def list_modules_for_course(course_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    tree = await aget_course_tree(db, course_id)
+    return tree.modules if tree else []
 
 @router.delete(
     "/modules/{module_id}",
@@ -306,11 +297,14 @@ def delete_module(
     module = db.get(ModuleModel, module_id)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
-    course = db.get(CourseModel, module.courseId)
-    if int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can delete module")
+    ensure_author(db, "module", module_id, current, "Only author can delete module")
+    course_id = int(module.courseId)
     db.delete(module)
+    bump_tree_version(db, course_id)
     db.commit()
+    forget("module", module_id)
+    # Порядок модулей курса изменился — следующий модуль теперь открывается по другому предшественнику
+    invalidate_module_unlocks(course_id=course_id)
     return {"ok": True}
 
 
@@ -469,17 +463,8 @@ def upload_question_picture(
     question = db.get(QuestionModel, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
-    test = db.get(TestModel, question.testId)
-    course_obj = None
-    if test:
-        if test.courseId:
-            course_obj = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            course_obj = db.get(CourseModel, module.courseId) if module else None
-    # allow author or admin
-    if course_obj and not (getattr(current, "role", None) == "admin" or int(current.id) == int(course_obj.authorId)):
-        raise HTTPException(status_code=403, detail="Only author or admin can upload question picture")
+    owner = ensure_author(
+        db, "question", question_id, current, "Only author or admin can upload question picture", allow_admin=True)
     if not file or not getattr(file, "filename", None):
         raise HTTPException(status_code=400, detail="No file provided")
 
@@ -510,6 +495,7 @@ def upload_question_picture(
 
     question.picture = f"/uploads/questions/{filename}"
     db.add(question)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     db.refresh(question)
     return question
@@ -528,17 +514,8 @@ def delete_question_picture(
     question = db.get(QuestionModel, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
-    test = db.get(TestModel, question.testId)
-    course_obj = None
-    if test:
-        if test.courseId:
-            course_obj = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            course_obj = db.get(CourseModel, module.courseId) if module else None
-    # allow author or admin
-    if course_obj and not (getattr(current, "role", None) == "admin" or int(current.id) == int(course_obj.authorId)):
-        raise HTTPException(status_code=403, detail="Only author or admin can delete question picture")
+    owner = ensure_author(
+        db, "question", question_id, current, "Only author or admin can delete question picture", allow_admin=True)
     if not question.picture:
         return {"ok": True}
     try:
@@ -552,6 +529,7 @@ def delete_question_picture(
         pass
     question.picture = None
     db.add(question)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     return {"ok": True}
 
@@ -595,15 +573,14 @@ def create_topic(
     module = db.get(ModuleModel, payload.moduleId)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
-    course = db.get(CourseModel, module.courseId) if module else None
-    if course and int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can create topic")
+    ensure_author(db, "module", module.id, current, "Only author can create topic")
     topic = TopicModel()
-    topic.id = generate_unique_id(db, TopicModel)
+    topic.id = next_id()
     topic.name = payload.name
     topic.description = payload.description
     topic.moduleId = payload.moduleId
     db.add(topic)
+    bump_tree_version(db, module.courseId)
     db.commit()
     db.refresh(topic)
     return topic
@@ -614,47 +591,14 @@ def create_topic(
     summary="Получить тему",
     description="Возвращает тему с проверкой доступа для студентов и авторов.",
 )
-def get_topic(topic_id: int, current=Depends(get_current_user), db: Session = Depends(get_db)):
-    topic = db.get(TopicModel, topic_id)
+async def get_topic(topic_id: int, current=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    topic = await db.get(TopicModel, topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    module = db.get(ModuleModel, topic.moduleId)
-    course = db.get(CourseModel, module.courseId) if module else None
-    uid = int(current.id)
+    module = await db.get(ModuleModel, topic.moduleId)
+    course = await db.get(CourseModel, module.courseId) if module else None
     if course:
-        if int(current.id) != int(course.authorId):
-            enrolled = (
-                db.query(CourseEnrollmentModel)
-                .filter(
-                    CourseEnrollmentModel.courseId == course.id,
-                    CourseEnrollmentModel.userId == uid,
-                )
-                .first()
-            )
-            if not enrolled:
-                raise HTTPException(status_code=403, detail="Not enrolled")
-            modules = (
-                db.query(ModuleModel)
-                .filter(ModuleModel.courseId == course.id)
-                .order_by(ModuleModel.id.asc())
-                .all()
-            )
-            idx = next((i for i, m in enumerate(modules) if m.id == module.id), None)
-            if idx is None:
-                raise HTTPException(status_code=404, detail="Module not found")
-            if idx > 0:
-                prev_module = modules[idx - 1]
-                mp = (
-                    db.query(ModulePassedModel)
-                    .filter(
-                        ModulePassedModel.moduleId == prev_module.id,
-                        ModulePassedModel.userId == uid,
-                        ModulePassedModel.isPassed == True,
-                    )
-                    .first()
-                )
-                if not mp:
-                    raise HTTPException(status_code=403, detail="Module locked")
+        await db.run_sync(ensure_module_access, course, module, int(current.id))
     return topic
 
 @router.put(
@@ -672,13 +616,11 @@ def update_topic(
     topic = db.get(TopicModel, topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    module = db.get(ModuleModel, topic.moduleId)
-    course = db.get(CourseModel, module.courseId) if module else None
-    if course and int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can modify topic")
+    owner = ensure_author(db, "topic", topic_id, current, "Only author can modify topic")
     topic.name = payload.name
     topic.description = payload.description
     db.add(topic)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     db.refresh(topic)
     return topic
@@ -696,10 +638,7 @@ def delete_topic(
     topic = db.get(TopicModel, topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    module = db.get(ModuleModel, topic.moduleId)
-    course = db.get(CourseModel, module.courseId) if module else None
-    if course and int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can delete topic")
+    owner = ensure_author(db, "topic", topic_id, current, "Only author can delete topic")
     contents = db.query(TopicContentModel).filter(TopicContentModel.topicId == topic.id).all()
     for content in contents:
         try:
@@ -709,7 +648,9 @@ def delete_topic(
             pass
         db.delete(content)
     db.delete(topic)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
+    forget("topic", topic_id)
     return {"ok": True}
 
 @router.get(
@@ -718,58 +659,24 @@ def delete_topic(
     summary="Список тем модуля",
     description="Возвращает темы модуля с проверкой доступа и прогресса студента.",
 )
-def list_topics(
+async def list_topics(
     course_id: int,
     module_id: int,
     current=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    course = db.get(CourseModel, course_id)
+    course = await db.get(CourseModel, course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
-    module = db.get(ModuleModel, module_id)
+    module = await db.get(ModuleModel, module_id)
     if not module or int(module.courseId) != int(course.id):
         raise HTTPException(status_code=404, detail="Module not found")
 
-    is_author = int(course.authorId) == int(current.id)
-
-    if not is_author:
-        enrolled = (
-            db.query(CourseEnrollmentModel)
-            .filter(
-                CourseEnrollmentModel.courseId == course_id,
-                CourseEnrollmentModel.userId == int(current.id),
-            )
-            .first()
-        )
-        if not enrolled:
-            raise HTTPException(status_code=403, detail="Not enrolled")
-
-        modules = (
-            db.query(ModuleModel)
-            .filter(ModuleModel.courseId == course_id)
-            .order_by(ModuleModel.id.asc())
-            .all()
-        )
-        idx = next((i for i, m in enumerate(modules) if m.id == module_id), None)
-        if idx is None:
-            raise HTTPException(status_code=404, detail="Module not found")
-        if idx > 0:
-            prev_module = modules[idx - 1]
-            mp = (
-                db.query(ModulePassedModel)
-                .filter(
-                    ModulePassedModel.moduleId == prev_module.id,
-                    ModulePassedModel.userId == int(current.id),
-                    ModulePassedModel.isPassed == True,
-                )
-                .first()
-            )
-            if not mp:
-                raise HTTPException(status_code=403, detail="Module locked")
+    await db.run_sync(ensure_module_access, course, module, int(current.id))
 
-    topics = db.query(TopicModel).filter(TopicModel.moduleId == module_id).all()
-    return topics
+    tree = await aget_course_tree(db, course_id, course.treeVersion)
+    module_node = tree.module(module_id)
+    return module_node.topics if module_node else []
 
 @router.get(
     "/topic-contents/{content_id}",
@@ -797,7 +704,7 @@ def get_topic_content(
         raise HTTPException(status_code=404, detail="Course not found")
     if course_id is not None and int(course_id) != int(course_obj.id):
         raise HTTPException(status_code=400, detail="Course mismatch for content")
-    _ensure_module_access(db, course_obj, module, int(current.id))
+    ensure_module_access(db, course_obj, module, int(current.id))
     return topic_content
 
 @router.get(
@@ -822,7 +729,7 @@ def download_topic_content(
     course = db.get(CourseModel, module.courseId) if module else None
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
-    _ensure_module_access(db, course, module, int(current.id))
+    ensure_module_access(db, course, module, int(current.id))
     print(
         f"Downloading topic content {topic_content.id}, file path: {topic_content.file}"
     )
@@ -846,11 +753,7 @@ def update_topic_content(
     topic_content = db.get(TopicContentModel, content_id)
     if not topic_content:
         raise HTTPException(status_code=404, detail="TopicContent not found")
-    topic = db.get(TopicModel, topic_content.topicId)
-    module = db.get(ModuleModel, topic.moduleId) if topic else None
-    course = db.get(CourseModel, module.courseId) if module else None
-    if course and int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can modify content")
+    ensure_author(db, "topic_content", content_id, current, "Only author can modify content")
     topic_content.description = payload.description
     db.add(topic_content)
     db.commit()
@@ -870,11 +773,7 @@ def delete_topic_content(
     topic_content = db.get(TopicContentModel, content_id)
     if not topic_content:
         raise HTTPException(status_code=404, detail="TopicContent not found")
-    topic = db.get(TopicModel, topic_content.topicId)
-    module = db.get(ModuleModel, topic.moduleId) if topic else None
-    course = db.get(CourseModel, module.courseId) if module else None
-    if course and int(current.id) != int(course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can delete content")
+    ensure_author(db, "topic_content", content_id, current, "Only author can delete content")
     try:
         if topic_content.file:
             # topic content stores filesystem path; remove if exists
@@ -887,6 +786,7 @@ def delete_topic_content(
         pass
     db.delete(topic_content)
     db.commit()
+    forget("topic_content", content_id)
     return {"ok": True}
 
 
@@ -907,13 +807,10 @@ def create_topic_content(
     topic = db.get(TopicModel, topicId)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    module = db.get(ModuleModel, topic.moduleId)
-    course = db.get(CourseModel, module.courseId) if module else None
-    if not course:
+    owner = ensure_author(
+        db, "topic", topicId, current, "Only author or admin can create content for this topic", allow_admin=True)
+    if owner is None:
         raise HTTPException(status_code=404, detail="Course not found")
-    # allow course author or admin
-    if not (getattr(current, "role", None) == "admin" or int(current.id) == int(course.authorId)):
-        raise HTTPException(status_code=403, detail="Only author or admin can create content for this topic")
 
     if not file or not getattr(file, "filename", None):
         raise HTTPException(status_code=400, detail="No file provided")
@@ -993,7 +890,7 @@ def create_topic_content(
 
     # create DB record; store filesystem path (used by download/delete endpoints)
     tc = TopicContentModel()
-    tc.id = generate_unique_id(db, TopicContentModel)
+    tc.id = next_id()
     tc.description = description or ""
     tc.file = dest_path
     tc.topicId = topicId
@@ -1008,26 +905,26 @@ def create_topic_content(
     summary="Перечислить материалы темы",
     description="Возвращает список материалов темы с проверкой доступа.",
 )
-def get_topic_contents(
+async def get_topic_contents(
     topic_id: int,
     course_id: int | None = None,
     current=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    topic = db.get(TopicModel, topic_id)
+    topic = await db.get(TopicModel, topic_id)
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
-    module = db.get(ModuleModel, topic.moduleId)
+    module = await db.get(ModuleModel, topic.moduleId)
     if not module:
         raise HTTPException(status_code=404, detail="Module not found")
-    course = db.get(CourseModel, module.courseId) if module else None
+    course = await db.get(CourseModel, module.courseId) if module else None
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     if course_id is not None and int(course_id) != int(course.id):
         raise HTTPException(status_code=400, detail="Course mismatch for topic")
-    _ensure_module_access(db, course, module, int(current.id))
-    contents = db.query(TopicContentModel).filter(TopicContentModel.topicId == topic_id).all()
-    return contents
+    await db.run_sync(ensure_module_access, course, module, int(current.id))
+    contents = await db.scalars(select(TopicContentModel).where(TopicContentModel.topicId == topic_id))
+    return contents.all()
 
 @router.post(
     "/tests",
@@ -1051,26 +948,22 @@ def create_test(
     if course_id is not None:
         pass
     if module_id is not None:
-        module = db.get(ModuleModel, module_id)
-        if not module:
+        owner = ensure_author(db, "module", module_id, current, "Only author can create test for module")
+        if owner is None:
             raise HTTPException(status_code=404, detail="Module not found")
-        course = db.get(CourseModel, module.courseId)
-        if int(current.id) != int(course.authorId):
-            raise HTTPException(status_code=403, detail="Only author can create test for module")
     if course_id is not None:
-        course = db.get(CourseModel, course_id)
-        if not course:
+        owner = ensure_author(db, "course", course_id, current, "Only author can create test for course")
+        if owner is None:
             raise HTTPException(status_code=404, detail="Course not found")
-        if int(current.id) != int(course.authorId):
-            raise HTTPException(status_code=403, detail="Only author can create test for course")
     test = TestModel()
-    test.id = generate_unique_id(db, TestModel)
+    test.id = next_id()
     test.name = payload.name
     test.description = payload.description
     test.durationInMinutes = payload.durationInMinutes
     test.moduleId = module_id
     test.courseId = course_id
     db.add(test)
+    bump_tree_version(db, owner.course_id)
     db.commit()
     db.refresh(test)
     return test
@@ -1081,12 +974,78 @@ def create_test(
     summary="Получить тест",
     description="Возвращает тест по идентификатору.",
 )
-def get_test(test_id: int, db: Session = Depends(get_db)):
-    test = db.get(TestModel, test_id)
+async def get_test(test_id: int, db: AsyncSession = Depends(get_async_db)):
+    test = await db.get(TestModel, test_id)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
     return test
 
+@router.get(
+    "/tests/{test_id}/paper",
+    response_model=TestPaperRead,
+    summary="Бланк теста",
+    description="Возвращает тест с вопросами и вариантами ответов одним запросом, без признаков правильности. "
+                "Доступно автору курса, администратору и записанным студентам (для теста модуля — если модуль открыт).",
+)
+async def get_test_paper(test_id: int, current=Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    test = await db.get(TestModel, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    course_id = await db.run_sync(course_id_for_test, test)
+    course = await db.get(CourseModel, course_id) if course_id else None
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+
+    uid = int(current.id)
+    if getattr(current, "role", None) != "admin":
+        if test.moduleId:
+            module = await db.get(ModuleModel, test.moduleId)
+            await db.run_sync(ensure_module_access, course, module, uid)
+        elif int(course.authorId) != uid:
+            enrolled = await db.scalar(
+                select(CourseEnrollmentModel.id)
+                .where(CourseEnrollmentModel.courseId == course.id, CourseEnrollmentModel.userId == uid)
+                .limit(1)
+            )
+            if not enrolled:
+                raise HTTPException(status_code=403, detail="Not enrolled")
+
+    # Бланк собирается один раз на версию дерева курса: правки вопросов и ответов меняют версию
+    tree = await aget_course_tree(db, course.id, course.treeVersion)
+    cache_key = ("paper", test_id)
+    paper = tree.derived.get(cache_key) if tree else None
+    if paper is None:
+        test_node = tree.test(test_id) if tree else None
+        if test_node is None:
+            raise HTTPException(status_code=404, detail="Test not found")
+        paper = _build_test_paper(test_node)
+        tree.derived[cache_key] = paper
+    return paper
+
+
+def _build_test_paper(test_node) -> TestPaperRead:
+    """Questions with their options; correctness flags and open-answer texts are left out."""
+    return TestPaperRead(
+        id=test_node.id,
+        name=test_node.name,
+        description=test_node.description,
+        durationInMinutes=test_node.durationInMinutes,
+        moduleId=test_node.moduleId,
+        courseId=test_node.courseId,
+        questions=[
+            PaperQuestionRead(
+                id=q.id,
+                text=q.text,
+                picture=q.picture,
+                complexityPoints=q.complexityPoints,
+                questionType=q.questionType,
+                topicId=q.topicId,
+                answers=[] if q.questionType == "open" else [PaperAnswerRead(id=a.id, text=a.text) for a in q.answers],
+            )
+            for q in test_node.questions
+        ],
+    )
+
 @router.get(
     "/tests",
     response_model=list[TestOut],
@@ -1116,22 +1075,89 @@ def list_results_for_test(
     current=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    _ensure_can_view_results(db, test_id, current)
+    return db.query(TestResultModel).filter(TestResultModel.testId == test_id).order_by(TestResultModel.created_at.desc()).all()
+
+
+def _ensure_can_view_results(db: Session, test_id: int, current) -> None:
+    """Results of a test are visible to admins and to the author of its course."""
     test = db.get(TestModel, test_id)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
-    uid = int(current.id)
     if current.role == "admin":
-        return db.query(TestResultModel).filter(TestResultModel.testId == test_id).order_by(TestResultModel.created_at.desc()).all()
-    course_obj = None
-    if test.courseId:
-        course_obj = db.get(CourseModel, test.courseId)
-    elif test.moduleId:
-        module = db.get(ModuleModel, test.moduleId)
-        course_obj = db.get(CourseModel, module.courseId) if module else None
-    if course_obj and int(course_obj.authorId) == uid:
-        return db.query(TestResultModel).filter(TestResultModel.testId == test_id).order_by(TestResultModel.created_at.desc()).all()
+        return
+    owner = resolve_owner(db, "test", test_id)
+    if owner and owner.author_id == int(current.id):
+        return
     raise HTTPException(status_code=403, detail="Not authorized")
 
+
+@router.get(
+    "/tests/{test_id}/results/export",
+    summary="Выгрузка результатов теста",
+    description="Потоково выгружает результаты теста в формате NDJSON или CSV (format=ndjson|csv). "
+    "Доступно администратору и автору курса.",
+)
+def export_results_for_test(
+    test_id: int,
+    format: str = "ndjson",
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _ensure_can_view_results(db, test_id, current)
+    stmt = (
+        select(
+            TestResultModel.id,
+            TestResultModel.userId,
+            TestResultModel.testId,
+            TestResultModel.result,
+            TestResultModel.scoreInPoints,
+            TestResultModel.isPassed,
+            TestResultModel.durationInMinutes,
+            TestResultModel.created_at,
+        )
+        .where(TestResultModel.testId == test_id)
+        .order_by(TestResultModel.id)
+    )
+    return export_response(stmt, format, f"test-{test_id}-results", int(current.id))
+
+
+@router.get(
+    "/courses/{course_id}/answers/export",
+    summary="Выгрузка ответов по курсу",
+    description="Потоково выгружает ответы студентов на вопросы всех тестов курса (модульных и итогового) "
+    "в формате NDJSON или CSV (format=ndjson|csv). Доступно администратору и автору курса.",
+)
+def export_course_answers(
+    course_id: int,
+    format: str = "ndjson",
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    course = db.get(CourseModel, course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if current.role != "admin" and int(current.id) != int(course.authorId):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    course_modules = select(ModuleModel.id).where(ModuleModel.courseId == course_id)
+    stmt = (
+        select(
+            UserAnswerModel.id,
+            UserAnswerModel.userId,
+            UserAnswerModel.testResultId,
+            TestResultModel.testId,
+            UserAnswerModel.questionId,
+            UserAnswerModel.isCorrect,
+            UserAnswerModel.timeSpentInMinutes,
+            TestResultModel.created_at,
+        )
+        .join(TestResultModel, TestResultModel.id == UserAnswerModel.testResultId)
+        .join(TestModel, TestModel.id == TestResultModel.testId)
+        .where(or_(TestModel.courseId == course_id, TestModel.moduleId.in_(course_modules)))
+        .order_by(UserAnswerModel.id)
+    )
+    return export_response(stmt, format, f"course-{course_id}-answers", int(current.id))
+
 @router.put(
     "/tests/{test_id}",
     response_model=TestOut,
@@ -1154,29 +1180,31 @@ def update_test(
         raise HTTPException(status_code=400, detail="Test must belong to either module or course")
     if module_id is None and course_id is None:
         raise HTTPException(status_code=400, detail="Test must specify module or course")
-    course_for_test = None
+    # править можно только свой тест и переносить его только в свой курс
+    previous = ensure_author(db, "test", test_id, current, "Only author can modify test")
     if module_id is not None:
-        module = db.get(ModuleModel, module_id)
-        if not module:
+        target = ensure_author(db, "module", module_id, current, "Only author can modify test")
+        if target is None:
             raise HTTPException(status_code=404, detail="Module not found")
-        course_for_test = db.get(CourseModel, module.courseId)
-        if not course_for_test:
+    else:
+        target = ensure_author(db, "course", course_id, current, "Only author can modify test")
+        if target is None:
             raise HTTPException(status_code=404, detail="Course not found")
-        if int(current.id) != int(course_for_test.authorId):
-            raise HTTPException(status_code=403, detail="Only author can modify test")
-    if course_id is not None:
-        course_for_test = db.get(CourseModel, course_id)
-        if not course_for_test:
-            raise HTTPException(status_code=404, detail="Course not found")
-        if int(current.id) != int(course_for_test.authorId):
-            raise HTTPException(status_code=403, detail="Only author can modify test")
+    previous_course_id = previous.course_id if previous else None
     test.name = payload.name
     test.description = payload.description
     test.durationInMinutes = payload.durationInMinutes
     test.moduleId = module_id
     test.courseId = course_id
     db.add(test)
+    # тест может переехать в другой курс — меняются оба дерева
+    bump_tree_version(db, previous_course_id)
+    if target.course_id != previous_course_id:
+        bump_tree_version(db, target.course_id)
     db.commit()
+    if previous_course_id is not None and target.course_id != previous_course_id:
+        # вопросы и ответы теста теперь принадлежат другому курсу
+        forget_course(previous_course_id)
     db.refresh(test)
     return test
 
@@ -1194,16 +1222,11 @@ def delete_test(
     test = db.get(TestModel, test_id)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
-    course_for_test = None
-    if test.courseId:
-        course_for_test = db.get(CourseModel, test.courseId)
-    elif test.moduleId:
-        module = db.get(ModuleModel, test.moduleId)
-        course_for_test = db.get(CourseModel, module.courseId) if module else None
-    if course_for_test and int(current.id) != int(course_for_test.authorId):
-        raise HTTPException(status_code=403, detail="Only author can delete test")
+    owner = ensure_author(db, "test", test_id, current, "Only author can delete test")
     db.delete(test)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
+    forget("test", test_id)
     return {"ok": True}
 
 @router.get(
@@ -1224,8 +1247,225 @@ def get_question(question_id: int, db: Session = Depends(get_db)):
     summary="Перечислить вопросы теста",
     description="Возвращает все вопросы указанного теста.",
 )
-def list_questions(test_id: int, db: Session = Depends(get_db)):
-    return db.query(QuestionModel).filter(QuestionModel.testId == test_id).all()
+async def list_questions(test_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    test = await db.get(TestModel, test_id)
+    course_id = await db.run_sync(course_id_for_test, test) if test else None
+    tree = await aget_course_tree(db, course_id) if course_id else None
+    test_node = tree.test(test_id) if tree else None
+    if test_node is None:
+        # тест без курса (или курс удалён) — читаем напрямую
+        questions = await db.scalars(select(QuestionModel).where(QuestionModel.testId == test_id))
+        return questions.all()
+    return test_node.questions
+
+def _authored_test(db: Session, test_id: int, current):
+    """Test and the id of its course; 403 unless the user is the course author or an admin."""
+    test = db.get(TestModel, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    owner = ensure_author(db, "test", test_id, current, "Only author or admin can edit test questions", allow_admin=True)
+    return test, owner.course_id if owner else None
+
+
+def _test_tree(db: Session, test, course_id: int | None) -> TestTreeRead:
+    tree = get_course_tree(db, course_id) if course_id else None
+    test_node = tree.test(test.id) if tree else None
+    if test_node is not None:
+        return TestTreeRead.model_validate(test_node)
+    # тест без курса — читаем напрямую
+    questions = db.query(QuestionModel).filter(QuestionModel.testId == test.id).order_by(QuestionModel.id.asc()).all()
+    answers_by_question: dict[int, list] = {}
+    if questions:
+        answers = (
+            db.query(AnswerModel)
+            .filter(AnswerModel.questionId.in_([q.id for q in questions]))
+            .order_by(AnswerModel.id.asc())
+        )
+        for a in answers:
+            answers_by_question.setdefault(a.questionId, []).append(AnswerRead.model_validate(a))
+    return TestTreeRead(
+        **TestOut.model_validate(test).model_dump(),
+        questions=[
+            QuestionTreeRead(**QuestionRead.model_validate(q).model_dump(), answers=answers_by_question.get(q.id, []))
+            for q in questions
+        ],
+    )
+
+@router.get(
+    "/tests/{test_id}/tree",
+    response_model=TestTreeRead,
+    summary="Вопросы и ответы теста",
+    description="Возвращает тест со всеми вопросами и вариантами ответов (с признаками правильности) для редактирования. "
+                "Доступно автору курса и администратору.",
+)
+def get_test_tree(test_id: int, db: Session = Depends(get_db), current=Depends(get_current_user)):
+    test, course_id = _authored_test(db, test_id, current)
+    return _test_tree(db, test, course_id)
+
+TREE_QUESTION_FIELDS = ("text", "complexityPoints", "questionType", "topicId")
+
+
+@dataclass
+class TestTreeDiff:
+    """Row-level changes that turn the stored questions of a test into the submitted tree."""
+    question_inserts: list[dict] = field(default_factory=list)
+    question_updates: list[dict] = field(default_factory=list)
+    answer_inserts: list[dict] = field(default_factory=list)
+    answer_updates: list[dict] = field(default_factory=list)
+    removed_questions: list[int] = field(default_factory=list)
+    removed_answers: list[int] = field(default_factory=list)
+    # topics set on new questions or changed on existing ones
+    topic_ids: set[int] = field(default_factory=set)
+
+    @property
+    def has_changes(self) -> bool:
+        return any((
+            self.question_inserts, self.question_updates, self.answer_inserts,
+            self.answer_updates, self.removed_questions, self.removed_answers,
+        ))
+
+
+def diff_test_tree(
+    test_id: int,
+    questions,
+    stored_questions: dict,
+    stored_answers: dict,
+    answered: Callable[[list[int]], Iterable[int]],
+    new_id: Callable[[], int] = next_id,
+) -> TestTreeDiff:
+    """Classify the submitted questions and answers against the stored rows.
+
+    Items without an id are inserted, items whose values differ are updated,
+    stored items missing from the tree are removed. Ids of another test or
+    question, or repeated ids, give 400; removing questions that `answered`
+    reports as having student answers gives 409.
+    """
+    diff = TestTreeDiff()
+    kept_questions, kept_answers = set(), set()
+    for q in questions:
+        values = {f: getattr(q, f) for f in TREE_QUESTION_FIELDS}
+        if q.id is None:
+            question_id = new_id()
+            diff.question_inserts.append({"id": question_id, "testId": test_id, **values})
+            diff.topic_ids.add(q.topicId)
+        else:
+            row = stored_questions.get(q.id)
+            if row is None or q.id in kept_questions:
+                raise HTTPException(status_code=400, detail=f"Question {q.id} does not belong to test {test_id}")
+            question_id = q.id
+            kept_questions.add(question_id)
+            if any(getattr(row, f) != v for f, v in values.items()):
+                diff.question_updates.append({"id": question_id, **values})
+                if row.topicId != q.topicId:
+                    diff.topic_ids.add(q.topicId)
+        for a in q.answers:
+            values = {"text": a.text, "isCorrect": a.isCorrect}
+            if a.id is None:
+                diff.answer_inserts.append({"id": new_id(), "questionId": question_id, **values})
+                continue
+            row = stored_answers.get(a.id)
+            if row is None or a.id in kept_answers or row.questionId != question_id:
+                raise HTTPException(status_code=400, detail=f"Answer {a.id} does not belong to question {question_id}")
+            kept_answers.add(a.id)
+            if row.text != a.text or row.isCorrect != a.isCorrect:
+                diff.answer_updates.append({"id": a.id, **values})
+    diff.topic_ids.discard(None)
+
+    diff.removed_questions = [qid for qid in stored_questions if qid not in kept_questions]
+    diff.removed_answers = [aid for aid in stored_answers if aid not in kept_answers]
+    if diff.removed_questions:
+        answered_ids = sorted(set(answered(diff.removed_questions)))
+        if answered_ids:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Questions {answered_ids} already have student answers and cannot be removed",
+            )
+    return diff
+
+@router.put(
+    "/tests/{test_id}/tree",
+    response_model=TestTreeRead,
+    summary="Сохранить вопросы и ответы теста",
+    description="Принимает полный список вопросов теста с вариантами ответов, сравнивает его с сохранённым и одной транзакцией "
+                "создаёт новые (без id), обновляет изменённые и удаляет отсутствующие вопросы и ответы. "
+                "Вопросы, на которые уже отвечали студенты, удалить нельзя (409). Доступно автору курса и администратору.",
+)
+def save_test_tree(
+    test_id: int,
+    payload: TestTreeIn,
+    db: Session = Depends(get_db),
+    current=Depends(get_current_user),
+):
+    test, course_id = _authored_test(db, test_id, current)
+    changed = False
+    for field in ("name", "description", "durationInMinutes"):
+        value = getattr(payload, field)
+        if value is not None and getattr(test, field) != value:
+            setattr(test, field, value)
+            changed = True
+
+    stored_questions = {
+        row.id: row
+        for row in db.execute(
+            select(QuestionModel.id, *(getattr(QuestionModel, f) for f in TREE_QUESTION_FIELDS))
+            .where(QuestionModel.testId == test_id)
+        )
+    }
+    stored_answers = {}
+    if stored_questions:
+        stored_answers = {
+            row.id: row
+            for row in db.execute(
+                select(AnswerModel.id, AnswerModel.questionId, AnswerModel.text, AnswerModel.isCorrect)
+                .where(AnswerModel.questionId.in_(list(stored_questions)))
+            )
+        }
+
+    diff = diff_test_tree(
+        test_id,
+        payload.questions,
+        stored_questions,
+        stored_answers,
+        answered=lambda question_ids: db.scalars(
+            select(UserAnswerModel.questionId).where(UserAnswerModel.questionId.in_(question_ids)).distinct()
+        ).all(),
+    )
+
+    # новые и изменённые темы вопросов должны быть темами курса этого теста
+    if diff.topic_ids:
+        course_topics = set()
+        if course_id is not None:
+            course_topics = set(db.scalars(
+                select(TopicModel.id)
+                .join(ModuleModel, ModuleModel.id == TopicModel.moduleId)
+                .where(TopicModel.id.in_(diff.topic_ids), ModuleModel.courseId == course_id)
+            ))
+        foreign = sorted(diff.topic_ids - course_topics)
+        if foreign:
+            raise HTTPException(status_code=400, detail=f"Topics {foreign} do not belong to the course of test {test_id}")
+
+    # Пакетные запросы: по одному на вид изменения, а не на каждый вопрос
+    if diff.removed_answers:
+        db.execute(delete(AnswerModel).where(AnswerModel.id.in_(diff.removed_answers)))
+    if diff.removed_questions:
+        db.execute(delete(QuestionModel).where(QuestionModel.id.in_(diff.removed_questions)))
+    if diff.question_updates:
+        db.execute(update(QuestionModel), diff.question_updates)
+    if diff.question_inserts:
+        db.execute(insert(QuestionModel), diff.question_inserts)
+    if diff.answer_updates:
+        db.execute(update(AnswerModel), diff.answer_updates)
+    if diff.answer_inserts:
+        db.execute(insert(AnswerModel), diff.answer_inserts)
+
+    if changed or diff.has_changes:
+        bump_tree_version(db, course_id)
+        db.commit()
+    for answer_id in diff.removed_answers:
+        forget("answer", answer_id)
+    for question_id in diff.removed_questions:
+        forget("question", question_id)
+    return _test_tree(db, test, course_id)
 
 @router.post(
     "/questions",
@@ -1241,17 +1481,9 @@ def create_question(
     test = db.get(TestModel, payload.testId)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
-    owner_course = None
-    if test.courseId:
-        owner_course = db.get(CourseModel, test.courseId)
-    elif test.moduleId:
-        module = db.get(ModuleModel, test.moduleId)
-        owner_course = db.get(CourseModel, module.courseId)
-    # allow course author or admin
-    if owner_course and not (getattr(current, "role", None) == "admin" or int(current.id) == int(owner_course.authorId)):
-        raise HTTPException(status_code=403, detail="Only author or admin can add questions")
+    owner = ensure_author(db, "test", test.id, current, "Only author or admin can add questions", allow_admin=True)
     question = QuestionModel()
-    question.id = generate_unique_id(db, QuestionModel)
+    question.id = next_id()
     question.text = payload.text
     question.complexityPoints = payload.complexityPoints
     question.testId = payload.testId
@@ -1268,6 +1500,7 @@ def create_question(
     except Exception:
         question.picture = None
     db.add(question)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     db.refresh(question)
     return question
@@ -1287,17 +1520,7 @@ def update_question(
     question = db.get(QuestionModel, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
-    test = db.get(TestModel, question.testId)
-    owner_course = None
-    if test:
-        if test.courseId:
-            owner_course = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            owner_course = db.get(CourseModel, module.courseId) if module else None
-    # allow course author or admin
-    if owner_course and not (getattr(current, "role", None) == "admin" or int(current.id) == int(owner_course.authorId)):
-        raise HTTPException(status_code=403, detail="Only author or admin can modify question")
+    owner = ensure_author(db, "question", question_id, current, "Only author or admin can modify question", allow_admin=True)
     question.text = payload.text
     question.complexityPoints = payload.complexityPoints
     # allow updating questionType and picture
@@ -1309,6 +1532,7 @@ def update_question(
     if hasattr(payload, 'topicId'):
         question.topicId = payload.topicId
     db.add(question)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     db.refresh(question)
     return question
@@ -1326,19 +1550,11 @@ def delete_question(
     question = db.get(QuestionModel, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
-    test = db.get(TestModel, question.testId)
-    owner_course = None
-    if test:
-        if test.courseId:
-            owner_course = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            owner_course = db.get(CourseModel, module.courseId) if module else None
-    # allow course author or admin
-    if owner_course and not (getattr(current, "role", None) == "admin" or int(current.id) == int(owner_course.authorId)):
-        raise HTTPException(status_code=403, detail="Only author or admin can delete question")
+    owner = ensure_author(db, "question", question_id, current, "Only author or admin can delete question", allow_admin=True)
     db.delete(question)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
+    forget("question", question_id)
     return {"ok": True}
 
 @router.get(
@@ -1359,8 +1575,9 @@ def get_answer(answer_id: int, db: Session = Depends(get_db)):
     summary="Перечислить ответы вопроса",
     description="Возвращает все ответы конкретного вопроса.",
 )
-def list_answers(question_id: int, db: Session = Depends(get_db)):
-    return db.query(AnswerModel).filter(AnswerModel.questionId == question_id).all()
+async def list_answers(question_id: int, db: AsyncSession = Depends(get_async_db)):
+    answers = await db.scalars(select(AnswerModel).where(AnswerModel.questionId == question_id))
+    return answers.all()
 
 @router.post(
     "/answers",
@@ -1376,22 +1593,14 @@ def create_answer(
     question = db.get(QuestionModel, payload.questionId)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
-    test = db.get(TestModel, question.testId)
-    owner_course = None
-    if test:
-        if test.courseId:
-            owner_course = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            owner_course = db.get(CourseModel, module.courseId)
-    if owner_course and int(current.id) != int(owner_course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can add answers")
+    owner = ensure_author(db, "question", question.id, current, "Only author can add answers")
     answer = AnswerModel()
-    answer.id = generate_unique_id(db, AnswerModel)
+    answer.id = next_id()
     answer.isCorrect = payload.isCorrect
     answer.text = payload.text
     answer.questionId = payload.questionId
     db.add(answer)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     db.refresh(answer)
     return answer
@@ -1412,20 +1621,11 @@ def update_answer(
     answer = db.get(AnswerModel, answer_id)
     if not answer:
         raise HTTPException(status_code=404, detail="Answer not found")
-    question = db.get(QuestionModel, answer.questionId)
-    test = db.get(TestModel, question.testId) if question else None
-    owner_course = None
-    if test:
-        if test.courseId:
-            owner_course = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            owner_course = db.get(CourseModel, module.courseId) if module else None
-    if owner_course and int(current.id) != int(owner_course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can modify answer")
+    owner = ensure_author(db, "answer", answer_id, current, "Only author can modify answer")
     answer.text = payload.text
     answer.isCorrect = payload.isCorrect
     db.add(answer)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
     db.refresh(answer)
     return answer
@@ -1444,17 +1644,9 @@ def delete_answer(
     answer = db.get(AnswerModel, answer_id)
     if not answer:
         raise HTTPException(status_code=404, detail="Answer not found")
-    question = db.get(QuestionModel, answer.questionId)
-    test = db.get(TestModel, question.testId) if question else None
-    owner_course = None
-    if test:
-        if test.courseId:
-            owner_course = db.get(CourseModel, test.courseId)
-        elif test.moduleId:
-            module = db.get(ModuleModel, test.moduleId)
-            owner_course = db.get(CourseModel, module.courseId) if module else None
-    if owner_course and int(current.id) != int(owner_course.authorId):
-        raise HTTPException(status_code=403, detail="Only author can delete answer")
+    owner = ensure_author(db, "answer", answer_id, current, "Only author can delete answer")
     db.delete(answer)
+    bump_tree_version(db, owner.course_id if owner else None)
     db.commit()
+    forget("answer", answer_id)
     return {"ok": True}
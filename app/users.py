@@ -7,9 +7,9 @@ from .db import get_db
 from .auth import get_password_hash, verify_password, create_access_token
 from .models import User as UserModelDecl, Role as RoleModel
 from .models import Course as CourseModel, CourseEnrollment as CourseEnrollmentModel
-from .utils import generate_unique_id
+from .ids import next_id
 from .schemas import UserCreate, UserRead, CourseRead, CourseEnrollmentRead
-from .deps import get_current_user, require_role
+from .deps import forget_user, get_current_user, require_role
 
 router = APIRouter(prefix='/users', tags=['users'])
 
@@ -65,7 +65,7 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
     if existing_login:
         raise HTTPException(status_code=400, detail='User exists')
     u = UserModelDecl()
-    u.id = generate_unique_id(db, UserModelDecl)
+    u.id = next_id()
     u.login = payload.login
     u.password = get_password_hash(payload.password)
     u.name = payload.name
@@ -109,7 +109,7 @@ def logout(current=Depends(get_current_user)):
     summary='Получить профиль текущего пользователя',
     description='Возвращает информацию о текущем аутентифицированном пользователе.',
 )
-def me(current=Depends(get_current_user)):
+async def me(current=Depends(get_current_user)):
     return UserRead(id=current.id, login=current.login, name=current.name, surname=current.surname, roleId=current.roleId)
 
 @router.get(
@@ -185,6 +185,8 @@ def update_user_role(
     db.add(user)
     db.commit()
     db.refresh(user)
+    # Выданные ранее токены содержат старую роль и перестают приниматься
+    forget_user(int(user.id))
     return UserRead(id=user.id, login=user.login, name=user.name, surname=user.surname, roleId=user.roleId)
 
 @router.get(
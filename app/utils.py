@@ -1,14 +1,22 @@
-from uuid import uuid4
 from dataclasses import dataclass
 from datetime import date
-from typing import Optional
-from .models import Question as QuestionModel, UserAnswer as UserAnswerModel, Test as TestModel, TestResult as TestResultModel, UserModuleKnowledge as UserModuleKnowledgeModel, UserCourseKnowledge as UserCourseKnowledgeModel, ModulePassed as ModulePassedModel, Module as ModuleModel
-from .db import SessionLocal
+from typing import Iterable, Optional
+from sqlalchemy import and_, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .models import Question as QuestionModel, UserAnswer as UserAnswerModel, Test as TestModel, TestResult as TestResultModel, UserModuleKnowledge as UserModuleKnowledgeModel, UserCourseKnowledge as UserCourseKnowledgeModel, ModulePassed as ModulePassedModel, Module as ModuleModel, CourseEnrollment as CourseEnrollmentModel, UserTestKnowledge as UserTestKnowledgeModel
+from .db import SessionLocal, engine, mark_user_write
+from .access import invalidate_module_unlocks
+from .ids import next_id
 
 DIFFICULTY_FACTOR_BY_TYPE = {
     'test': 1.0,
     'open': 1.75,
 }
+# Границы временного коэффициента (см. time_factor_for)
+TIME_FACTOR_MIN = 0.5
+TIME_FACTOR_MAX = 1.25
+# Модуль считается пройденным с этого уровня знаний (ModulePassed)
+MODULE_PASS_KNOWLEDGE = 80.0
 
 
 @dataclass
@@ -19,57 +27,55 @@ class TestScoreBreakdown:
     accuracy_ratio: float
     time_factor: float
 
-# Keep IDs within JavaScript's integer precision so Swagger/UI clients display them correctly.
-_MAX_SAFE_INT = (1 << 53) - 1  # 9007199254740991
 
+def difficulty_factor_for_type(qtype: Optional[str]) -> float:
+    return DIFFICULTY_FACTOR_BY_TYPE.get((qtype or 'test').lower(), 1.0)
 
-def generate_random_id() -> int:
-    """Return a positive random integer that fits in Postgres BIGINT and JavaScript safe range."""
-    # Use a time-based id (microseconds since epoch) with a small random
-    # offset so newer records have larger ids in practice. This makes
-    # ordering by `id` behave like ordering by creation time for most cases.
-    # Fall back to a UUID-based value if time-based generation fails.
-    try:
-        import time
-        import random
-
-        base = int(time.time() * 1_000_000)
-        offset = random.randint(0, 999)
-        value = base + offset
-        # Clamp to safe JS integer range
-        if value <= 0:
-            raise ValueError
-        if value > _MAX_SAFE_INT:
-            # fallback to uuid when time-based value would overflow
-            raise OverflowError
-        return value
-    except Exception:
-        # last-resort: deterministic UUID masking as before
-        value = uuid4().int & _MAX_SAFE_INT
-        return value or 1
 
+def time_factor_for(expected_minutes: float, actual_minutes: float) -> float:
+    """Return the time coefficient clamp(expected / actual, TIME_FACTOR_MIN, TIME_FACTOR_MAX)."""
+    expected = float(expected_minutes or 0)
+    actual = float(actual_minutes or 0)
+    if actual <= 0 or expected <= 0:
+        return 1.0
+    # Бонус за прохождение быстрее эталона и штраф за превышение времени.
+    return max(TIME_FACTOR_MIN, min(TIME_FACTOR_MAX, expected / actual))
 
-def generate_unique_id(db_session, model_cls) -> int:
-    """Generate a random bigint that doesn't collide with the given model's primary key."""
-    from sqlalchemy.orm import Session  # local import to avoid circular deps
 
-    if not isinstance(db_session, Session):
-        raise ValueError("db_session must be a SQLAlchemy Session")
+def score_breakdown(question_points: Iterable[tuple[float, bool]], time_factor: float) -> TestScoreBreakdown:
+    """Apply the weighted scoring formula to already graded questions.
 
-    new_id = generate_random_id()
-    attempts = 0
-    while db_session.get(model_cls, new_id) is not None:
-        attempts += 1
-        # Try a reasonable number of times before giving up.
-        if attempts > 5:
-            raise RuntimeError(
-                "Unable to generate unique id after multiple attempts")
-        new_id = generate_random_id()
-    return new_id
+    `question_points` yields `(points, is_correct)` pairs where points are
+    complexityPoints * Ktype. No database access happens here, so the same
+    routine backs both `compute_test_score` and in-memory grading.
+    """
+    max_points = 0.0
+    earned_points = 0.0
+    for points, is_correct in question_points:
+        max_points += points
+        if is_correct:
+            earned_points += points
 
+    if max_points <= 0:
+        return TestScoreBreakdown(percent=0.0, weighted_points=0.0, max_points=0.0, accuracy_ratio=0.0, time_factor=time_factor)
 
-def difficulty_factor_for_type(qtype: Optional[str]) -> float:
-    return DIFFICULTY_FACTOR_BY_TYPE.get((qtype or 'test').lower(), 1.0)
+    accuracy_ratio = earned_points / max_points
+    raw_percent = accuracy_ratio * 100.0
+    final_percent = max(0.0, min(100.0, raw_percent * time_factor))
+
+    return TestScoreBreakdown(
+        percent=final_percent,
+        weighted_points=earned_points,
+        max_points=max_points,
+        accuracy_ratio=accuracy_ratio,
+        time_factor=time_factor,
+    )
+
+
+def question_points(question) -> float:
+    """Weight of a question: complexityPoints * Ktype."""
+    base_weight = float(getattr(question, 'complexityPoints', 1) or 1)
+    return base_weight * difficulty_factor_for_type(getattr(question, 'questionType', None))
 
 
 def compute_test_score(db, test_id: int, test_result_id: int) -> TestScoreBreakdown:
@@ -94,14 +100,7 @@ def compute_test_score(db, test_id: int, test_result_id: int) -> TestScoreBreakd
         # Без теста или результата возвращаем пустое значение.
         return TestScoreBreakdown(percent=0.0, weighted_points=0.0, max_points=0.0, accuracy_ratio=0.0, time_factor=1.0)
 
-    expected = float(getattr(test, 'durationInMinutes', 0) or 0)
-    actual = float(getattr(result, 'durationInMinutes', 0) or 0)
-    if actual <= 0 or expected <= 0:
-        time_factor = 1.0
-    else:
-        raw_ratio = expected / actual
-        # Бонус за прохождение быстрее эталона и штраф за превышение времени.
-        time_factor = max(0.5, min(1.25, raw_ratio))
+    time_factor = time_factor_for(getattr(test, 'durationInMinutes', 0), getattr(result, 'durationInMinutes', 0))
 
     questions = db.query(QuestionModel).filter(
         QuestionModel.testId == test_id).all()
@@ -120,221 +119,339 @@ def compute_test_score(db, test_id: int, test_result_id: int) -> TestScoreBreakd
         UserAnswerModel.testResultId == test_result_id).all()
     user_answers_dict = {ua.questionId: ua for ua in ua_rows}
 
-    max_points = 0.0
-    earned_points = 0.0
+    def graded():
+        for question in questions:
+            ua = user_answers_dict.get(question.id)
+            yield question_points(question), bool(ua and ua.isCorrect)
 
-    for question in questions:
-        base_weight = float(getattr(question, 'complexityPoints', 1) or 1)
-        type_factor = difficulty_factor_for_type(getattr(question, 'questionType', None))
-        question_points = base_weight * type_factor
-        max_points += question_points
+    return score_breakdown(graded(), time_factor)
 
-        ua = user_answers_dict.get(question.id)
-        if ua and ua.isCorrect:
-            earned_points += question_points
 
-    if max_points <= 0:
-        return TestScoreBreakdown(percent=0.0, weighted_points=0.0, max_points=0.0, accuracy_ratio=0.0, time_factor=time_factor)
+def record_test_score(db, result) -> None:
+    """Store the attempt as the latest score of its test for the user.
 
-    accuracy_ratio = earned_points / max_points
-    raw_percent = accuracy_ratio * 100.0
-    final_percent = max(0.0, min(100.0, raw_percent * time_factor))
+    `UserTestKnowledge` keeps exactly one row per (user, test), so module
+    knowledge can be averaged from stored latest scores instead of scanning
+    the attempt history of every test. Does not commit.
+    """
+    stmt = pg_insert(UserTestKnowledgeModel).values(
+        id=next_id(),
+        userId=result.userId,
+        testId=result.testId,
+        testResultId=result.id,
+        knowledge=float(result.result or 0),
+        lastUpdated=date.today(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserTestKnowledgeModel.userId, UserTestKnowledgeModel.testId],
+        set_={
+            'testResultId': stmt.excluded.testResultId,
+            'knowledge': stmt.excluded.knowledge,
+            'lastUpdated': stmt.excluded.lastUpdated,
+        },
+    )
+    db.execute(stmt)
 
-    return TestScoreBreakdown(
-        percent=final_percent,
-        weighted_points=earned_points,
-        max_points=max_points,
-        accuracy_ratio=accuracy_ratio,
-        time_factor=time_factor,
+
+def _knowledge_upsert(model, key_column, row: dict | None = None):
+    """INSERT ... ON CONFLICT (userId, <key>) DO UPDATE; without `row` the rows go as executemany params."""
+    stmt = pg_insert(model).values(**row) if row else pg_insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=[model.userId, key_column],
+        set_={'knowledge': stmt.excluded.knowledge, 'lastUpdated': stmt.excluded.lastUpdated},
+    )
+
+
+def upsert_module_knowledge(db, user_id: int, module_id: int, knowledge: float):
+    """Write `UserModuleKnowledge` of (user, module) in one statement; returns the row. Does not commit."""
+    stmt = _knowledge_upsert(UserModuleKnowledgeModel, UserModuleKnowledgeModel.moduleId, {
+        'id': next_id(),
+        'userId': user_id,
+        'moduleId': module_id,
+        'knowledge': knowledge,
+        'lastUpdated': date.today(),
+    })
+    return db.scalars(
+        stmt.returning(UserModuleKnowledgeModel), execution_options={'populate_existing': True}
+    ).one()
+
+
+def upsert_course_knowledge(db, user_id: int, course_id: int, knowledge: float):
+    """Write `UserCourseKnowledge` of (user, course) in one statement; returns the row. Does not commit."""
+    stmt = _knowledge_upsert(UserCourseKnowledgeModel, UserCourseKnowledgeModel.courseId, {
+        'id': next_id(),
+        'userId': user_id,
+        'courseId': course_id,
+        'knowledge': knowledge,
+        'lastUpdated': date.today(),
+    })
+    return db.scalars(
+        stmt.returning(UserCourseKnowledgeModel), execution_options={'populate_existing': True}
+    ).one()
+
+
+def mark_module_passed(db, user_id: int, module_id: int, passed: bool) -> None:
+    """Create the `ModulePassed` row of (user, module) or set it passed. Does not commit.
+
+    Статус прохождения монотонный: уже пройденный модуль не откатывается в
+    isPassed = False, даже если knowledge опустился ниже порога — иначе
+    следующие модули снова блокировались бы после неудачных пересдач.
+    """
+    db.execute(_module_passed_upsert({
+        'id': next_id(),
+        'userId': user_id,
+        'moduleId': module_id,
+        'isPassed': passed,
+        'datePassed': date.today() if passed else None,
+    }))
+
+
+def _module_passed_upsert(row: dict | None = None):
+    """Upsert of ModulePassed that only ever sets isPassed to True; without `row` for executemany."""
+    stmt = pg_insert(ModulePassedModel).values(**row) if row else pg_insert(ModulePassedModel)
+    return stmt.on_conflict_do_update(
+        index_elements=[ModulePassedModel.userId, ModulePassedModel.moduleId],
+        set_={'isPassed': True, 'datePassed': stmt.excluded.datePassed},
+        where=stmt.excluded.isPassed & ~ModulePassedModel.isPassed,
     )
 
 
 def compute_module_knowledge(db, user_id: int, module_id: int) -> float:
     """Aggregate the learner's mastery level for a module.
 
-    New formula (latest-per-test):
-    - Для каждого теста модуля берём последнюю попытку пользователя (по
-      полю `created_at`) для данного теста.
-    - Если у теста нет попыток — он пропускается при усреднении.
-    - Уровень знаний модуля = среднее арифметическое процентов последних
-      попыток по всем тестам модуля (только тесты с попытками).
-    Результат сохраняется в `UserModuleKnowledge` и при необходимости обновляет
-    запись в `ModulePassed` (порог 80%).
+    Формула (latest-per-test):
+    - Для каждого теста модуля берётся последняя попытка пользователя; она
+      хранится в `UserTestKnowledge` (см. `record_test_score`).
+    - Если у теста нет попыток — он учитывается как 0.0.
+    - Уровень знаний модуля = среднее арифметическое по всем тестам модуля.
+    Среднее считается одним агрегирующим запросом, поэтому стоимость не
+    зависит от числа тестов. Результат сохраняется в `UserModuleKnowledge` и
+    при необходимости обновляет запись в `ModulePassed` (порог 80%) в одной
+    транзакции.
     """
 
     import logging
-    from datetime import date
-    from sqlalchemy import desc
 
     logger = logging.getLogger(__name__)
 
-    tests = db.query(TestModel).filter(TestModel.moduleId == module_id).all()
-    if not tests:
+    tests_count, scores_sum = (
+        db.query(func.count(TestModel.id), func.coalesce(func.sum(UserTestKnowledgeModel.knowledge), 0.0))
+        .outerjoin(
+            UserTestKnowledgeModel,
+            and_(UserTestKnowledgeModel.testId == TestModel.id, UserTestKnowledgeModel.userId == user_id),
+        )
+        .filter(TestModel.moduleId == module_id)
+        .one()
+    )
+    if not tests_count:
         logger.info(f"No tests found for module {module_id}")
         return 0.0
 
+    knowledge = float(scores_sum) / float(tests_count)
     logger.info(
-        f"Computing knowledge (latest-per-test) for user {user_id}, module {module_id}, found {len(tests)} tests")
-
-    scores = []
-    for t in tests:
-        tr = (
-            db.query(TestResultModel)
-            .filter(TestResultModel.testId == t.id, TestResultModel.userId == user_id)
-            .order_by(TestResultModel.created_at.desc())
-            .first()
-        )
-        if not tr:
-            # No attempts for this test: treat as 0.0 (user hasn't started)
-            logger.debug(
-                f"No test result for test {t.id} (name: {getattr(t, 'name', 'N/A')}); counting as 0.0")
-            scores.append(0.0)
-            continue
-
-        percent = float(getattr(tr, 'result', 0) or 0)
-        logger.info(
-            f"Test {t.id} (name: {getattr(t, 'name', 'N/A')}): latest_result_id={getattr(tr, 'id', None)}, percent={percent}%")
-        scores.append(percent)
-
-    if not scores:
-        knowledge = 0.0
-        logger.info(f"No recent test attempts found for module {module_id}; knowledge = 0.0")
-    else:
-        knowledge = float(sum(scores)) / float(len(scores))
-        logger.info(
-            f"Computed module knowledge: {knowledge}% (from {len(scores)} test(s), latest scores: {scores})")
-
-    # persist UserModuleKnowledge
-    existing = (
-        db.query(UserModuleKnowledgeModel)
-        .filter(UserModuleKnowledgeModel.userId == user_id, UserModuleKnowledgeModel.moduleId == module_id)
-        .first()
-    )
-    if existing:
-        existing.knowledge = knowledge
-        existing.lastUpdated = date.today()
-        db.add(existing)
-        logger.info(f"Updated existing UserModuleKnowledge: {knowledge}%")
-    else:
-        umk = UserModuleKnowledgeModel()
-        umk.id = generate_random_id()
-        umk.userId = user_id
-        umk.moduleId = module_id
-        umk.knowledge = knowledge
-        umk.lastUpdated = date.today()
-        db.add(umk)
-        logger.info(f"Created new UserModuleKnowledge: {knowledge}%")
-
-    # Сначала коммитим UserModuleKnowledge
+        f"Computed module knowledge for user {user_id}, module {module_id}: {knowledge}% (from {tests_count} test(s))")
+
+    # Upserts по уникальным (userId, moduleId): параллельные сдачи не создают
+    # дублей и не теряют обновления
     try:
+        upsert_module_knowledge(db, user_id, module_id, knowledge)
+        mark_module_passed(db, user_id, module_id, knowledge >= MODULE_PASS_KNOWLEDGE)
         db.commit()
     except Exception as e:
-        logger.error(f"Error committing UserModuleKnowledge: {e}")
+        logger.error(f"Error saving module knowledge: {e}")
         db.rollback()
-
-    # update ModulePassed - create if not exists, update if knowledge >= 80%
-    mp = (
-        db.query(ModulePassedModel)
-        .filter(ModulePassedModel.userId == user_id, ModulePassedModel.moduleId == module_id)
-        .first()
-    )
-    if mp:
-        # ВАЖНО: статус прохождения модуля делаем монотонным.
-        # Если модуль уже был помечен как пройден, мы больше не "откатываем" isPassed в False
-        # даже если knowledge опустился ниже порога. Это предотвращает повторную блокировку
-        # следующих модулей после неудачных пересдач.
-        if knowledge >= 80.0 and not mp.isPassed:
-            mp.isPassed = True
-            mp.datePassed = date.today()
-            logger.info(f"Module {module_id} marked as passed (knowledge >= 80%)")
-        else:
-            logger.info(
-                f"Module {module_id} pass status unchanged (isPassed={mp.isPassed}, knowledge={knowledge}%)"
-            )
-        db.add(mp)
-        try:
-            db.commit()
-        except Exception as e:
-            logger.error(f"Error updating ModulePassed: {e}")
-            db.rollback()
     else:
-        # Создаём запись ModulePassed, если её ещё нет
-        mp = ModulePassedModel()
-        mp.id = generate_random_id()
-        mp.userId = user_id
-        mp.moduleId = module_id
-        mp.isPassed = knowledge >= 80.0
-        if mp.isPassed:
-            mp.datePassed = date.today()
-        db.add(mp)
-        logger.info(f"Created ModulePassed for module {module_id}: isPassed={mp.isPassed}, knowledge={knowledge}%")
-        try:
-            db.commit()
-        except Exception as e:
-            # Ошибка может возникнуть из-за неправильного уникального ограничения в БД
-            # (userId вместо userId+moduleId). Откатываем и продолжаем.
-            logger.error(f"Error creating ModulePassed (constraint issue?): {e}")
-            db.rollback()
+        invalidate_module_unlocks(user_id=user_id)
 
-    logger.info(f"Module knowledge computation completed: {knowledge}%")
     return knowledge
 
 
+def recompute_module_knowledge(db, module_id: int, user_ids: Iterable[int]) -> dict[int, float]:
+    """Recompute module knowledge of the given users in one pass.
+
+    Same formula as `compute_module_knowledge` (latest score per test from
+    `UserTestKnowledge`, tests without attempts count as 0), but with one
+    aggregate query for all users, then `UserModuleKnowledge` and
+    `ModulePassed` rows are upserted in batches and committed together.
+    Returns `{user_id: knowledge}`.
+    """
+    user_ids = sorted({int(u) for u in user_ids})
+    tests_count = db.query(func.count(TestModel.id)).filter(TestModel.moduleId == module_id).scalar()
+    if not tests_count or not user_ids:
+        return {}
+    sums = dict(
+        db.query(UserTestKnowledgeModel.userId, func.sum(UserTestKnowledgeModel.knowledge))
+        .join(TestModel, TestModel.id == UserTestKnowledgeModel.testId)
+        .filter(TestModel.moduleId == module_id, UserTestKnowledgeModel.userId.in_(user_ids))
+        .group_by(UserTestKnowledgeModel.userId)
+        .all()
+    )
+    knowledge_by_user = {user_id: float(sums.get(user_id) or 0.0) / float(tests_count) for user_id in user_ids}
+
+    today = date.today()
+    knowledge_rows = [
+        {'id': next_id(), 'userId': user_id, 'moduleId': module_id, 'knowledge': knowledge, 'lastUpdated': today}
+        for user_id, knowledge in knowledge_by_user.items()
+    ]
+    passed_rows = [
+        {
+            'id': next_id(), 'userId': user_id, 'moduleId': module_id,
+            'isPassed': knowledge >= MODULE_PASS_KNOWLEDGE,
+            'datePassed': today if knowledge >= MODULE_PASS_KNOWLEDGE else None,
+        }
+        for user_id, knowledge in knowledge_by_user.items()
+    ]
+    try:
+        db.execute(_knowledge_upsert(UserModuleKnowledgeModel, UserModuleKnowledgeModel.moduleId), knowledge_rows)
+        db.execute(_module_passed_upsert(), passed_rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for user_id in knowledge_by_user:
+        invalidate_module_unlocks(user_id=user_id)
+    return knowledge_by_user
+
+
+def _course_knowledge_query(db, course_id: int):
+    """Per-user course average: modules without UserModuleKnowledge count as 0."""
+    module_knowledge = func.coalesce(UserModuleKnowledgeModel.knowledge, 0.0)
+    return (
+        db.query(
+            func.count(ModuleModel.id),
+            func.coalesce(func.sum(module_knowledge), 0.0),
+        )
+        .select_from(ModuleModel)
+        .filter(ModuleModel.courseId == course_id)
+    )
+
+
 def compute_course_knowledge(db, user_id: int, course_id: int) -> float:
     """Aggregate course-level knowledge by averaging module mastery.
 
-    Новая формула:
-    - Берём все модули курса.
-    - Для каждого модуля берём `UserModuleKnowledge.knowledge` для пользователя.
-      Если записи нет, пересчитываем через `compute_module_knowledge` (что даёт
-      0.0, если у модуля ещё нет попыток).
+    Формула:
+    - Берём все модули курса и `UserModuleKnowledge.knowledge` пользователя по ним.
+    - Модуль без записи даёт вклад 0 (так же, как `compute_module_knowledge`
+      для модуля без попыток).
     - Уровень знаний курса = среднее арифметическое знаний по всем модулям курса.
-      Таким образом, модуль без знаний даёт вклад 0.
-    Полученный процент сохраняется в `UserCourseKnowledge`.
+    Среднее считается одним запросом, результат сохраняется в
+    `UserCourseKnowledge` одной транзакцией.
     """
 
-    modules = db.query(ModuleModel).filter(ModuleModel.courseId == course_id).all()
-    if not modules:
+    modules_count, knowledge_sum = (
+        _course_knowledge_query(db, course_id)
+        .outerjoin(
+            UserModuleKnowledgeModel,
+            and_(UserModuleKnowledgeModel.moduleId == ModuleModel.id, UserModuleKnowledgeModel.userId == user_id),
+        )
+        .one()
+    )
+    if not modules_count:
         return 0.0
 
-    per_module_values: list[float] = []
-
-    for m in modules:
-        # Пытаемся взять уже сохранённое значение знаний по модулю
-        umk = (
-            db.query(UserModuleKnowledgeModel)
-            .filter(
-                UserModuleKnowledgeModel.userId == user_id,
-                UserModuleKnowledgeModel.moduleId == m.id,
-            )
-            .first()
+    knowledge = float(knowledge_sum) / float(modules_count)
+
+    upsert_course_knowledge(db, user_id, course_id, knowledge)
+    db.commit()
+    return knowledge
+
+
+def recompute_course_knowledge(db, course_id: int) -> dict[int, float]:
+    """Recompute course knowledge for every enrolled student in one pass.
+
+    One aggregate query over enrollments x modules, then all
+    `UserCourseKnowledge` rows are upserted with one batched statement and
+    committed together. Returns `{user_id: knowledge}`.
+    """
+
+    rows = (
+        _course_knowledge_query(db, course_id)
+        .add_columns(CourseEnrollmentModel.userId)
+        .join(CourseEnrollmentModel, CourseEnrollmentModel.courseId == ModuleModel.courseId)
+        .outerjoin(
+            UserModuleKnowledgeModel,
+            and_(
+                UserModuleKnowledgeModel.moduleId == ModuleModel.id,
+                UserModuleKnowledgeModel.userId == CourseEnrollmentModel.userId,
+            ),
         )
-        if umk is not None:
-            per_module_values.append(float(getattr(umk, "knowledge", 0.0) or 0.0))
-        else:
-            # Если записи нет, пересчитываем знания по модулю (даст 0.0, если нет попыток)
-            value = compute_module_knowledge(db, user_id, m.id)
-            per_module_values.append(float(value or 0.0))
-
-    knowledge = float(sum(per_module_values)) / float(len(per_module_values))
-
-    existing_course = (
-        db.query(UserCourseKnowledgeModel)
-        .filter(UserCourseKnowledgeModel.userId == user_id, UserCourseKnowledgeModel.courseId == course_id)
-        .first()
+        .group_by(CourseEnrollmentModel.userId)
+        .all()
     )
-    if existing_course:
-        existing_course.knowledge = knowledge
-        existing_course.lastUpdated = date.today()
-        db.add(existing_course)
-    else:
-        uck = UserCourseKnowledgeModel()
-        uck.id = generate_random_id()
-        uck.userId = user_id
-        uck.courseId = course_id
-        uck.knowledge = knowledge
-        uck.lastUpdated = date.today()
-        db.add(uck)
+    knowledge_by_user = {
+        int(user_id): float(knowledge_sum) / float(modules_count)
+        for modules_count, knowledge_sum, user_id in rows
+        if modules_count
+    }
+    if not knowledge_by_user:
+        return {}
+
+    today = date.today()
+    rows = [
+        {'id': next_id(), 'userId': user_id, 'courseId': course_id, 'knowledge': knowledge, 'lastUpdated': today}
+        for user_id, knowledge in knowledge_by_user.items()
+    ]
+    try:
+        db.execute(_knowledge_upsert(UserCourseKnowledgeModel, UserCourseKnowledgeModel.courseId), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return knowledge_by_user
+
+
+def refresh_knowledge_for_result(db, result) -> tuple[Optional[float], Optional[float]]:
+    """Recompute module/course knowledge after a test attempt and mark it done.
+
+    Returns `(module_knowledge, course_knowledge)`; None where the test has no
+    module or course.
+    """
+
+    test = db.get(TestModel, result.testId)
+    module_id = getattr(test, 'moduleId', None)
+    course_id = getattr(test, 'courseId', None)
+    if course_id is None and module_id is not None:
+        module = db.get(ModuleModel, module_id)
+        course_id = module.courseId if module else None
 
+    module_knowledge = compute_module_knowledge(db, result.userId, module_id) if module_id else None
+    course_knowledge = compute_course_knowledge(db, result.userId, course_id) if course_id else None
+
+    result.knowledgeUpdatedAt = func.now()
+    db.add(result)
     db.commit()
-    return knowledge
+    return module_knowledge, course_knowledge
+
+
+def run_knowledge_job(result_id: int) -> None:
+    """Background task for `submit_test` (and for a stale result polled through
+    `get_result_knowledge`): uses its own session.
+
+    A session-level advisory lock on the result id lets only one run recompute
+    an attempt; a run that finds it taken, or the attempt already done, returns.
+    """
+    import logging
+
+    logger = logging.getLogger(__name__)
+    # the knowledge functions commit on the way, so the lock lives on its own connection
+    with engine.connect() as lock_conn:
+        locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {'id': result_id}).scalar_one()
+        lock_conn.commit()
+        if not locked:
+            return
+        db = SessionLocal()
+        try:
+            result = db.get(TestResultModel, result_id)
+            if result is None or result.knowledgeUpdatedAt is not None:
+                return
+            module_knowledge, course_knowledge = refresh_knowledge_for_result(db, result)
+            mark_user_write(result.userId)
+            logger.info(
+                f"Knowledge for result {result_id}: module={module_knowledge}%, course={course_knowledge}%")
+        except Exception as e:
+            logger.error(f"Error recomputing knowledge for result {result_id}: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': result_id})
+            lock_conn.commit()
@@ -469,15 +469,27 @@ export default class FullApi {
 
     /**
      * Список всех ответов
-     * Возвращает все записи UserAnswer. Только для администраторов.
+     * Возвращает записи UserAnswer. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [testResultId] 
+     * @param {Number} [questionId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Array.<module:model/UserAnswerRead>} and HTTP response
      */
-    adminListAnswersFullAdminAnswersGetWithHttpInfo() {
+    adminListAnswersFullAdminAnswersGetWithHttpInfo(opts) {
+      opts = opts || {};
       let postBody = null;
 
       let pathParams = {
       };
       let queryParams = {
+        'userId': opts['userId'],
+        'testResultId': opts['testResultId'],
+        'questionId': opts['questionId'],
+        'after_id': opts['afterId'],
+        'limit': opts['limit']
       };
       let headerParams = {
       };
@@ -497,11 +509,17 @@ export default class FullApi {
 
     /**
      * Список всех ответов
-     * Возвращает все записи UserAnswer. Только для администраторов.
+     * Возвращает записи UserAnswer. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [testResultId] 
+     * @param {Number} [questionId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Array.<module:model/UserAnswerRead>}
      */
-    adminListAnswersFullAdminAnswersGet() {
-      return this.adminListAnswersFullAdminAnswersGetWithHttpInfo()
+    adminListAnswersFullAdminAnswersGet(opts) {
+      return this.adminListAnswersFullAdminAnswersGetWithHttpInfo(opts)
         .then(function(response_and_data) {
           return response_and_data.data;
         });
@@ -510,14 +528,25 @@ export default class FullApi {
 
     /**
      * Список знаний по курсам
+     * Возвращает записи UserCourseKnowledge. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [courseId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Array.<module:model/UserCourseKnowledgeRead>} and HTTP response
      */
-    adminListCourseKnowledgeFullAdminCourseKnowledgeGetWithHttpInfo() {
+    adminListCourseKnowledgeFullAdminCourseKnowledgeGetWithHttpInfo(opts) {
+      opts = opts || {};
       let postBody = null;
 
       let pathParams = {
       };
       let queryParams = {
+        'userId': opts['userId'],
+        'courseId': opts['courseId'],
+        'after_id': opts['afterId'],
+        'limit': opts['limit']
       };
       let headerParams = {
       };
@@ -537,10 +566,16 @@ export default class FullApi {
 
     /**
      * Список знаний по курсам
+     * Возвращает записи UserCourseKnowledge. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [courseId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Array.<module:model/UserCourseKnowledgeRead>}
      */
-    adminListCourseKnowledgeFullAdminCourseKnowledgeGet() {
-      return this.adminListCourseKnowledgeFullAdminCourseKnowledgeGetWithHttpInfo()
+    adminListCourseKnowledgeFullAdminCourseKnowledgeGet(opts) {
+      return this.adminListCourseKnowledgeFullAdminCourseKnowledgeGetWithHttpInfo(opts)
         .then(function(response_and_data) {
           return response_and_data.data;
         });
@@ -549,15 +584,25 @@ export default class FullApi {
 
     /**
      * Список всех записей на курсы
-     * Возвращает все записи студентов на курсы. Доступно только администраторам.
+     * Возвращает записи студентов на курсы. Доступно только администраторам. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [courseId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
      */
-    adminListEnrollmentsFullAdminEnrollmentsGetWithHttpInfo() {
+    adminListEnrollmentsFullAdminEnrollmentsGetWithHttpInfo(opts) {
+      opts = opts || {};
       let postBody = null;
 
       let pathParams = {
       };
       let queryParams = {
+        'userId': opts['userId'],
+        'courseId': opts['courseId'],
+        'after_id': opts['afterId'],
+        'limit': opts['limit']
       };
       let headerParams = {
       };
@@ -577,11 +622,16 @@ export default class FullApi {
 
     /**
      * Список всех записей на курсы
-     * Возвращает все записи студентов на курсы. Доступно только администраторам.
+     * Возвращает записи студентов на курсы. Доступно только администраторам. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [courseId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
      */
-    adminListEnrollmentsFullAdminEnrollmentsGet() {
-      return this.adminListEnrollmentsFullAdminEnrollmentsGetWithHttpInfo()
+    adminListEnrollmentsFullAdminEnrollmentsGet(opts) {
+      return this.adminListEnrollmentsFullAdminEnrollmentsGetWithHttpInfo(opts)
         .then(function(response_and_data) {
           return response_and_data.data;
         });
@@ -590,15 +640,25 @@ export default class FullApi {
 
     /**
      * Список знаний по модулям
-     * Возвращает все записи UserModuleKnowledge. Только для администраторов.
+     * Возвращает записи UserModuleKnowledge. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [moduleId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Array.<module:model/UserModuleKnowledgeRead>} and HTTP response
      */
-    adminListModuleKnowledgeFullAdminModuleKnowledgeGetWithHttpInfo() {
+    adminListModuleKnowledgeFullAdminModuleKnowledgeGetWithHttpInfo(opts) {
+      opts = opts || {};
       let postBody = null;
 
       let pathParams = {
       };
       let queryParams = {
+        'userId': opts['userId'],
+        'moduleId': opts['moduleId'],
+        'after_id': opts['afterId'],
+        'limit': opts['limit']
       };
       let headerParams = {
       };
@@ -618,11 +678,16 @@ export default class FullApi {
 
     /**
      * Список знаний по модулям
-     * Возвращает все записи UserModuleKnowledge. Только для администраторов.
+     * Возвращает записи UserModuleKnowledge. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [moduleId] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Array.<module:model/UserModuleKnowledgeRead>}
      */
-    adminListModuleKnowledgeFullAdminModuleKnowledgeGet() {
-      return this.adminListModuleKnowledgeFullAdminModuleKnowledgeGetWithHttpInfo()
+    adminListModuleKnowledgeFullAdminModuleKnowledgeGet(opts) {
+      return this.adminListModuleKnowledgeFullAdminModuleKnowledgeGetWithHttpInfo(opts)
         .then(function(response_and_data) {
           return response_and_data.data;
         });
@@ -631,15 +696,27 @@ export default class FullApi {
 
     /**
      * Список статусов прохождения модулей
-     * Возвращает все записи о прохождении модулей пользователями. Только для администраторов.
+     * Возвращает записи о прохождении модулей пользователями. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [moduleId] 
+     * @param {Boolean} [isPassed] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
      */
-    adminListModulePassedFullAdminModulePassedGetWithHttpInfo() {
+    adminListModulePassedFullAdminModulePassedGetWithHttpInfo(opts) {
+      opts = opts || {};
       let postBody = null;
 
       let pathParams = {
       };
       let queryParams = {
+        'userId': opts['userId'],
+        'moduleId': opts['moduleId'],
+        'isPassed': opts['isPassed'],
+        'after_id': opts['afterId'],
+        'limit': opts['limit']
       };
       let headerParams = {
       };
@@ -659,11 +736,17 @@ export default class FullApi {
 
     /**
      * Список статусов прохождения модулей
-     * Возвращает все записи о прохождении модулей пользователями. Только для администраторов.
+     * Возвращает записи о прохождении модулей пользователями. Только для администраторов. Постраничный вывод по id: after_id и limit, курсор следующей страницы — в заголовке X-Next-Cursor.
+     * @param {Object} opts Optional parameters
+     * @param {Number} [userId] 
+     * @param {Number} [moduleId] 
+     * @param {Boolean} [isPassed] 
+     * @param {Number} [afterId] 
+     * @param {Number} [limit] 
      * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
      */
-    adminListModulePassedFullAdminModulePassedGet() {
-      return this.adminListModulePassedFullAdminModulePassedGetWithHttpInfo()
+    adminListModulePassedFullAdminModulePassedGet(opts) {
+      return this.adminListModulePassedFullAdminModulePassedGetWithHttpInfo(opts)
         .then(function(response_and_data) {
           return response_and_data.data;
         });
@@ -1146,6 +1229,54 @@ export default class FullApi {
     }
 
 
+    /**
+     * Курс для прохождения
+     * Возвращает курс целиком (модули, темы, тесты) с прогрессом и блокировками текущего пользователя. Доступно автору курса, записанным студентам и администратору.
+     * @param {Number} courseId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
+     */
+    getCourseStudyViewFullCoursesCourseIdStudyViewGetWithHttpInfo(courseId) {
+      let postBody = null;
+      // verify the required parameter 'courseId' is set
+      if (courseId === undefined || courseId === null) {
+        throw new Error("Missing the required parameter 'courseId' when calling getCourseStudyViewFullCoursesCourseIdStudyViewGet");
+      }
+
+      let pathParams = {
+        'course_id': courseId
+      };
+      let queryParams = {
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = ['OAuth2PasswordBearer'];
+      let contentTypes = [];
+      let accepts = ['application/json'];
+      let returnType = Object;
+      return this.apiClient.callApi(
+        '/full/courses/{course_id}/study-view', 'GET',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, null
+      );
+    }
+
+    /**
+     * Курс для прохождения
+     * Возвращает курс целиком (модули, темы, тесты) с прогрессом и блокировками текущего пользователя. Доступно автору курса, записанным студентам и администратору.
+     * @param {Number} courseId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
+     */
+    getCourseStudyViewFullCoursesCourseIdStudyViewGet(courseId) {
+      return this.getCourseStudyViewFullCoursesCourseIdStudyViewGetWithHttpInfo(courseId)
+        .then(function(response_and_data) {
+          return response_and_data.data;
+        });
+    }
+
+
     /**
      * Получить разрешение
      * Возвращает разрешение по идентификатору. Только для администраторов.
@@ -1242,6 +1373,54 @@ export default class FullApi {
     }
 
 
+    /**
+     * Знания после попытки теста
+     * Возвращает флаг готовности и пересчитанные уровни знаний по модулю и курсу для попытки текущего пользователя.
+     * @param {Number} resultId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
+     */
+    getResultKnowledgeFullResultsResultIdKnowledgeGetWithHttpInfo(resultId) {
+      let postBody = null;
+      // verify the required parameter 'resultId' is set
+      if (resultId === undefined || resultId === null) {
+        throw new Error("Missing the required parameter 'resultId' when calling getResultKnowledgeFullResultsResultIdKnowledgeGet");
+      }
+
+      let pathParams = {
+        'result_id': resultId
+      };
+      let queryParams = {
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = ['OAuth2PasswordBearer'];
+      let contentTypes = [];
+      let accepts = ['application/json'];
+      let returnType = Object;
+      return this.apiClient.callApi(
+        '/full/results/{result_id}/knowledge', 'GET',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, null
+      );
+    }
+
+    /**
+     * Знания после попытки теста
+     * Возвращает флаг готовности и пересчитанные уровни знаний по модулю и курсу для попытки текущего пользователя.
+     * @param {Number} resultId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
+     */
+    getResultKnowledgeFullResultsResultIdKnowledgeGet(resultId) {
+      return this.getResultKnowledgeFullResultsResultIdKnowledgeGetWithHttpInfo(resultId)
+        .then(function(response_and_data) {
+          return response_and_data.data;
+        });
+    }
+
+
     /**
      * Получить роль
      * Возвращает данные роли по идентификатору. Только для администраторов.
@@ -1204,6 +1204,102 @@ export default class TeachingApi {
     }
 
 
+    /**
+     * Бланк теста
+     * Возвращает тест с вопросами и вариантами ответов одним запросом, без признаков правильности. Доступно автору курса, администратору и записанным студентам (для теста модуля — если модуль открыт).
+     * @param {Number} testId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
+     */
+    getTestPaperFullTestsTestIdPaperGetWithHttpInfo(testId) {
+      let postBody = null;
+      // verify the required parameter 'testId' is set
+      if (testId === undefined || testId === null) {
+        throw new Error("Missing the required parameter 'testId' when calling getTestPaperFullTestsTestIdPaperGet");
+      }
+
+      let pathParams = {
+        'test_id': testId
+      };
+      let queryParams = {
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = ['OAuth2PasswordBearer'];
+      let contentTypes = [];
+      let accepts = ['application/json'];
+      let returnType = Object;
+      return this.apiClient.callApi(
+        '/full/tests/{test_id}/paper', 'GET',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, null
+      );
+    }
+
+    /**
+     * Бланк теста
+     * Возвращает тест с вопросами и вариантами ответов одним запросом, без признаков правильности. Доступно автору курса, администратору и записанным студентам (для теста модуля — если модуль открыт).
+     * @param {Number} testId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
+     */
+    getTestPaperFullTestsTestIdPaperGet(testId) {
+      return this.getTestPaperFullTestsTestIdPaperGetWithHttpInfo(testId)
+        .then(function(response_and_data) {
+          return response_and_data.data;
+        });
+    }
+
+
+    /**
+     * Вопросы и ответы теста
+     * Возвращает тест со всеми вопросами и вариантами ответов (с признаками правильности) для редактирования. Доступно автору курса и администратору.
+     * @param {Number} testId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
+     */
+    getTestTreeFullTestsTestIdTreeGetWithHttpInfo(testId) {
+      let postBody = null;
+      // verify the required parameter 'testId' is set
+      if (testId === undefined || testId === null) {
+        throw new Error("Missing the required parameter 'testId' when calling getTestTreeFullTestsTestIdTreeGet");
+      }
+
+      let pathParams = {
+        'test_id': testId
+      };
+      let queryParams = {
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = ['OAuth2PasswordBearer'];
+      let contentTypes = [];
+      let accepts = ['application/json'];
+      let returnType = Object;
+      return this.apiClient.callApi(
+        '/full/tests/{test_id}/tree', 'GET',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, null
+      );
+    }
+
+    /**
+     * Вопросы и ответы теста
+     * Возвращает тест со всеми вопросами и вариантами ответов (с признаками правильности) для редактирования. Доступно автору курса и администратору.
+     * @param {Number} testId 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
+     */
+    getTestTreeFullTestsTestIdTreeGet(testId) {
+      return this.getTestTreeFullTestsTestIdTreeGetWithHttpInfo(testId)
+        .then(function(response_and_data) {
+          return response_and_data.data;
+        });
+    }
+
+
     /**
      * Получить материал темы
      * Возвращает метаданные материала темы с проверкой доступа.
@@ -1771,6 +1867,60 @@ export default class TeachingApi {
     }
 
 
+    /**
+     * Сохранить вопросы и ответы теста
+     * Принимает полный список вопросов теста с вариантами ответов, сравнивает его с сохранённым и одной транзакцией создаёт новые (без id), обновляет изменённые и удаляет отсутствующие вопросы и ответы. Вопросы, на которые уже отвечали студенты, удалить нельзя (409). Доступно автору курса и администратору.
+     * @param {Number} testId 
+     * @param {Object} testTreeIn 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with an object containing data of type {@link Object} and HTTP response
+     */
+    saveTestTreeFullTestsTestIdTreePutWithHttpInfo(testId, testTreeIn) {
+      let postBody = testTreeIn;
+      // verify the required parameter 'testId' is set
+      if (testId === undefined || testId === null) {
+        throw new Error("Missing the required parameter 'testId' when calling saveTestTreeFullTestsTestIdTreePut");
+      }
+      // verify the required parameter 'testTreeIn' is set
+      if (testTreeIn === undefined || testTreeIn === null) {
+        throw new Error("Missing the required parameter 'testTreeIn' when calling saveTestTreeFullTestsTestIdTreePut");
+      }
+
+      let pathParams = {
+        'test_id': testId
+      };
+      let queryParams = {
+      };
+      let headerParams = {
+      };
+      let formParams = {
+      };
+
+      let authNames = ['OAuth2PasswordBearer'];
+      let contentTypes = ['application/json'];
+      let accepts = ['application/json'];
+      let returnType = Object;
+      return this.apiClient.callApi(
+        '/full/tests/{test_id}/tree', 'PUT',
+        pathParams, queryParams, headerParams, formParams, postBody,
+        authNames, contentTypes, accepts, returnType, null
+      );
+    }
+
+    /**
+     * Сохранить вопросы и ответы теста
+     * Принимает полный список вопросов теста с вариантами ответов, сравнивает его с сохранённым и одной транзакцией создаёт новые (без id), обновляет изменённые и удаляет отсутствующие вопросы и ответы. Вопросы, на которые уже отвечали студенты, удалить нельзя (409). Доступно автору курса и администратору.
+     * @param {Number} testId 
+     * @param {Object} testTreeIn 
+     * @return {Promise} a {@link https://www.promisejs.org/|Promise}, with data of type {@link Object}
+     */
+    saveTestTreeFullTestsTestIdTreePut(testId, testTreeIn) {
+      return this.saveTestTreeFullTestsTestIdTreePutWithHttpInfo(testId, testTreeIn)
+        .then(function(response_and_data) {
+          return response_and_data.data;
+        });
+    }
+
+
     /**
      * Отдать картинку курса
      * Возвращает файл картинки курса по имени.
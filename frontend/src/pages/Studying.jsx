@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react";
 import { useParams, useNavigate } from "react-router-dom";
-import { TeachingApi, FullApi } from "../api/index.js";
+import { FullApi } from "../api/index.js";
 
 export default function Studying() {
   const { courseId } = useParams();
@@ -33,171 +33,55 @@ export default function Studying() {
         return;
       }
 
-      const teachingApi = new TeachingApi();
       const fullApi = new FullApi();
 
       if (token) {
-        teachingApi.apiClient.defaultHeaders["Authorization"] = `Bearer ${token}`;
         fullApi.apiClient.defaultHeaders["Authorization"] = `Bearer ${token}`;
       }
 
       try {
-        const courseData = await teachingApi.getCourseFullCoursesCourseIdGet(id);
-        setCourse(courseData);
+        // Один запрос: курс, модули, темы, тесты, прогресс и блокировки
+        const view = await fullApi.getCourseStudyViewFullCoursesCourseIdStudyViewGet(id);
+        const modulesData = view.modules || [];
 
-        // Проверяем, является ли текущий пользователь автором курса
-        const usersApi = new (await import("../api/index.js")).UsersApi();
-        if (token) {
-          usersApi.apiClient.defaultHeaders["Authorization"] = `Bearer ${token}`;
-        }
-        const currentUser = await usersApi.meUsersMeGet();
-        const authorCheck = courseData.authorId === currentUser.id;
-        setIsAuthor(authorCheck);
-
-        // Загружаем уровень знаний по курсу (попытаемся получить всегда, если пользователь авторизован)
-        try {
-          const knowledgeData = await fullApi.myCourseKnowledgeFullMeCoursesKnowledgeGet();
-          const courseKnowledgeItem = (knowledgeData || []).find(k => k.courseId === id);
-          if (courseKnowledgeItem && courseKnowledgeItem.knowledge !== undefined) {
-            setCourseKnowledge(Math.round(courseKnowledgeItem.knowledge));
-          } else {
-            setCourseKnowledge(0);
-          }
-        } catch (err) {
-          // Если неавторизован или ошибка — просто показываем 0
-          console.debug("Не удалось загрузить знания курса (возможно неавторизован):", err?.message || err);
-          setCourseKnowledge(0);
-        }
-
-        if (courseData.categoryId) {
-          try {
-            const catData = await fullApi.getCategoryFullAdminCategoriesCatIdGet(courseData.categoryId);
-            setCategory(catData);
-          } catch (err) {
-            setCategory({ name: "Неизвестная категория" });
-          }
-        } else {
-          setCategory({ name: "Без категории" });
-        }
+        setCourse(view.course);
+        setIsAuthor(view.isAuthor);
+        setCourseKnowledge(Math.round(view.courseKnowledge || 0));
+        setCategory(view.category || { name: "Без категории" });
+        setCourseTest(view.courseTest || null);
+        setAllModulesPassed(view.allModulesPassed);
 
-        const modulesData = await teachingApi.listModulesForCourseFullCoursesCourseIdModulesGet(id);
-        
-        // Загружаем знания по модулям СРАЗУ для определения блокировки
-        let moduleKnowledgeData = [];
-        if (!authorCheck) {
-          try {
-            moduleKnowledgeData = await fullApi.myModuleKnowledgeFullMeModulesKnowledgeGet();
-          } catch (err) {
-            console.error("Ошибка загрузки знаний по модулям:", err);
-            moduleKnowledgeData = [];
-          }
-        }
-        
-        // Создаем карту знаний по модулям
-        const knowledgeMap = {};
-        (moduleKnowledgeData || []).forEach((m) => {
-          knowledgeMap[m.moduleId] = m.knowledge || 0;
-        });
-        
-        // Определяем блокировку модулей на основе знаний
-        // Модуль заблокирован, если предыдущий модуль не пройден (knowledge < 80%)
         const locks = {};
-        if (!authorCheck && modulesData.length > 0) {
-          modulesData.forEach((module, i) => {
-            if (i === 0) {
-              // Первый модуль всегда доступен
-              locks[module.id] = { isLocked: false, message: "", isPassed: false };
-            } else {
-              // Проверяем, пройден ли предыдущий модуль
-              const prevModule = modulesData[i - 1];
-              const prevKnowledge = knowledgeMap[prevModule.id] || 0;
-              const isPrevModulePassed = prevKnowledge >= 80;
-              
-              locks[module.id] = { 
-                isLocked: !isPrevModulePassed, 
-                message: !isPrevModulePassed ? "Модуль заблокирован. Пройдите предыдущий модуль." : "", 
-                isPassed: false 
-              };
-            }
-          });
-          
-          // Проверяем, все ли модули пройдены для теста курса
-          const allModulesUnlocked = Object.values(locks).every(lock => !lock.isLocked);
-          const lastModule = modulesData[modulesData.length - 1];
-          const lastModuleKnowledge = knowledgeMap[lastModule.id] || 0;
-          const lastModulePassed = lastModuleKnowledge >= 80;
-          const allPassed = allModulesUnlocked && lastModulePassed;
-          setAllModulesPassed(allPassed);
-        } else if (authorCheck) {
-          // Автор курса имеет доступ ко всему
-          modulesData.forEach(module => {
-            locks[module.id] = { isLocked: false, message: "", isPassed: false };
-          });
-          setAllModulesPassed(true);
-        }
-        
-        // Устанавливаем состояние блокировки СРАЗУ
-        setModuleLocks(locks);
-        
-        // Теперь рендерим модули
-        setModules(modulesData);
-
-        // Загружаем тест курса
-        try {
-          const courseTests = await teachingApi.listTestsFullTestsGet({ courseId: id });
-          if (courseTests && courseTests.length > 0) {
-            setCourseTest(courseTests[0]);
-          }
-        } catch (err) {
-          console.error("Ошибка загрузки теста курса:", err);
-        }
-
-        // Загружаем тесты для каждого модуля
+        const topicsMap = {};
         const testsMap = {};
-        for (const module of modulesData) {
-          try {
-            const moduleTestsData = await teachingApi.listTestsFullTestsGet({ moduleId: module.id });
-            testsMap[module.id] = moduleTestsData || [];
-          } catch (err) {
-            console.error(`Ошибка загрузки тестов модуля ${module.id}:`, err);
-            testsMap[module.id] = [];
-          }
-        }
-        setModuleTests(testsMap);
-
-        // Обновляем карту знаний по модулям (для прогресс-баров)
-        // Знания уже загружены выше для определения блокировки
-          const map = {};
-        (moduleKnowledgeData || []).forEach((m) => {
-          map[m.moduleId] = Math.round(m.knowledge || 0);
-          });
-          setModuleKnowledgeMap(map);
-        
-        // Загружаем результаты тестов
-        try {
-
-          // additionally fetch my test results to determine best result per test
-          try {
-            const myResults = await fullApi.myResultsFullResultsGet();
-            const best = {};
-            (myResults || []).forEach((r) => {
-              const tId = r.testId;
-              const percent = r.result ?? r.percent ?? 0;
-              const isPassed = r.isPassed ?? r.passed ?? false;
-              if (!best[tId] || percent > best[tId].percent) {
-                best[tId] = { percent, isPassed };
-              }
-            });
-            setBestTestResults(best);
-          } catch (err) {
-            console.debug("Не удалось загрузить мои результаты:", err?.message || err);
+        const knowledgeMap = {};
+        const best = {};
+        const collectBest = (t) => {
+          if (t.bestPercent !== null && t.bestPercent !== undefined) {
+            best[t.id] = { percent: t.bestPercent, isPassed: t.bestPassed };
           }
-
-        } catch (err) {
-          console.error("Ошибка загрузки уровня знаний модулей:", err);
-          setModuleKnowledgeMap({});
+        };
+        modulesData.forEach((module) => {
+          locks[module.id] = {
+            isLocked: module.isLocked,
+            message: module.isLocked ? "Модуль заблокирован. Пройдите предыдущий модуль." : "",
+            isPassed: module.isPassed
+          };
+          topicsMap[module.id] = module.topics || [];
+          testsMap[module.id] = module.tests || [];
+          knowledgeMap[module.id] = Math.round(module.knowledge || 0);
+          (module.tests || []).forEach(collectBest);
+        });
+        if (view.courseTest) {
+          collectBest(view.courseTest);
         }
 
+        setModuleLocks(locks);
+        setModuleTopics(topicsMap);
+        setModuleTests(testsMap);
+        setModuleKnowledgeMap(knowledgeMap);
+        setBestTestResults(best);
+        setModules(modulesData);
       } catch (err) {
         console.error("Ошибка при загрузке курса:", err);
         if (err.status === 401 || err.status === 403) {
@@ -213,7 +97,7 @@ export default function Studying() {
     fetchData();
   }, [courseId, token]);
 
-  const handleModuleToggle = async (moduleId) => {
+  const handleModuleToggle = (moduleId) => {
     const lock = moduleLocks[moduleId];
     if (lock?.isLocked) {
       return;
@@ -222,39 +106,8 @@ export default function Studying() {
     const willExpand = !newExpanded.has(moduleId);
     if (willExpand) newExpanded.add(moduleId); else newExpanded.delete(moduleId);
 
-    // set expanded state immediately for faster UI feedback
+    // Темы уже пришли вместе с курсом — просто раскрываем модуль
     setExpandedModules(newExpanded);
-    console.log("Module toggle", moduleId, "willExpand=", willExpand);
-
-    if (willExpand && !moduleTopics[moduleId]) {
-      try {
-        const teachingApi = new TeachingApi();
-        if (token) {
-          teachingApi.apiClient.defaultHeaders["Authorization"] = `Bearer ${token}`;
-        }
-        const topics = await teachingApi.listTopicsFullCoursesCourseIdModulesModuleIdTopicsGet(
-          Number(courseId),
-          moduleId
-        );
-        console.log("Loaded topics for module", moduleId, "count=", (topics || []).length);
-        setModuleTopics((prev) => ({
-          ...prev,
-          [moduleId]: topics || []
-        }));
-      } catch (err) {
-        console.error("Ошибка загрузки тем модуля:", err, err?.response || err?.message);
-        if (err.status === 403 || err.response?.data?.detail === "Module locked") {
-          setModuleLocks((prev) => ({
-            ...prev,
-            [moduleId]: { isLocked: true, message: "Модуль заблокирован. Пройдите предыдущий модуль." }
-          }));
-        }
-        setModuleTopics((prev) => ({
-          ...prev,
-          [moduleId]: []
-        }));
-      }
-    }
   };
 
   const handleTopicClick = (topicId) => {
@@ -43,30 +43,14 @@ export default function TestEdit() {
 
     const fetchTestData = async () => {
       try {
-        // Загрузка теста
-        const testData = await teachingApi.getTestFullTestsTestIdGet(id);
+        // Тест со всеми вопросами и ответами одним запросом
+        const { questions: questionsData, ...testData } = await teachingApi.getTestTreeFullTestsTestIdTreeGet(id);
         setTest(testData);
 
         // Загрузка тем для привязки вопросов
         await loadTopics(testData, teachingApi);
 
-        // Загрузка вопросов
-        const questionsData = await teachingApi.listQuestionsFullTestsTestIdQuestionsGet(id);
-
-        // Загрузка ответов для каждого вопроса
-        const questionsWithAnswers = await Promise.all(
-          (questionsData || []).map(async (q) => {
-            try {
-              const answersData = await teachingApi.listAnswersFullQuestionsQuestionIdAnswersGet(q.id);
-              return { ...q, answers: answersData || [] };
-            } catch (err) {
-              console.warn(`Не удалось загрузить ответы для вопроса ${q.id}`);
-              return { ...q, answers: [] };
-            }
-          })
-        );
-
-        setQuestions(questionsWithAnswers);
+        setQuestions(questionsData || []);
       } catch (err) {
         console.error("Ошибка при загрузке теста или вопросов:", err);
         setError("Не удалось загрузить тест");
@@ -306,41 +290,25 @@ export default function TestEdit() {
     }
 
     try {
-      const testPayload = {
+      // Тест, вопросы и ответы сохраняются одним запросом и одной транзакцией
+      const saved = await teachingApi.saveTestTreeFullTestsTestIdTreePut(id, {
         name: test.name.trim(),
         description: test.description || "",
         durationInMinutes: Number(test.durationInMinutes),
-        moduleId: null,
-        courseId: null,
-      };
-
-      // Ensure exactly one of moduleId/courseId is set (server requires this)
-      if (effectiveModuleId) {
-        testPayload.moduleId = effectiveModuleId;
-        testPayload.courseId = null;
-      } else if (effectiveCourseId) {
-        testPayload.courseId = effectiveCourseId;
-        testPayload.moduleId = null;
-      }
-
-      console.log("Updating test payload:", testPayload);
-
-      // Обновление теста
-      await teachingApi.updateTestFullTestsTestIdPut(id, testPayload);
-
-      // Обновление вопросов
-      await Promise.all(
-        questions.map((q) =>
-          teachingApi.updateQuestionFullQuestionsQuestionIdPut(q.id, {
-            text: q.text || "",
-            complexityPoints: q.complexityPoints || 0,
-            testId: id,
-            questionType: q.questionType || "test",
-            topicId: q.topicId || null,
-            picture: q.picture || null,
-          })
-        )
-      );
+        questions: questions.map((q) => ({
+          id: q.id,
+          text: q.text || "",
+          complexityPoints: q.complexityPoints || 0,
+          questionType: q.questionType || "test",
+          topicId: q.topicId || null,
+          answers: q.answers.map((a) => ({
+            id: a.id,
+            text: a.text || "",
+            isCorrect: Boolean(a.isCorrect),
+          })),
+        })),
+      });
+      setQuestions(saved.questions || []);
 
       // Загрузка картинок для вопросов, если есть выбранные файлы
       for (const [questionId, file] of Object.entries(questionFiles)) {
@@ -352,21 +320,6 @@ export default function TestEdit() {
       }
       setQuestionFiles({});
 
-      // Обновление ответов
-      const answerPromises = [];
-      questions.forEach((q) => {
-        q.answers.forEach((a) => {
-          answerPromises.push(
-            teachingApi.updateAnswerFullAnswersAnswerIdPut(a.id, {
-              text: a.text || "",
-              isCorrect: Boolean(a.isCorrect),
-              questionId: q.id,
-            })
-          );
-        });
-      });
-      await Promise.all(answerPromises);
-
       alert("Тест успешно сохранён!");
       if (courseId) {
         navigate(`/courses/${courseId}/edit`);
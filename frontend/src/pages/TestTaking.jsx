@@ -40,9 +40,9 @@ export default function TestTaking() {
       }
 
       try {
-        // Загружаем информацию о тесте
-        const testData = await teachingApi.getTestFullTestsTestIdGet(id);
-        setTest(testData);
+        // Тест, вопросы и варианты ответов (без признаков правильности) одним запросом
+        const paper = await teachingApi.getTestPaperFullTestsTestIdPaperGet(id);
+        setTest(paper);
 
         // Проверяем, есть ли уже результат на 100%
         try {
@@ -62,20 +62,11 @@ export default function TestTaking() {
           console.debug("Не удалось загрузить результаты:", err?.message || err);
         }
 
-        // Загружаем вопросы теста
-        const questionsData = await teachingApi.listQuestionsFullTestsTestIdQuestionsGet(id);
-        setQuestions(questionsData || []);
-
-        // Загружаем ответы для каждого вопроса
+        const questionsData = paper.questions || [];
+        setQuestions(questionsData);
         const answersMap = {};
-        for (const question of questionsData || []) {
-          try {
-            const answers = await teachingApi.listAnswersFullQuestionsQuestionIdAnswersGet(question.id);
-            answersMap[question.id] = answers || [];
-          } catch (err) {
-            console.error(`Ошибка загрузки ответов для вопроса ${question.id}:`, err);
-            answersMap[question.id] = [];
-          }
+        for (const question of questionsData) {
+          answersMap[question.id] = question.answers || [];
         }
         setQuestionAnswers(answersMap);
       } catch (err) {
@@ -231,6 +222,11 @@ export default function TestTaking() {
       );
 
       setTestResult(result);
+
+      // Уровни знаний пересчитываются в фоне — опрашиваем готовность
+      if (result.result_id && !result.knowledge_ready) {
+        pollKnowledge(result.result_id);
+      }
       
       // Загружаем названия тем для рекомендаций
       if (result.recommendations && result.recommendations.length > 0) {
@@ -291,6 +287,25 @@ export default function TestTaking() {
     }
   };
 
+  const pollKnowledge = async (resultId, attempt = 0) => {
+    try {
+      const fullApi = new FullApi();
+      if (token) {
+        fullApi.apiClient.defaultHeaders["Authorization"] = `Bearer ${token}`;
+      }
+      const knowledge = await fullApi.getResultKnowledgeFullResultsResultIdKnowledgeGet(resultId);
+      if (knowledge.knowledge_ready) {
+        setTestResult(prev => prev ? { ...prev, ...knowledge } : prev);
+        return;
+      }
+    } catch (err) {
+      console.error("Ошибка получения уровня знаний:", err);
+    }
+    if (attempt < 30) {
+      setTimeout(() => pollKnowledge(resultId, attempt + 1), 1000);
+    }
+  };
+
   if (loading) {
     return <div className="loading">Загрузка теста...</div>;
   }
@@ -3,6 +3,21 @@
 BEGIN;
 
 
+-- Sequences backing app/ids.py (see scripts/migrations/20261017_id_allocator_sequences.sql)
+CREATE SEQUENCE IF NOT EXISTS public.lms_id_worker_seq;
+
+CREATE SEQUENCE IF NOT EXISTS public.lms_id_seq
+    INCREMENT BY 100
+    START WITH 2251799813685248;
+
+-- Snowflake worker slot high-water marks (see scripts/migrations/20261017_id_worker_high_water.sql)
+CREATE TABLE IF NOT EXISTS public.lms_id_worker_slots
+(
+    worker_id smallint NOT NULL,
+    high_water_ms bigint NOT NULL,
+    PRIMARY KEY (worker_id)
+);
+
 CREATE TABLE IF NOT EXISTS public."User"
 (
     id bigint NOT NULL,
@@ -34,6 +49,7 @@ CREATE TABLE IF NOT EXISTS public."Course"
     "authorId" bigint NOT NULL,
     picture text,
     "isPublished" boolean NOT NULL,
+    "treeVersion" bigint NOT NULL DEFAULT 0,
     PRIMARY KEY (id)
 );
 
@@ -54,7 +70,7 @@ CREATE TABLE IF NOT EXISTS public."ModulePassed"
     "userId" bigint NOT NULL,
     "datePassed" date,
     PRIMARY KEY (id),
-    UNIQUE ("userId")
+    UNIQUE ("userId", "moduleId")
 );
 
 CREATE TABLE IF NOT EXISTS public."CourseEnrollment"
@@ -93,8 +109,7 @@ CREATE TABLE IF NOT EXISTS public."Test"
     "durationInMinutes" bigint NOT NULL,
     "moduleId" bigint,
     "courseId" bigint,
-    PRIMARY KEY (id),
-    UNIQUE ("courseId")
+    PRIMARY KEY (id)
 );
 
 CREATE TABLE IF NOT EXISTS public."Question"
@@ -131,12 +146,16 @@ CREATE TABLE IF NOT EXISTS public."TestResult"
     result bigint NOT NULL,
     "testId" bigint NOT NULL,
     "userId" bigint NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    "knowledgeUpdatedAt" timestamp with time zone,
     PRIMARY KEY (id)
 );
 
+CREATE SEQUENCE IF NOT EXISTS public."UserAnswer_id_seq";
+
 CREATE TABLE IF NOT EXISTS public."UserAnswer"
 (
-    id bigint NOT NULL,
+    id bigint NOT NULL DEFAULT nextval('public."UserAnswer_id_seq"'),
     "userId" bigint NOT NULL,
     "testResultId" bigint NOT NULL,
     "questionId" bigint NOT NULL,
@@ -145,6 +164,20 @@ CREATE TABLE IF NOT EXISTS public."UserAnswer"
     PRIMARY KEY (id)
 );
 
+ALTER SEQUENCE public."UserAnswer_id_seq" OWNED BY public."UserAnswer".id;
+
+CREATE TABLE IF NOT EXISTS public."UserTestKnowledge"
+(
+    id bigint NOT NULL,
+    "userId" bigint NOT NULL,
+    "testId" bigint NOT NULL,
+    "testResultId" bigint NOT NULL,
+    knowledge double precision NOT NULL DEFAULT 0.0,
+    "lastUpdated" date,
+    PRIMARY KEY (id),
+    UNIQUE ("userId", "testId")
+);
+
 CREATE TABLE IF NOT EXISTS public."UserModuleKnowledge"
 (
     id bigint NOT NULL,
@@ -152,7 +185,8 @@ CREATE TABLE IF NOT EXISTS public."UserModuleKnowledge"
     "moduleId" bigint NOT NULL,
     knowledge double precision NOT NULL DEFAULT 0.0,
     "lastUpdated" date,
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE ("userId", "moduleId")
 );
 
 CREATE TABLE IF NOT EXISTS public."UserCourseKnowledge"
@@ -162,7 +196,8 @@ CREATE TABLE IF NOT EXISTS public."UserCourseKnowledge"
     "courseId" bigint NOT NULL,
     knowledge double precision NOT NULL DEFAULT 0.0,
     "lastUpdated" date,
-    PRIMARY KEY (id)
+    PRIMARY KEY (id),
+    UNIQUE ("userId", "courseId")
 );
 
 CREATE TABLE IF NOT EXISTS public."Roles"
@@ -327,6 +362,27 @@ ALTER TABLE IF EXISTS public."UserAnswer"
     ON DELETE NO ACTION
     NOT VALID;
 
+ALTER TABLE IF EXISTS public."UserTestKnowledge"
+    ADD FOREIGN KEY ("userId")
+    REFERENCES public."User" (id) MATCH SIMPLE
+    ON UPDATE NO ACTION
+    ON DELETE NO ACTION
+    NOT VALID;
+
+ALTER TABLE IF EXISTS public."UserTestKnowledge"
+    ADD FOREIGN KEY ("testId")
+    REFERENCES public."Test" (id) MATCH SIMPLE
+    ON UPDATE NO ACTION
+    ON DELETE NO ACTION
+    NOT VALID;
+
+ALTER TABLE IF EXISTS public."UserTestKnowledge"
+    ADD FOREIGN KEY ("testResultId")
+    REFERENCES public."TestResult" (id) MATCH SIMPLE
+    ON UPDATE NO ACTION
+    ON DELETE NO ACTION
+    NOT VALID;
+
 ALTER TABLE IF EXISTS public."UserModuleKnowledge"
     ADD FOREIGN KEY ("userId")
     REFERENCES public."User" (id) MATCH SIMPLE
@@ -387,4 +443,26 @@ ALTER TABLE IF EXISTS public."RolePermissions"
     ON DELETE NO ACTION
     NOT VALID;
 
+-- Indexes for hot lookups (see scripts/migrations/20261017_add_hot_path_indexes.sql)
+CREATE UNIQUE INDEX IF NOT EXISTS "CourseEnrollment_userId_courseId_key"
+    ON public."CourseEnrollment" ("userId", "courseId");
+CREATE INDEX IF NOT EXISTS idx_courseenrollment_course ON public."CourseEnrollment" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_testresult_created_at ON public."TestResult" (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_testresult_test_user_created
+    ON public."TestResult" ("testId", "userId", created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_testresult_user_created
+    ON public."TestResult" ("userId", created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_usermoduleknowledge_module ON public."UserModuleKnowledge" ("moduleId");
+CREATE INDEX IF NOT EXISTS idx_usercourseknowledge_course ON public."UserCourseKnowledge" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_usertestknowledge_test ON public."UserTestKnowledge" ("testId");
+CREATE INDEX IF NOT EXISTS idx_module_course ON public."Module" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_topic_module ON public."Topic" ("moduleId");
+CREATE INDEX IF NOT EXISTS idx_topiccontent_topic ON public."TopicContent" ("topicId");
+CREATE INDEX IF NOT EXISTS idx_test_module ON public."Test" ("moduleId");
+CREATE INDEX IF NOT EXISTS idx_test_course ON public."Test" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_question_test ON public."Question" ("testId");
+CREATE INDEX IF NOT EXISTS idx_answer_question ON public."Answer" ("questionId");
+CREATE INDEX IF NOT EXISTS idx_useranswer_testresult ON public."UserAnswer" ("testResultId");
+CREATE INDEX IF NOT EXISTS idx_course_author ON public."Course" ("authorId");
+
 END;
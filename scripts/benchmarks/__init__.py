@@ -0,0 +1 @@
+"""benchmark scripts for the API and its helpers"""
@@ -0,0 +1,279 @@
+"""
+Load test of the API hot paths.
+
+Usage:
+  python -m scripts.benchmarks.api --spawn --seed                 # start uvicorn, seed data, run
+  python -m scripts.benchmarks.api --base-url http://localhost:8000 --compare
+  python -m scripts.benchmarks.api --spawn --save-baseline        # refresh baselines.json
+
+Scenarios (each runs --requests requests from --concurrency threads, one
+keep-alive connection and one student token per thread):
+  login           POST /users/login
+  submit_test     POST /full/tests/{id}/submit
+  list_topics     GET  /full/courses/{id}/modules/{id}/topics
+  topic_contents  GET  /full/topics/{id}/contents
+  my_knowledge    GET  /full/me/modules/knowledge and /full/me/courses/knowledge
+  course_knowledge GET /full/teacher/course/{id}/students/knowledge (as the author)
+  download        GET  /full/topic-contents/{id}/download
+
+The data comes from scripts/benchmarks/dataset.py (--seed creates it; its
+size options are accepted here too). The material files are written to
+BENCH_UPLOAD_DIR before the run and deleted afterwards. For every scenario the script prints
+throughput and p50/p95/p99 latency. --compare checks the numbers against
+scripts/benchmarks/baselines.json and exits with 1 when throughput drops or
+p95 grows by more than --tolerance; baselines are only comparable on the
+machine (and dataset) they were recorded on, see the "meta" block.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from scripts.benchmarks.dataset import (
+    BENCH_PASSWORD,
+    BenchDataset,
+    add_arguments,
+    ensure_dataset,
+    from_args,
+    remove_files,
+    write_files,
+)
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+
+class Client:
+    """One keep-alive HTTP connection."""
+
+    def __init__(self, base_url: str, token: str | None = None):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.headers = {'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f'Bearer {token}'
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def request(self, method: str, path: str, body=None) -> tuple[int, bytes]:
+        payload = json.dumps(body) if body is not None else None
+        for retry in (False, True):
+            try:
+                self.conn.request(method, path, body=payload, headers=self.headers)
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                if retry:
+                    raise
+                self.conn.close()
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def login(base_url: str, user_login: str) -> str:
+    client = Client(base_url)
+    try:
+        status, body = client.request('POST', '/users/login', {'login': user_login, 'password': BENCH_PASSWORD})
+        if status != 200:
+            raise RuntimeError(f'login of {user_login} failed: {status} {body[:200]!r}')
+        return json.loads(body)['access_token']
+    finally:
+        client.close()
+
+
+def scenarios(ds: BenchDataset) -> dict:
+    """name -> (uses the teacher token, request factory(worker, n) -> (method, path, body))."""
+    last = ds.modules - 1
+    return {
+        'login': (None, lambda w, n: ('POST', '/users/login', {'login': ds.student_login(w), 'password': BENCH_PASSWORD})),
+        'submit_test': (False, lambda w, n: (
+            'POST', f'/full/tests/{ds.test_id(n % ds.modules)}/submit',
+            {'answers': ds.correct_answers(n % ds.modules), 'duration_in_minutes': 10},
+        )),
+        'list_topics': (False, lambda w, n: ('GET', f'/full/courses/{ds.course_id}/modules/{ds.module_id(n % last if last else 0)}/topics', None)),
+        'topic_contents': (False, lambda w, n: ('GET', f'/full/topics/{ds.topic_id(n % ds.modules, n % ds.topics)}/contents', None)),
+        'my_knowledge': (False, lambda w, n: ('GET', '/full/me/modules/knowledge' if n % 2 else '/full/me/courses/knowledge', None)),
+        'course_knowledge': (True, lambda w, n: ('GET', f'/full/teacher/course/{ds.course_id}/students/knowledge', None)),
+        'download': (False, lambda w, n: ('GET', f'/full/topic-contents/{ds.content_id(n % ds.modules, n % ds.topics)}/download', None)),
+    }
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(base_url: str, tokens: list[str | None], make_request, requests: int, warmup: int) -> dict:
+    workers = len(tokens)
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests + warmup * workers))
+
+    def worker(w: int):
+        nonlocal errors
+        client = Client(base_url, tokens[w])
+        local, local_errors = [], 0
+        try:
+            for i in range(warmup):
+                client.request(*make_request(w, i))
+            while True:
+                with lock:
+                    n = next(counter, None)
+                if n is None:
+                    break
+                method, path, body = make_request(w, n)
+                started = time.perf_counter()
+                status, _ = client.request(method, path, body)
+                local.append(time.perf_counter() - started)
+                if status >= 400:
+                    local_errors += 1
+        finally:
+            client.close()
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list[str]:
+    problems = []
+    for name, result in results.items():
+        base = baselines.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            problems.append(f"{name}: throughput {result['rps']} req/s < baseline {base['rps']} req/s")
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f"{name}: p95 {result['p95_ms']} ms > baseline {base['p95_ms']} ms")
+        if result['errors']:
+            problems.append(f"{name}: {result['errors']} failed requests")
+    return problems
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(workers: int) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        # the endpoints print debug lines; errors still reach stderr
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return proc, base_url
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError('uvicorn exited during start-up')
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('uvicorn did not start in 30 seconds')
+
+
+def run(args) -> int:
+    ds = from_args(args)
+    if args.seed:
+        ensure_dataset(ds)
+    else:
+        write_files(ds)
+    proc = None
+    base_url = args.base_url
+    try:
+        if args.spawn:
+            proc, base_url = spawn_server(args.server_workers)
+        concurrency = min(args.concurrency, ds.students)
+        student_tokens = [login(base_url, ds.student_login(w)) for w in range(concurrency)]
+        teacher_tokens = [login(base_url, 'bench_teacher')] * concurrency
+        selected = args.scenario or list(scenarios(ds))
+        results = {}
+        for name in selected:
+            uses_teacher, make_request = scenarios(ds)[name]
+            tokens = [None] * concurrency if uses_teacher is None else teacher_tokens if uses_teacher else student_tokens
+            # login hashes passwords (bcrypt) and is far slower than the rest
+            requests = max(concurrency, args.requests // 10) if name == 'login' else args.requests
+            results[name] = run_scenario(base_url, tokens, make_request, requests, args.warmup)
+            r = results[name]
+            print(
+                f"{name:<17} {r['rps']:>9,.1f} req/s  p50 {r['p50_ms']:>8.2f} ms  p95 {r['p95_ms']:>8.2f} ms  "
+                f"p99 {r['p99_ms']:>8.2f} ms  errors {r['errors']}"
+            )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        remove_files()
+
+    meta = {
+        'dataset': {k: getattr(ds, k) for k in ('students', 'modules', 'topics', 'questions', 'attempts', 'file_kb')},
+        'concurrency': concurrency,
+        'requests': args.requests,
+        'server_workers': args.server_workers if args.spawn else None,
+        'machine': f'{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs, Python {platform.python_version()}',
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'scenarios': results}, f, indent=2)
+    if args.save_baseline:
+        with open(BASELINES, 'w') as f:
+            json.dump({'meta': meta, 'scenarios': results}, f, indent=2)
+            f.write('\n')
+        print(f'baselines written to {BASELINES}')
+    if args.compare:
+        with open(BASELINES) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print('REGRESSION ' + problem)
+        if problems:
+            return 1
+        print(f'no regressions against {os.path.basename(BASELINES)} (tolerance {args.tolerance:.0%})')
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--spawn', action='store_true', help='start uvicorn on a free port for the run')
+    parser.add_argument('--server-workers', type=int, default=1)
+    parser.add_argument('--seed', action='store_true', help='create the benchmark dataset first')
+    parser.add_argument('--scenario', action='append', choices=list(scenarios(BenchDataset())))
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5, help='warm-up requests per thread')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    add_arguments(parser)
+    sys.exit(run(parser.parse_args()))
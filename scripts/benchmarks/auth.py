@@ -0,0 +1,82 @@
+"""
+Compare get_current_user with and without the stateless token path.
+
+Usage:
+  python -m scripts.benchmarks.auth --login student1 --password pwd \
+      --topic-id 1 --course-id 1 --module-id 1 --requests 2000
+
+Runs the app in-process (FastAPI TestClient, needs httpx and the database).
+For every endpoint the script reports requests per second and pooled
+connection checkouts per request, first with AUTH_STATELESS disabled, then
+enabled.
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import deps
+from app.db import async_engine, engine
+from app.main import app
+
+_checkouts = 0
+
+
+@event.listens_for(engine, 'checkout')
+@event.listens_for(async_engine.sync_engine, 'checkout')
+def _count_checkout(*_):
+    global _checkouts
+    _checkouts += 1
+
+
+def _measure(client: TestClient, path: str, headers: dict, count: int) -> tuple[float, float]:
+    global _checkouts
+    client.get(path, headers=headers).raise_for_status()  # warm up caches
+    _checkouts = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        client.get(path, headers=headers)
+    elapsed = time.perf_counter() - started
+    return count / elapsed, _checkouts / count
+
+
+def run(args) -> None:
+    # One client for the whole run: the async pool is bound to the client's event loop
+    with TestClient(app) as client:
+        _run(client, args)
+
+
+def _run(client: TestClient, args) -> None:
+    response = client.post('/users/login', json={'login': args.login, 'password': args.password})
+    response.raise_for_status()
+    headers = {'Authorization': 'Bearer ' + response.json()['access_token']}
+
+    paths = ['/users/me']
+    if args.topic_id:
+        paths.append(f'/full/topics/{args.topic_id}')
+    if args.course_id and args.module_id:
+        paths.append(f'/full/courses/{args.course_id}/modules/{args.module_id}/topics')
+
+    for path in paths:
+        results = {}
+        for stateless in (False, True):
+            deps.AUTH_STATELESS = stateless
+            results[stateless] = _measure(client, path, headers, args.requests)
+        (base_rps, base_co), (fast_rps, fast_co) = results[False], results[True]
+        print(
+            f"{path}: db-verified {base_rps:,.0f} req/s ({base_co:.2f} checkouts/req), "
+            f"stateless {fast_rps:,.0f} req/s ({fast_co:.2f} checkouts/req), "
+            f"gain {(fast_rps / base_rps - 1) * 100:+.1f}%"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--login', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--topic-id', type=int)
+    parser.add_argument('--course-id', type=int)
+    parser.add_argument('--module-id', type=int)
+    parser.add_argument('--requests', type=int, default=2000)
+    run(parser.parse_args())
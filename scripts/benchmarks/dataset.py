@@ -0,0 +1,314 @@
+"""
+Deterministic synthetic dataset for the API benchmarks.
+
+Usage:
+  python -m scripts.benchmarks.dataset --students 200 --modules 5 --questions 20
+
+All rows get ids from a reserved range (BENCH_ID_BASE and up), so the
+benchmark knows every id without asking the database and the data does not
+collide with ids from `next_id()` or from scripts/seed_data.py. Inserts use
+ON CONFLICT DO NOTHING: running it again with the same parameters is cheap.
+
+The dataset: one teacher and one published course with --modules modules,
+--topics topics per module (each with a file material), one test per module
+with --questions questions (every fourth one open), --students enrolled
+students who passed every module but the last, and --attempts past attempts
+per student and test with their answers and knowledge rows. Knowledge is
+consistent with the app: `UserTestKnowledge` holds the latest attempt of each
+(student, test), backfilled as in 20261017_add_user_test_knowledge.sql, and
+module and course knowledge are the averages the app computes from it.
+
+Material files are written to BENCH_UPLOAD_DIR (default: a directory under
+the system temp dir), never to the app's uploads/; the rows store absolute
+paths, which is what the download endpoint serves. `write_files` /
+`remove_files` create and delete them, so a run can clean up after itself.
+"""
+import argparse
+import glob
+import os
+import random
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import Float, cast, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.auth import get_password_hash
+from app.db import engine
+from app.models import (
+    Answer,
+    Course,
+    CourseCategory,
+    CourseEnrollment,
+    Module,
+    ModulePassed,
+    Question,
+    Role,
+    Test,
+    TestResult,
+    Topic,
+    TopicContent,
+    User,
+    UserAnswer,
+    UserCourseKnowledge,
+    UserModuleKnowledge,
+    UserTestKnowledge,
+)
+
+BENCH_ID_BASE = 900_000_000_000
+BENCH_PASSWORD = 'bench'
+UPLOAD_DIR = os.environ.get('BENCH_UPLOAD_DIR') or os.path.join(tempfile.gettempdir(), 'lms-bench-uploads')
+
+
+@dataclass(frozen=True)
+class BenchDataset:
+    students: int = 200
+    modules: int = 5
+    topics: int = 3
+    questions: int = 20
+    options: int = 4
+    attempts: int = 2
+    file_kb: int = 64
+
+    # --- ids (every kind of row has its own block of the reserved range) ---
+    teacher_id = BENCH_ID_BASE
+    category_id = BENCH_ID_BASE
+    course_id = BENCH_ID_BASE
+
+    def student_id(self, i: int) -> int:
+        return BENCH_ID_BASE + 1 + i
+
+    def student_login(self, i: int) -> str:
+        return f'bench_student_{i}'
+
+    def module_id(self, m: int) -> int:
+        return BENCH_ID_BASE + 1_000 + m
+
+    def test_id(self, m: int) -> int:
+        return BENCH_ID_BASE + 2_000 + m
+
+    def topic_id(self, m: int, t: int) -> int:
+        return BENCH_ID_BASE + 10_000 + m * 100 + t
+
+    def content_id(self, m: int, t: int) -> int:
+        return BENCH_ID_BASE + 20_000 + m * 100 + t
+
+    def question_id(self, m: int, q: int) -> int:
+        return BENCH_ID_BASE + 100_000 + m * 1_000 + q
+
+    def answer_id(self, m: int, q: int, o: int) -> int:
+        return BENCH_ID_BASE + 1_000_000 + (m * 1_000 + q) * 10 + o
+
+    def content_path(self, m: int, t: int) -> str:
+        return os.path.abspath(os.path.join(UPLOAD_DIR, f'bench_{self.content_id(m, t)}.txt'))
+
+    def is_open(self, q: int) -> bool:
+        return q % 4 == 3
+
+    def correct_option(self, q: int) -> int:
+        return q % self.options
+
+    def correct_answers(self, m: int) -> dict[str, object]:
+        """Submit payload answering every question of the module test correctly."""
+        return {
+            str(self.question_id(m, q)): f'answer {q}' if self.is_open(q) else self.answer_id(m, q, self.correct_option(q))
+            for q in range(self.questions)
+        }
+
+    def result_id(self, student: int, m: int, attempt: int) -> int:
+        return BENCH_ID_BASE + 10_000_000 + (student * self.modules + m) * self.attempts + attempt
+
+    def knowledge_id(self, student: int, m: int) -> int:
+        # m == modules: course-level row
+        return BENCH_ID_BASE + 5_000_000 + student * (self.modules + 1) + m
+
+
+def _insert(conn, model, rows: list[dict]) -> None:
+    for start in range(0, len(rows), 5_000):
+        conn.execute(pg_insert(model).on_conflict_do_nothing(), rows[start:start + 5_000])
+
+
+def write_files(ds: BenchDataset) -> None:
+    """Create the material files that are missing or have another size."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    for m in range(ds.modules):
+        for t in range(ds.topics):
+            path = ds.content_path(m, t)
+            if not os.path.exists(path) or os.path.getsize(path) != ds.file_kb * 1024:
+                with open(path, 'wb') as f:
+                    f.write(os.urandom(ds.file_kb * 512).hex().encode())
+
+
+def remove_files() -> None:
+    for path in glob.glob(os.path.join(UPLOAD_DIR, 'bench_*.txt')):
+        os.remove(path)
+    try:
+        os.rmdir(UPLOAD_DIR)
+    except OSError:
+        pass  # not empty or already gone
+
+
+def ensure_dataset(ds: BenchDataset) -> None:
+    rng = random.Random(42)
+    today = date.today()
+    write_files(ds)
+    with engine.begin() as conn:
+        _insert(conn, Role, [{'id': 1, 'name': 'student'}, {'id': 2, 'name': 'teacher'}, {'id': 3, 'name': 'admin'}])
+        password = get_password_hash(BENCH_PASSWORD)
+        _insert(conn, User, [{
+            'id': ds.teacher_id, 'login': 'bench_teacher', 'password': password,
+            'name': 'Bench', 'surname': 'Teacher', 'roleId': 2,
+        }] + [{
+            'id': ds.student_id(i), 'login': ds.student_login(i), 'password': password,
+            'name': 'Bench', 'surname': f'Student {i}', 'roleId': 1,
+        } for i in range(ds.students)])
+        _insert(conn, CourseCategory, [{'id': ds.category_id, 'name': 'Benchmarks'}])
+        _insert(conn, Course, [{
+            'id': ds.course_id, 'name': 'Benchmark course', 'description': 'Synthetic data',
+            'categoryId': ds.category_id, 'authorId': ds.teacher_id, 'isPublished': True,
+        }])
+        _insert(conn, Module, [{
+            'id': ds.module_id(m), 'name': f'Module {m}', 'description': 'Synthetic module', 'courseId': ds.course_id,
+        } for m in range(ds.modules)])
+        _insert(conn, Topic, [{
+            'id': ds.topic_id(m, t), 'name': f'Topic {m}.{t}', 'description': 'Synthetic topic', 'moduleId': ds.module_id(m),
+        } for m in range(ds.modules) for t in range(ds.topics)])
+
+        # the file path follows BENCH_UPLOAD_DIR of the latest seeding
+        stmt = pg_insert(TopicContent)
+        conn.execute(stmt.on_conflict_do_update(index_elements=[TopicContent.id], set_={'file': stmt.excluded.file}), [{
+            'id': ds.content_id(m, t), 'description': 'Material', 'file': ds.content_path(m, t), 'topicId': ds.topic_id(m, t),
+        } for m in range(ds.modules) for t in range(ds.topics)])
+
+        _insert(conn, Test, [{
+            'id': ds.test_id(m), 'name': f'Test {m}', 'description': 'Synthetic test',
+            'durationInMinutes': 30, 'moduleId': ds.module_id(m), 'courseId': None,
+        } for m in range(ds.modules)])
+        questions, answers = [], []
+        for m in range(ds.modules):
+            for q in range(ds.questions):
+                is_open = ds.is_open(q)
+                questions.append({
+                    'id': ds.question_id(m, q), 'text': f'Question {q}', 'complexityPoints': 1 + q % 3,
+                    'testId': ds.test_id(m), 'questionType': 'open' if is_open else 'test',
+                    'topicId': ds.topic_id(m, q % ds.topics),
+                })
+                if is_open:
+                    answers.append({'id': ds.answer_id(m, q, 0), 'isCorrect': True, 'text': f'Answer {q}', 'questionId': ds.question_id(m, q)})
+                else:
+                    answers.extend({
+                        'id': ds.answer_id(m, q, o), 'isCorrect': o == ds.correct_option(q),
+                        'text': f'Option {o}', 'questionId': ds.question_id(m, q),
+                    } for o in range(ds.options))
+        _insert(conn, Question, questions)
+        _insert(conn, Answer, answers)
+
+        _insert(conn, CourseEnrollment, [{
+            'id': ds.student_id(i), 'dateStarted': today, 'courseId': ds.course_id, 'userId': ds.student_id(i),
+        } for i in range(ds.students)])
+        _insert(conn, ModulePassed, [{
+            'id': ds.knowledge_id(i, m), 'moduleId': ds.module_id(m), 'isPassed': True,
+            'userId': ds.student_id(i), 'datePassed': today,
+        } for i in range(ds.students) for m in range(ds.modules - 1)])
+
+        # History of attempts: results are inserted only once, answers only for new results
+        existing = {r for (r,) in conn.execute(
+            TestResult.__table__.select().with_only_columns(TestResult.id)
+            .where(TestResult.id.between(ds.result_id(0, 0, 0), ds.result_id(ds.students, 0, 0) - 1))
+        )}
+        results, user_answers = [], []
+        now = datetime.now(timezone.utc)
+        for i in range(ds.students):
+            for m in range(ds.modules):
+                for a in range(ds.attempts):
+                    rid = ds.result_id(i, m, a)
+                    if rid in existing:
+                        continue
+                    correct = [rng.random() < 0.7 for _ in range(ds.questions)]
+                    percent = int(100 * sum(correct) / ds.questions)
+                    results.append({
+                        'id': rid, 'scoreInPoints': sum(correct), 'isPassed': percent >= 80,
+                        'durationInMinutes': 20.0, 'result': percent, 'testId': ds.test_id(m),
+                        'userId': ds.student_id(i), 'created_at': now - timedelta(days=ds.attempts - a),
+                        'knowledgeUpdatedAt': now,
+                    })
+                    user_answers.extend({
+                        'userId': ds.student_id(i), 'testResultId': rid, 'questionId': ds.question_id(m, q),
+                        'isCorrect': ok, 'timeSpentInMinutes': 1,
+                    } for q, ok in enumerate(correct))
+        _insert(conn, TestResult, results)
+        for start in range(0, len(user_answers), 10_000):
+            conn.execute(insert(UserAnswer), user_answers[start:start + 10_000])
+
+        # Latest attempt per (student, test), as the UserTestKnowledge migration backfills it;
+        # rows written by submits during earlier runs are newer and are kept.
+        latest = (
+            select(
+                TestResult.id, TestResult.userId, TestResult.testId, TestResult.id.label('testResultId'),
+                cast(TestResult.result, Float), literal(today),
+            )
+            .where(TestResult.id.between(ds.result_id(0, 0, 0), ds.result_id(ds.students, 0, 0) - 1))
+            .distinct(TestResult.userId, TestResult.testId)
+            .order_by(TestResult.userId, TestResult.testId, TestResult.created_at.desc())
+        )
+        conn.execute(
+            pg_insert(UserTestKnowledge)
+            .from_select(['id', 'userId', 'testId', 'testResultId', 'knowledge', 'lastUpdated'], latest)
+            .on_conflict_do_nothing()
+        )
+
+        # Module knowledge = mean over the module's tests (one per module here), course = mean over modules
+        test_knowledge = {
+            (user_id, test_id): knowledge
+            for user_id, test_id, knowledge in conn.execute(
+                select(UserTestKnowledge.userId, UserTestKnowledge.testId, UserTestKnowledge.knowledge)
+                .where(UserTestKnowledge.testId.in_([ds.test_id(m) for m in range(ds.modules)]))
+                .where(UserTestKnowledge.userId.between(ds.student_id(0), ds.student_id(ds.students - 1)))
+            )
+        }
+        module_rows, course_rows = [], []
+        for i in range(ds.students):
+            module_knowledge = [test_knowledge.get((ds.student_id(i), ds.test_id(m)), 0.0) for m in range(ds.modules)]
+            module_rows.extend({
+                'id': ds.knowledge_id(i, m), 'userId': ds.student_id(i), 'moduleId': ds.module_id(m),
+                'knowledge': knowledge, 'lastUpdated': today,
+            } for m, knowledge in enumerate(module_knowledge))
+            course_rows.append({
+                'id': ds.knowledge_id(i, ds.modules), 'userId': ds.student_id(i), 'courseId': ds.course_id,
+                'knowledge': sum(module_knowledge) / ds.modules if ds.modules else 0.0, 'lastUpdated': today,
+            })
+        for model, key_column, rows in (
+            (UserModuleKnowledge, UserModuleKnowledge.moduleId, module_rows),
+            (UserCourseKnowledge, UserCourseKnowledge.courseId, course_rows),
+        ):
+            stmt = pg_insert(model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[model.userId, key_column],
+                set_={'knowledge': stmt.excluded.knowledge, 'lastUpdated': stmt.excluded.lastUpdated},
+            )
+            for start in range(0, len(rows), 5_000):
+                conn.execute(stmt, rows[start:start + 5_000])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = BenchDataset()
+    parser.add_argument('--students', type=int, default=defaults.students)
+    parser.add_argument('--modules', type=int, default=defaults.modules)
+    parser.add_argument('--topics', type=int, default=defaults.topics, help='topics per module')
+    parser.add_argument('--questions', type=int, default=defaults.questions, help='questions per test')
+    parser.add_argument('--attempts', type=int, default=defaults.attempts, help='past attempts per student and test')
+    parser.add_argument('--file-kb', type=int, default=defaults.file_kb, help='size of every material file')
+
+
+def from_args(args) -> BenchDataset:
+    return BenchDataset(
+        students=args.students, modules=args.modules, topics=args.topics,
+        questions=args.questions, attempts=args.attempts, file_kb=args.file_kb,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    ensure_dataset(from_args(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""
+Grading throughput with a prebuilt answer key.
+
+Usage:
+  python -m scripts.benchmarks.grading --questions 40 --options 4 --submissions 20000
+
+Builds a synthetic test (closed and open questions) and grades random
+submissions on one core, without the database. Reports submissions per second
+when the answer key is rebuilt for every submission (what happened before the
+key was cached) and when the cached key is reused (what submit_test does now).
+"""
+import argparse
+import random
+import time
+
+from app.cache import AnswerNode, QuestionNode
+from app.grading import build_answer_key, grade_submission
+
+TEST_ID = 1
+
+
+def make_questions(count: int, options: int, open_share: float, rng: random.Random) -> tuple[QuestionNode, ...]:
+    questions = []
+    answer_id = 1
+    for qid in range(1, count + 1):
+        if rng.random() < open_share:
+            answers = (AnswerNode(id=answer_id, questionId=qid, text=f"  Answer {qid} ", isCorrect=True),)
+            answer_id += 1
+            qtype = "open"
+        else:
+            correct = rng.randrange(options)
+            answers = tuple(
+                AnswerNode(id=answer_id + i, questionId=qid, text=f"option {i}", isCorrect=i == correct)
+                for i in range(options)
+            )
+            answer_id += options
+            qtype = "test"
+        questions.append(
+            QuestionNode(
+                id=qid,
+                testId=TEST_ID,
+                text=f"question {qid}",
+                picture=None,
+                complexityPoints=rng.randint(1, 5),
+                questionType=qtype,
+                topicId=None,
+                answers=answers,
+            )
+        )
+    return tuple(questions)
+
+
+def make_submission(questions, rng: random.Random) -> dict:
+    # JSON body: keys are strings, closed answers are ids, open answers are texts
+    submission = {}
+    for q in questions:
+        if q.questionType == "open":
+            submission[str(q.id)] = rng.choice(["answer %d" % q.id, "wrong"])
+        else:
+            submission[str(q.id)] = rng.choice(q.answers).id
+    return submission
+
+
+def _rate(fn, submissions) -> float:
+    started = time.perf_counter()
+    for submission in submissions:
+        fn(submission)
+    return len(submissions) / (time.perf_counter() - started)
+
+
+def run(args) -> None:
+    rng = random.Random(args.seed)
+    questions = make_questions(args.questions, args.options, args.open_share, rng)
+    answers = [a for q in questions for a in q.answers]
+    submissions = [make_submission(questions, rng) for _ in range(args.submissions)]
+
+    def rebuild_and_grade(submission):
+        key = build_answer_key(TEST_ID, questions, answers)
+        return grade_submission(key, submission, 30, 20)
+
+    cached_key = build_answer_key(TEST_ID, questions, answers)
+
+    def grade_cached(submission):
+        return grade_submission(cached_key, submission, 30, 20)
+
+    rebuild = _rate(rebuild_and_grade, submissions)
+    cached = _rate(grade_cached, submissions)
+    print(f"{args.questions} questions, {args.submissions} submissions, 1 core")
+    print(f"key rebuilt per submission: {rebuild:,.0f} submissions/s")
+    print(f"cached key:                 {cached:,.0f} submissions/s ({cached / rebuild:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--open-share", type=float, default=0.25)
+    parser.add_argument("--submissions", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    run(parser.parse_args())
@@ -0,0 +1,65 @@
+"""
+Benchmark the id allocators from app/ids.py across processes.
+
+Usage:
+  python -m scripts.benchmarks.id_allocator --processes 8 --count 200000
+  python -m scripts.benchmarks.id_allocator --allocator sequence   # needs the database
+
+Every process allocates `--count` ids. The parent checks that all ids are
+unique and inside the JavaScript safe range, then prints allocations per
+second for each process and in total. Exits with status 1 on any collision.
+"""
+import argparse
+import multiprocessing as mp
+import time
+from array import array
+
+from app.ids import MAX_SAFE_ID, SequenceBlockAllocator, SnowflakeAllocator
+
+
+def _allocate(args):
+    kind, worker_id, count = args
+    if kind == 'sequence':
+        from app.db import engine
+        allocator = SequenceBlockAllocator(engine)
+    else:
+        allocator = SnowflakeAllocator(worker_id)
+    ids = array('q')
+    started = time.perf_counter()
+    for _ in range(count):
+        ids.append(allocator.next_id())
+    elapsed = time.perf_counter() - started
+    return worker_id, elapsed, ids.tobytes()
+
+
+def run(kind: str, processes: int, count: int) -> bool:
+    started = time.perf_counter()
+    with mp.Pool(processes) as pool:
+        results = pool.map(_allocate, [(kind, i, count) for i in range(processes)])
+    wall = time.perf_counter() - started
+
+    seen: set[int] = set()
+    total = 0
+    out_of_range = 0
+    for worker_id, elapsed, raw in results:
+        ids = array('q')
+        ids.frombytes(raw)
+        total += len(ids)
+        out_of_range += sum(1 for v in ids if not 0 < v <= MAX_SAFE_ID)
+        seen.update(ids)
+        print(f"  process {worker_id}: {len(ids)} ids in {elapsed:.3f}s ({len(ids) / elapsed:,.0f}/s)")
+
+    collisions = total - len(seen)
+    print(f"allocator={kind} processes={processes} total={total} wall={wall:.3f}s ({total / wall:,.0f}/s)")
+    print(f"collisions={collisions} out_of_safe_range={out_of_range} max_id={max(seen)}")
+    return collisions == 0 and out_of_range == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--allocator', choices=['snowflake', 'sequence'], default='snowflake')
+    parser.add_argument('--processes', type=int, default=mp.cpu_count())
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args()
+    ok = run(args.allocator, args.processes, args.count)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,98 @@
+"""
+Check that the hot lookups of the API are served by indexes.
+
+Usage:
+  python -m scripts.check_query_plans
+
+Every query is run through EXPLAIN (FORMAT JSON) with sequential scans
+disabled (``enable_seqscan = off``), so the planner only picks a Seq Scan when
+no index can serve the filter at all - whatever the size of the tables.
+Exits with status 1 and lists the offending queries if any plan still
+contains a Seq Scan. Apply scripts/migrations/20261017_add_hot_path_indexes.sql
+to fix it.
+"""
+import json
+import sys
+
+from sqlalchemy import text
+
+from app.db import engine
+
+# name -> SQL with the same filters the endpoints use
+HOT_QUERIES = {
+    'enrollment of a user in a course': '''
+        SELECT id FROM "CourseEnrollment" WHERE "userId" = :user_id AND "courseId" = :course_id
+    ''',
+    'students of a course': '''
+        SELECT "userId" FROM "CourseEnrollment" WHERE "courseId" = :course_id
+    ''',
+    'attempts of a user for a test': '''
+        SELECT id, result, "isPassed" FROM "TestResult"
+        WHERE "testId" = :test_id AND "userId" = :user_id
+        ORDER BY created_at DESC
+    ''',
+    'results of a user': '''
+        SELECT id FROM "TestResult" WHERE "userId" = :user_id ORDER BY created_at DESC
+    ''',
+    'module knowledge of a user': '''
+        SELECT knowledge FROM "UserModuleKnowledge" WHERE "userId" = :user_id AND "moduleId" = :module_id
+    ''',
+    'course knowledge of a user': '''
+        SELECT knowledge FROM "UserCourseKnowledge" WHERE "userId" = :user_id AND "courseId" = :course_id
+    ''',
+    'passed module of a user': '''
+        SELECT "isPassed" FROM "ModulePassed" WHERE "userId" = :user_id AND "moduleId" = :module_id
+    ''',
+    'modules of a course': '''
+        SELECT id FROM "Module" WHERE "courseId" = :course_id ORDER BY id
+    ''',
+    'topics of a module': '''
+        SELECT id FROM "Topic" WHERE "moduleId" = :module_id
+    ''',
+    'tests of a module': '''
+        SELECT id FROM "Test" WHERE "moduleId" = :module_id
+    ''',
+    'questions of a test': '''
+        SELECT id FROM "Question" WHERE "testId" = :test_id
+    ''',
+    'answers of a question': '''
+        SELECT id, "isCorrect" FROM "Answer" WHERE "questionId" = :question_id
+    ''',
+    'answers of a result': '''
+        SELECT "questionId", "isCorrect" FROM "UserAnswer" WHERE "testResultId" = :result_id
+    ''',
+}
+
+PARAMS = {'user_id': 1, 'course_id': 1, 'module_id': 1, 'test_id': 1, 'question_id': 1, 'result_id': 1}
+
+
+def _seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name', '?'))
+    for child in plan.get('Plans', []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def run() -> int:
+    failed = 0
+    with engine.connect() as conn:
+        conn.execute(text('SET enable_seqscan = off'))
+        for name, sql in HOT_QUERIES.items():
+            raw = conn.execute(text('EXPLAIN (FORMAT JSON) ' + sql), PARAMS).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+            tables = _seq_scans(plan)
+            if tables:
+                failed += 1
+                print(f"FAIL {name}: Seq Scan on {', '.join(tables)}")
+            else:
+                print(f"ok   {name}")
+        conn.rollback()
+    if failed:
+        print(f"{failed} of {len(HOT_QUERIES)} hot queries fall back to a sequential scan")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,4 @@
+-- Version of the course structure (modules, topics, tests, questions, answers).
+-- Bumped by every authoring write; cached course tree snapshots are keyed by it.
+ALTER TABLE "Course"
+ADD COLUMN IF NOT EXISTS "treeVersion" BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,61 @@
+-- Indexes for the hot lookup patterns and fixes of wrong UNIQUE constraints.
+-- init.sql used to declare only primary keys, so every filter by user/course/test
+-- was a sequential scan. Check the plans with: python -m scripts.check_query_plans
+-- Plain SQL rather than an Alembic revision: the schema of this project lives in
+-- init.sql plus the scripts in this directory, and no Alembic environment is set
+-- up. The script is idempotent (IF [NOT] EXISTS everywhere); apply it with psql.
+
+BEGIN;
+
+-- A course may have several tests (one per module plus the final one)
+ALTER TABLE "Test" DROP CONSTRAINT IF EXISTS "Test_courseId_key";
+
+-- ModulePassed must be unique per (userId, moduleId), not per userId
+-- (same as 20251203_fix_modulepassed_constraint.sql, for databases that missed it)
+ALTER TABLE "ModulePassed" DROP CONSTRAINT IF EXISTS "ModulePassed_userId_key";
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'ModulePassed_userId_moduleId_key'
+    ) THEN
+        ALTER TABLE "ModulePassed" ADD CONSTRAINT "ModulePassed_userId_moduleId_key" UNIQUE ("userId", "moduleId");
+    END IF;
+END $$;
+
+-- One enrollment per (user, course): drop duplicates, keep the earliest row
+DELETE FROM "CourseEnrollment" e
+USING "CourseEnrollment" d
+WHERE e."userId" = d."userId"
+  AND e."courseId" = d."courseId"
+  AND e.id > d.id;
+CREATE UNIQUE INDEX IF NOT EXISTS "CourseEnrollment_userId_courseId_key"
+    ON "CourseEnrollment" ("userId", "courseId");
+CREATE INDEX IF NOT EXISTS idx_courseenrollment_course ON "CourseEnrollment" ("courseId");
+
+-- Latest / best attempt of a user for a test, and the "my results" list
+CREATE INDEX IF NOT EXISTS idx_testresult_test_user_created
+    ON "TestResult" ("testId", "userId", created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_testresult_user_created
+    ON "TestResult" ("userId", created_at DESC);
+
+-- Knowledge tables
+CREATE INDEX IF NOT EXISTS idx_usermoduleknowledge_user_module
+    ON "UserModuleKnowledge" ("userId", "moduleId");
+CREATE INDEX IF NOT EXISTS idx_usermoduleknowledge_module ON "UserModuleKnowledge" ("moduleId");
+CREATE INDEX IF NOT EXISTS idx_usercourseknowledge_user_course
+    ON "UserCourseKnowledge" ("userId", "courseId");
+CREATE INDEX IF NOT EXISTS idx_usercourseknowledge_course ON "UserCourseKnowledge" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_usertestknowledge_test ON "UserTestKnowledge" ("testId");
+
+-- Foreign keys walked when loading a course tree or grading a test
+CREATE INDEX IF NOT EXISTS idx_module_course ON "Module" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_topic_module ON "Topic" ("moduleId");
+CREATE INDEX IF NOT EXISTS idx_topiccontent_topic ON "TopicContent" ("topicId");
+CREATE INDEX IF NOT EXISTS idx_test_module ON "Test" ("moduleId");
+CREATE INDEX IF NOT EXISTS idx_test_course ON "Test" ("courseId");
+CREATE INDEX IF NOT EXISTS idx_question_test ON "Question" ("testId");
+CREATE INDEX IF NOT EXISTS idx_answer_question ON "Answer" ("questionId");
+CREATE INDEX IF NOT EXISTS idx_useranswer_testresult ON "UserAnswer" ("testResultId");
+CREATE INDEX IF NOT EXISTS idx_course_author ON "Course" ("authorId");
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- Permission that guards the admin CRUD of roles, permissions and role
+-- permissions (app/rbac.py, MANAGE_PERMISSIONS), granted to the admin role.
+-- Apply before deploying: without it admins get 403 on those endpoints.
+-- Both inserts are keyed on what they create, not on fixed ids, and take new
+-- ids from lms_id_seq (20261017_id_allocator_sequences.sql), so the script is
+-- safe to rerun and cannot be skipped because an id is already in use.
+
+BEGIN;
+
+INSERT INTO public."Permissions" (id, action)
+SELECT nextval('public.lms_id_seq'), 'manage_permissions'
+WHERE NOT EXISTS (SELECT 1 FROM public."Permissions" WHERE action = 'manage_permissions');
+
+INSERT INTO public."RolePermissions" (id, "roleId", "permissionId")
+SELECT nextval('public.lms_id_seq'), r.id, p.id
+FROM public."Roles" r
+JOIN LATERAL (
+    SELECT id FROM public."Permissions" WHERE action = 'manage_permissions' ORDER BY id LIMIT 1
+) p ON true
+WHERE r.name = 'admin'
+  AND NOT EXISTS (
+      SELECT 1
+      FROM public."RolePermissions" rp
+      JOIN public."Permissions" granted ON granted.id = rp."permissionId"
+      WHERE rp."roleId" = r.id AND granted.action = 'manage_permissions'
+  );
+
+COMMIT;
@@ -0,0 +1,7 @@
+-- Knowledge aggregation runs after the submit response is sent; this column
+-- marks attempts whose module/course knowledge has been recomputed.
+ALTER TABLE "TestResult"
+ADD COLUMN IF NOT EXISTS "knowledgeUpdatedAt" TIMESTAMP WITH TIME ZONE;
+
+-- Earlier attempts were aggregated synchronously during submission
+UPDATE "TestResult" SET "knowledgeUpdatedAt" = created_at WHERE "knowledgeUpdatedAt" IS NULL;
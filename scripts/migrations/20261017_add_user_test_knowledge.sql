@@ -0,0 +1,48 @@
+-- Latest attempt score per (user, test). Module knowledge is averaged from
+-- these rows, so a new submission no longer rescans every test's history.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public."UserTestKnowledge"
+(
+    id bigint NOT NULL,
+    "userId" bigint NOT NULL,
+    "testId" bigint NOT NULL,
+    "testResultId" bigint NOT NULL,
+    knowledge double precision NOT NULL DEFAULT 0.0,
+    "lastUpdated" date,
+    PRIMARY KEY (id),
+    UNIQUE ("userId", "testId")
+);
+
+ALTER TABLE IF EXISTS public."UserTestKnowledge"
+    ADD FOREIGN KEY ("userId")
+    REFERENCES public."User" (id) MATCH SIMPLE
+    ON UPDATE NO ACTION
+    ON DELETE NO ACTION
+    NOT VALID;
+
+ALTER TABLE IF EXISTS public."UserTestKnowledge"
+    ADD FOREIGN KEY ("testId")
+    REFERENCES public."Test" (id) MATCH SIMPLE
+    ON UPDATE NO ACTION
+    ON DELETE NO ACTION
+    NOT VALID;
+
+ALTER TABLE IF EXISTS public."UserTestKnowledge"
+    ADD FOREIGN KEY ("testResultId")
+    REFERENCES public."TestResult" (id) MATCH SIMPLE
+    ON UPDATE NO ACTION
+    ON DELETE NO ACTION
+    NOT VALID;
+
+-- Backfill from the latest attempt of every (user, test); the id of that
+-- TestResult is reused as the row id.
+INSERT INTO public."UserTestKnowledge" (id, "userId", "testId", "testResultId", knowledge, "lastUpdated")
+SELECT DISTINCT ON (tr."userId", tr."testId")
+    tr.id, tr."userId", tr."testId", tr.id, tr.result, CURRENT_DATE
+FROM public."TestResult" tr
+ORDER BY tr."userId", tr."testId", tr.created_at DESC
+ON CONFLICT ("userId", "testId") DO NOTHING;
+
+COMMIT;
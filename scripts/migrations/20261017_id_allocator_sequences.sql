@@ -0,0 +1,14 @@
+-- Sequences backing app/ids.py.
+-- lms_id_worker_seq spreads Snowflake worker slot leases (app/ids.py takes the
+-- first free slot from nextval modulo 64 and holds it with an advisory lock).
+-- lms_id_seq serves ID_ALLOCATOR=sequence in blocks of INCREMENT BY ids.
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS public.lms_id_worker_seq;
+
+CREATE SEQUENCE IF NOT EXISTS public.lms_id_seq
+    INCREMENT BY 100
+    START WITH 2251799813685248;  -- 2^51, above the legacy time-based ids
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Per-slot high-water marks for the Snowflake allocator (app/ids.py).
+-- high_water_ms (ms since 2026-01-01T00:00:00Z) bounds every id timestamp the
+-- slot may have issued; it is reserved ahead of use while the slot is held,
+-- and a new holder waits until the clock is past it.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.lms_id_worker_slots
+(
+    worker_id smallint NOT NULL,
+    high_water_ms bigint NOT NULL,
+    PRIMARY KEY (worker_id)
+);
+
+COMMIT;
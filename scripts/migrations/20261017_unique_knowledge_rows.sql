@@ -0,0 +1,34 @@
+-- One knowledge row per (user, module) and per (user, course).
+-- compute_module_knowledge / compute_course_knowledge and the admin
+-- module-knowledge / course-knowledge endpoints now write these rows with
+-- INSERT ... ON CONFLICT DO UPDATE, which needs a unique index to conflict on.
+-- The plain lookup indexes from 20261017_add_hot_path_indexes.sql are
+-- replaced by the unique ones (same columns).
+
+BEGIN;
+
+-- Concurrent submissions could create duplicates: keep the most recently
+-- updated row of every pair (the highest id among equals)
+DELETE FROM "UserModuleKnowledge" k
+USING "UserModuleKnowledge" d
+WHERE k."userId" = d."userId"
+  AND k."moduleId" = d."moduleId"
+  AND (COALESCE(k."lastUpdated", '-infinity'::date), k.id)
+    < (COALESCE(d."lastUpdated", '-infinity'::date), d.id);
+
+DELETE FROM "UserCourseKnowledge" k
+USING "UserCourseKnowledge" d
+WHERE k."userId" = d."userId"
+  AND k."courseId" = d."courseId"
+  AND (COALESCE(k."lastUpdated", '-infinity'::date), k.id)
+    < (COALESCE(d."lastUpdated", '-infinity'::date), d.id);
+
+DROP INDEX IF EXISTS idx_usermoduleknowledge_user_module;
+CREATE UNIQUE INDEX IF NOT EXISTS "UserModuleKnowledge_userId_moduleId_key"
+    ON "UserModuleKnowledge" ("userId", "moduleId");
+
+DROP INDEX IF EXISTS idx_usercourseknowledge_user_course;
+CREATE UNIQUE INDEX IF NOT EXISTS "UserCourseKnowledge_userId_courseId_key"
+    ON "UserCourseKnowledge" ("userId", "courseId");
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- UserAnswer ids are taken from a sequence instead of probing random ids,
+-- so all answers of an attempt can be written with one multi-row INSERT.
+
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS public."UserAnswer_id_seq" OWNED BY public."UserAnswer".id;
+
+-- Continue after the largest existing (time-based) id
+SELECT setval('public."UserAnswer_id_seq"', GREATEST((SELECT max(id) FROM public."UserAnswer"), 1));
+
+ALTER TABLE public."UserAnswer"
+    ALTER COLUMN id SET DEFAULT nextval('public."UserAnswer_id_seq"');
+
+COMMIT;
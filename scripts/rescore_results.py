@@ -0,0 +1,239 @@
+"""
+Re-score historical test attempts after a change of the scoring formula.
+
+Usage:
+  python -m scripts.rescore_results --dry-run            # all tests, report only
+  python -m scripts.rescore_results --test-id 1 --test-id 2
+  python -m scripts.rescore_results --course-id 1 --recompute-knowledge
+
+`TestResult.result` and `TestResult.isPassed` are recomputed with the
+current `DIFFICULTY_FACTOR_BY_TYPE`, time-factor bounds and TEST_PASS_PERCENT,
+exactly as submit_test does, but for all attempts of a test at once: question weights are a NumPy
+vector, correct answers of a batch of attempts form a boolean matrix, and the
+weighted points are one matrix-vector product. Attempts are read in batches of
+--batch-size (keyset on id), correct answers of a batch with one query, and
+changed rows are written back with one UPDATE ... FROM unnest(...) per batch.
+
+`UserTestKnowledge` rows that point at changed attempts get the new score.
+With --recompute-knowledge the module knowledge and `ModulePassed` of every
+affected (user, module) pair are recomputed from those rows
+(`recompute_module_knowledge`), then the course knowledge of the affected
+courses (`recompute_course_knowledge`).
+--dry-run writes nothing and prints how many attempts would change, the
+distribution of the differences and a few examples.
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import text
+
+from app.db import SessionLocal
+from app.utils import (
+    TIME_FACTOR_MAX,
+    TIME_FACTOR_MIN,
+    question_points,
+    recompute_course_knowledge,
+    recompute_module_knowledge,
+)
+
+# Same threshold as submit_test (app/courses_full.py)
+TEST_PASS_PERCENT = int(os.environ.get("TEST_PASS_PERCENT", "80"))
+
+_UPDATE_RESULTS = text('''
+    UPDATE "TestResult" AS r
+    SET result = v.result, "isPassed" = v.passed
+    FROM (
+        SELECT unnest(CAST(:ids AS bigint[])) AS id,
+               unnest(CAST(:results AS bigint[])) AS result,
+               unnest(CAST(:passed AS boolean[])) AS passed
+    ) AS v
+    WHERE r.id = v.id
+''')
+
+_UPDATE_TEST_KNOWLEDGE = text('''
+    UPDATE "UserTestKnowledge" AS k
+    SET knowledge = r.result
+    FROM "TestResult" AS r
+    WHERE r.id = k."testResultId" AND r.id = ANY(CAST(:ids AS bigint[]))
+''')
+
+
+def score_batch(
+    weights: np.ndarray,
+    correct: np.ndarray,
+    expected_minutes: float,
+    durations: np.ndarray,
+    pass_percent: float = TEST_PASS_PERCENT,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Rounded percents and pass flags of a batch of attempts.
+
+    `correct` is a (attempts x questions) boolean matrix, `durations` the
+    actual minutes of every attempt. Mirrors `score_breakdown` and
+    `time_factor_for` from app/utils.py; like submit_test, an attempt passes
+    when the unrounded percent reaches `pass_percent`.
+    """
+    max_points = weights.sum()
+    if max_points <= 0:
+        return np.zeros(len(durations), dtype=np.int64), np.zeros(len(durations), dtype=bool)
+    accuracy = (correct @ weights) / max_points
+    time_factor = np.ones(len(durations))
+    if expected_minutes > 0:
+        timed = durations > 0
+        time_factor[timed] = np.clip(expected_minutes / durations[timed], TIME_FACTOR_MIN, TIME_FACTOR_MAX)
+    percent = np.clip(accuracy * 100.0 * time_factor, 0.0, 100.0)
+    # как в submit_test: int(round(percent)), round() — банковское округление, как np.rint
+    return np.rint(percent).astype(np.int64), percent >= pass_percent
+
+
+def _select_tests(db, test_ids: list[int], course_ids: list[int]) -> list[tuple[int, float, int | None, int | None]]:
+    """(test id, durationInMinutes, course id, module id) of the tests to re-score."""
+    sql = '''
+        SELECT t.id, t."durationInMinutes", COALESCE(t."courseId", m."courseId"), t."moduleId"
+        FROM "Test" t LEFT JOIN "Module" m ON m.id = t."moduleId"
+        WHERE EXISTS (SELECT 1 FROM "Question" q WHERE q."testId" = t.id)
+    '''
+    params = {}
+    if test_ids:
+        sql += ' AND t.id = ANY(CAST(:test_ids AS bigint[]))'
+        params['test_ids'] = test_ids
+    if course_ids:
+        sql += ' AND COALESCE(t."courseId", m."courseId") = ANY(CAST(:course_ids AS bigint[]))'
+        params['course_ids'] = course_ids
+    return [
+        (int(tid), float(duration or 0), cid, mid)
+        for tid, duration, cid, mid in db.execute(text(sql + ' ORDER BY t.id'), params)
+    ]
+
+
+def _question_weights(db, test_id: int) -> tuple[np.ndarray, np.ndarray]:
+    rows = db.execute(
+        text('SELECT id, "complexityPoints", "questionType" FROM "Question" WHERE "testId" = :t ORDER BY id'),
+        {'t': test_id},
+    ).all()
+    ids = np.array([r.id for r in rows], dtype=np.int64)
+    weights = np.array([question_points(r) for r in rows], dtype=np.float64)
+    return ids, weights
+
+
+def rescore_test(db, test_id: int, expected_minutes: float, args, stats: dict) -> tuple[int, set[int]]:
+    """Re-score all attempts of one test; returns the number of changed attempts and their users."""
+    question_ids, weights = _question_weights(db, test_id)
+    changed_total = 0
+    changed_users: set[int] = set()
+    last_id = 0
+    while True:
+        attempts = db.execute(
+            text('''
+                SELECT id, "durationInMinutes", result, "isPassed", "userId" FROM "TestResult"
+                WHERE "testId" = :t AND id > :last ORDER BY id LIMIT :n
+            '''),
+            {'t': test_id, 'last': last_id, 'n': args.batch_size},
+        ).all()
+        if not attempts:
+            break
+        last_id = attempts[-1].id
+        result_ids = np.array([a.id for a in attempts], dtype=np.int64)
+        durations = np.array([float(a.durationInMinutes or 0) for a in attempts], dtype=np.float64)
+        old = np.array([a.result for a in attempts], dtype=np.int64)
+        old_passed = np.array([bool(a.isPassed) for a in attempts], dtype=bool)
+        user_ids = np.array([a.userId for a in attempts], dtype=np.int64)
+
+        answers = db.execute(
+            text('''
+                SELECT "testResultId", "questionId" FROM "UserAnswer"
+                WHERE "testResultId" = ANY(CAST(:ids AS bigint[])) AND "isCorrect"
+            '''),
+            {'ids': result_ids.tolist()},
+        ).all()
+        correct = np.zeros((len(attempts), len(question_ids)), dtype=bool)
+        if answers:
+            pairs = np.array(answers, dtype=np.int64)
+            cols = np.searchsorted(question_ids, pairs[:, 1])
+            cols = np.minimum(cols, len(question_ids) - 1)
+            # ответы на вопросы, которых уже нет в тесте, не учитываются
+            known = question_ids[cols] == pairs[:, 1]
+            rows = np.searchsorted(result_ids, pairs[known, 0])
+            correct[rows, cols[known]] = True
+
+        new, passed = score_batch(weights, correct, expected_minutes, durations)
+        diff = (new != old) | (passed != old_passed)
+        changed = int(diff.sum())
+        changed_total += changed
+        changed_users.update(user_ids[diff].tolist())
+        stats['attempts'] += len(attempts)
+        stats['deltas'].append(new[diff] - old[diff])
+        examples = zip(
+            result_ids[diff][: max(0, args.show - len(stats['examples']))],
+            old[diff], old_passed[diff], new[diff], passed[diff],
+        )
+        for rid, before, passed_before, after, passed_after in examples:
+            stats['examples'].append((test_id, int(rid), int(before), bool(passed_before), int(after), bool(passed_after)))
+
+        if changed and not args.dry_run:
+            ids = result_ids[diff].tolist()
+            db.execute(_UPDATE_RESULTS, {'ids': ids, 'results': new[diff].tolist(), 'passed': passed[diff].tolist()})
+            db.execute(_UPDATE_TEST_KNOWLEDGE, {'ids': ids})
+            db.commit()
+    return changed_total, changed_users
+
+
+def run(args) -> None:
+    started = time.perf_counter()
+    stats = {'attempts': 0, 'deltas': [], 'examples': []}
+    affected_courses = set()
+    affected_users_by_module: dict[int, set[int]] = defaultdict(set)
+    db = SessionLocal()
+    try:
+        tests = _select_tests(db, args.test_id, args.course_id)
+        for test_id, expected_minutes, course_id, module_id in tests:
+            changed, users = rescore_test(db, test_id, expected_minutes, args, stats)
+            if changed:
+                print(f"test {test_id}: {changed} attempts {'would change' if args.dry_run else 'changed'}")
+                if course_id is not None:
+                    affected_courses.add(int(course_id))
+                if module_id is not None:
+                    affected_users_by_module[int(module_id)].update(users)
+        db.rollback()
+
+        deltas = np.concatenate(stats['deltas']) if stats['deltas'] else np.zeros(0, dtype=np.int64)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{len(tests)} tests, {stats['attempts']} attempts, {len(deltas)} "
+            f"{'would change' if args.dry_run else 'changed'} in {elapsed:.1f}s"
+        )
+        if len(deltas):
+            print(
+                f"delta of result: min {deltas.min():+d}, p50 {int(np.median(deltas)):+d}, max {deltas.max():+d}, "
+                f"raised {int((deltas > 0).sum())}, lowered {int((deltas < 0).sum())}"
+            )
+        for test_id, result_id, before, passed_before, after, passed_after in stats['examples']:
+            print(
+                f"  test {test_id} result {result_id}: {before} -> {after}"
+                f" (passed: {passed_before} -> {passed_after})"
+            )
+
+        if args.recompute_knowledge and not args.dry_run:
+            # модули — первыми: знания курса усредняются из UserModuleKnowledge
+            for module_id, users in sorted(affected_users_by_module.items()):
+                recompute_module_knowledge(db, module_id, users)
+                print(f"module {module_id}: knowledge recomputed for {len(users)} students")
+            for course_id in sorted(affected_courses):
+                students = recompute_course_knowledge(db, course_id)
+                print(f"course {course_id}: knowledge recomputed for {len(students)} students")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--test-id', type=int, action='append', default=[])
+    parser.add_argument('--course-id', type=int, action='append', default=[])
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--dry-run', action='store_true', help='only report the differences')
+    parser.add_argument('--show', type=int, default=10, help='number of example changes to print')
+    parser.add_argument('--recompute-knowledge', action='store_true',
+                        help='recompute module knowledge, ModulePassed and course knowledge of the affected students')
+    run(parser.parse_args())
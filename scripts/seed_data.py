@@ -7,10 +7,32 @@ Usage:
 
 This script uses SQL INSERT ... ON CONFLICT (id) DO NOTHING so it's safe
 to run multiple times.
+
+Scale mode bulk-loads a synthetic dataset with COPY:
+    python scripts/seed_data.py --scale --users 1000000 --courses 200 \
+        --modules-per-course 10 --questions-per-test 10 --attempts-per-user 10 --jobs 8 --no-fk-checks
+
+That is 1M users and students x attempts x questions ~ 100M `UserAnswer`
+rows. Every run adds a new dataset: ids continue after the largest existing
+id below `ID_BASE` (app/ids.py), so they never meet ids of the running app.
+Users, courses, modules, topics, tests, questions and answers are loaded
+first; then --jobs processes load enrollments, attempts with their answers
+and the knowledge rows for disjoint ranges of students, committing every
+--batch-students students. --no-fk-checks skips foreign key triggers during
+the load (needs a superuser; the data is consistent by construction).
 """
+import argparse
+import io
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
+
 from sqlalchemy import text
 from app.db import engine
 from app.auth import get_password_hash
+from app.ids import ID_BASE
 
 
 def run():
@@ -26,14 +48,14 @@ def run():
         # Permissions
   """
     INSERT INTO public."Permissions" (id, action)
-    VALUES (1, 'read'), (2, 'write'), (3, 'grade')
+    VALUES (1, 'read'), (2, 'write'), (3, 'grade'), (4, 'manage_permissions')
   ON CONFLICT (id) DO NOTHING;
   """,
 
         # RolePermissions
         """
         INSERT INTO public."RolePermissions" (id, "roleId", "permissionId")
-        VALUES (1, 1, 1), (2, 2, 1), (3, 2, 2), (4, 3, 1), (5, 3, 2), (6, 3, 3)
+        VALUES (1, 1, 1), (2, 2, 1), (3, 2, 2), (4, 3, 1), (5, 3, 2), (6, 3, 3), (7, 3, 4)
         ON CONFLICT (id) DO NOTHING;
         """,
 
@@ -154,7 +176,271 @@ def run():
             print('OK')
 
 
+# --- scale mode ---------------------------------------------------------------
+
+TEST_PASS_PERCENT = int(os.environ.get("TEST_PASS_PERCENT", "80"))
+MODULE_PASS_KNOWLEDGE = 80.0
+OPTIONS_PER_QUESTION = 4
+NULL = '\\N'  # NULL in COPY text format
+
+# Tables whose ids are allocated by this script, in load order
+_SCALE_TABLES = (
+    'User', 'CourseCategory', 'Course', 'Module', 'Topic', 'TopicContent', 'Test', 'Question', 'Answer',
+    'CourseEnrollment', 'TestResult', 'UserAnswer', 'UserTestKnowledge', 'UserModuleKnowledge',
+    'UserCourseKnowledge', 'ModulePassed',
+)
+
+
+def _copy(cursor, table: str, columns: str, buf: io.StringIO) -> None:
+    buf.seek(0)
+    cursor.copy_expert(f'COPY public."{table}" ({columns}) FROM STDIN', buf)
+
+
+def _bool(value: bool) -> str:
+    return 't' if value else 'f'
+
+
+class ScalePlan:
+    """Id arithmetic of the synthetic dataset: the id of row `index` of a table is offset + index + 1."""
+
+    def __init__(self, args, offsets: dict[str, int]):
+        self.users = args.users
+        self.courses = args.courses
+        self.modules = args.modules_per_course
+        self.questions = args.questions_per_test
+        self.attempts = args.attempts_per_user
+        self.teachers = max(1, min(args.users // 100, args.courses))
+        self.students = self.users - self.teachers
+        self.courses_per_user = max(1, min(args.courses_per_user, self.courses))
+        self.seed = args.seed
+        self.offsets = offsets
+
+    def id(self, table: str, index: int) -> int:
+        return self.offsets[table] + index + 1
+
+    def enrolled_course(self, student: int, j: int) -> int:
+        # consecutive courses from a per-student start: distinct while j < courses
+        return (student * 31 + j) % self.courses
+
+    def question_weight(self, q: int) -> int:
+        return 1 + q % 3
+
+    def is_open(self, q: int) -> bool:
+        return q % 4 == 3
+
+
+def _max_ids(conn) -> dict[str, int]:
+    return {
+        table: int(conn.execute(
+            text(f'SELECT COALESCE(MAX(id), 0) FROM public."{table}" WHERE id < :base'), {'base': ID_BASE}
+        ).scalar_one())
+        for table in _SCALE_TABLES
+    }
+
+
+def load_users(plan: ScalePlan, cursor, batch: int = 100_000) -> None:
+    password = get_password_hash('pwd')  # hash once (pbkdf2_sha256 is slow on purpose): every synthetic user logs in with 'pwd'
+    for start in range(0, plan.users, batch):
+        buf = io.StringIO()
+        for u in range(start, min(start + batch, plan.users)):
+            user_id = plan.id('User', u)
+            role = 2 if u < plan.teachers else 1
+            buf.write(f"{user_id}\tuser{user_id}\t{password}\tUser\t{u}\t{role}\n")
+        _copy(cursor, 'User', 'id, login, password, name, surname, "roleId"', buf)
+
+
+def load_structure(plan: ScalePlan, cursor) -> None:
+    """Category, courses, modules (one topic with a material and one test each), questions and answers."""
+    category_id = plan.id('CourseCategory', 0)
+    _copy(cursor, 'CourseCategory', 'id, name', io.StringIO(f"{category_id}\tSynthetic {category_id}\n"))
+
+    buf = io.StringIO()
+    for c in range(plan.courses):
+        author = plan.id('User', c % plan.teachers)
+        buf.write(f"{plan.id('Course', c)}\tCourse {c}\tSynthetic course {c}\t{category_id}\t{author}\tt\n")
+    _copy(cursor, 'Course', 'id, name, description, "categoryId", "authorId", "isPublished"', buf)
+
+    modules, topics, contents, tests = io.StringIO(), io.StringIO(), io.StringIO(), io.StringIO()
+    for c in range(plan.courses):
+        for m in range(plan.modules):
+            i = c * plan.modules + m
+            module_id, topic_id = plan.id('Module', i), plan.id('Topic', i)
+            modules.write(f"{module_id}\tModule {m}\tModule {m} of course {c}\t{plan.id('Course', c)}\n")
+            topics.write(f"{topic_id}\tTopic {m}\tTopic of module {m}\t{module_id}\n")
+            contents.write(f"{plan.id('TopicContent', i)}\tLecture notes\t/content/synthetic/{topic_id}.pdf\t{topic_id}\n")
+            tests.write(f"{plan.id('Test', i)}\tTest {m}\tTest of module {m}\t30\t{module_id}\t{NULL}\n")
+    _copy(cursor, 'Module', 'id, name, description, "courseId"', modules)
+    _copy(cursor, 'Topic', 'id, name, description, "moduleId"', topics)
+    _copy(cursor, 'TopicContent', 'id, description, file, "topicId"', contents)
+    _copy(cursor, 'Test', 'id, name, description, "durationInMinutes", "moduleId", "courseId"', tests)
+
+    questions, answers = io.StringIO(), io.StringIO()
+    for i in range(plan.courses * plan.modules):
+        for q in range(plan.questions):
+            qi = i * plan.questions + q
+            question_id = plan.id('Question', qi)
+            if plan.is_open(q):
+                questions.write(f"{question_id}\tQuestion {q}\t{plan.question_weight(q)}\t{plan.id('Test', i)}\topen\t{plan.id('Topic', i)}\n")
+                answers.write(f"{plan.id('Answer', qi * OPTIONS_PER_QUESTION)}\tt\tAnswer {q}\t{question_id}\n")
+                continue
+            questions.write(f"{question_id}\tQuestion {q}\t{plan.question_weight(q)}\t{plan.id('Test', i)}\ttest\t{plan.id('Topic', i)}\n")
+            for o in range(OPTIONS_PER_QUESTION):
+                answers.write(
+                    f"{plan.id('Answer', qi * OPTIONS_PER_QUESTION + o)}\t{_bool(o == q % OPTIONS_PER_QUESTION)}\tOption {o}\t{question_id}\n")
+    _copy(cursor, 'Question', 'id, text, "complexityPoints", "testId", "questionType", "topicId"', questions)
+    _copy(cursor, 'Answer', 'id, "isCorrect", text, "questionId"', answers)
+
+
+def load_students(plan: ScalePlan, start: int, end: int, cursor) -> int:
+    """Enrollments, attempts, answers and knowledge of students [start, end); returns the UserAnswer rows."""
+    enrollments, results, answers = io.StringIO(), io.StringIO(), io.StringIO()
+    test_knowledge, module_knowledge, course_knowledge, passed = (io.StringIO() for _ in range(4))
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+    weights = [plan.question_weight(q) for q in range(plan.questions)]
+    max_points = sum(weights)
+    k = plan.courses_per_user
+    for s in range(start, end):
+        rng = random.Random(plan.seed * 1_000_003 + s)
+        user_id = plan.id('User', plan.teachers + s)
+        ability = 0.3 + 0.65 * rng.random()
+        for j in range(k):
+            enrollments.write(
+                f"{plan.id('CourseEnrollment', s * k + j)}\t{today}\t{plan.id('Course', plan.enrolled_course(s, j))}\t{user_id}\n")
+
+        # attempts go round the enrolled courses, then on to the next module
+        latest: dict[tuple[int, int], tuple[int, int]] = {}  # (course slot, module) -> (result id, percent)
+        for a in range(plan.attempts):
+            j, m = a % k, (a // k) % plan.modules
+            i = plan.enrolled_course(s, j) * plan.modules + m
+            result_index = s * plan.attempts + a
+            result_id = plan.id('TestResult', result_index)
+            points = 0
+            for q in range(plan.questions):
+                correct = rng.random() < ability
+                if correct:
+                    points += weights[q]
+                answers.write(
+                    f"{plan.id('UserAnswer', result_index * plan.questions + q)}\t{user_id}\t{result_id}\t"
+                    f"{plan.id('Question', i * plan.questions + q)}\t{_bool(correct)}\t{rng.randint(1, 3)}\n")
+            percent = round(100 * points / max_points) if max_points else 0
+            created = (now - timedelta(hours=plan.attempts - a, minutes=rng.randrange(60))).isoformat()
+            results.write(
+                f"{result_id}\t{points}\t{_bool(percent >= TEST_PASS_PERCENT)}\t{rng.randint(5, 30)}\t{percent}\t"
+                f"{plan.id('Test', i)}\t{user_id}\t{created}\t{created}\n")
+            latest[(j, m)] = (result_id, percent)
+
+        # one test per module: module knowledge is the score of its latest attempt
+        course_sum = [0.0] * k
+        for (j, m), (result_id, percent) in latest.items():
+            i = plan.enrolled_course(s, j) * plan.modules + m
+            row = (s * k + j) * plan.modules + m
+            test_knowledge.write(
+                f"{plan.id('UserTestKnowledge', row)}\t{user_id}\t{plan.id('Test', i)}\t{result_id}\t{percent}\t{today}\n")
+            module_knowledge.write(f"{plan.id('UserModuleKnowledge', row)}\t{user_id}\t{plan.id('Module', i)}\t{percent}\t{today}\n")
+            is_passed = percent >= MODULE_PASS_KNOWLEDGE
+            passed.write(
+                f"{plan.id('ModulePassed', row)}\t{plan.id('Module', i)}\t{_bool(is_passed)}\t{user_id}\t{today if is_passed else NULL}\n")
+            course_sum[j] += percent
+        for j in range(k):
+            course_knowledge.write(
+                f"{plan.id('UserCourseKnowledge', s * k + j)}\t{user_id}\t{plan.id('Course', plan.enrolled_course(s, j))}\t"
+                f"{course_sum[j] / plan.modules}\t{today}\n")
+
+    _copy(cursor, 'CourseEnrollment', 'id, "dateStarted", "courseId", "userId"', enrollments)
+    _copy(cursor, 'TestResult',
+          'id, "scoreInPoints", "isPassed", "durationInMinutes", result, "testId", "userId", created_at, "knowledgeUpdatedAt"',
+          results)
+    _copy(cursor, 'UserAnswer', 'id, "userId", "testResultId", "questionId", "isCorrect", "timeSpentInMinutes"', answers)
+    _copy(cursor, 'UserTestKnowledge', 'id, "userId", "testId", "testResultId", knowledge, "lastUpdated"', test_knowledge)
+    _copy(cursor, 'UserModuleKnowledge', 'id, "userId", "moduleId", knowledge, "lastUpdated"', module_knowledge)
+    _copy(cursor, 'UserCourseKnowledge', 'id, "userId", "courseId", knowledge, "lastUpdated"', course_knowledge)
+    _copy(cursor, 'ModulePassed', 'id, "moduleId", "isPassed", "userId", "datePassed"', passed)
+    return (end - start) * plan.attempts * plan.questions
+
+
+def _open_loader(no_fk_checks: bool):
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    cursor.execute('SET synchronous_commit = off')
+    if no_fk_checks:
+        cursor.execute('SET session_replication_role = replica')
+    return raw, cursor
+
+
+def _student_job(job) -> int:
+    plan, start, end, batch, no_fk_checks = job
+    engine.dispose(close=False)  # forked worker: do not reuse the parent's connections
+    raw, cursor = _open_loader(no_fk_checks)
+    try:
+        rows = 0
+        for batch_start in range(start, end, batch):
+            rows += load_students(plan, batch_start, min(batch_start + batch, end), cursor)
+            raw.commit()
+        return rows
+    finally:
+        raw.close()
+
+
+def run_scale(args) -> None:
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        plan = ScalePlan(args, _max_ids(conn))
+    if plan.students <= 0 or plan.courses <= 0 or plan.modules <= 0:
+        raise SystemExit('Need at least one student, one course and one module per course')
+    print(f"{plan.users:,} users ({plan.teachers} teachers), {plan.courses} courses x {plan.modules} modules, "
+          f"{plan.questions} questions per test, {plan.attempts} attempts per student "
+          f"-> {plan.students * plan.attempts * plan.questions:,} answers")
+
+    raw, cursor = _open_loader(args.no_fk_checks)
+    try:
+        load_users(plan, cursor)
+        load_structure(plan, cursor)
+        raw.commit()
+    finally:
+        raw.close()
+    print(f"users and course structure loaded in {time.perf_counter() - started:.1f}s")
+
+    jobs = max(1, args.jobs)
+    step = -(-plan.students // jobs)
+    ranges = [(plan, lo, min(lo + step, plan.students), args.batch_students, args.no_fk_checks)
+              for lo in range(0, plan.students, step)]
+    rows = 0
+    if jobs == 1:
+        rows = sum(_student_job(job) for job in ranges)
+    else:
+        with Pool(jobs) as pool:
+            for done in pool.imap_unordered(_student_job, ranges):
+                rows += done
+                print(f"  {rows:,} answers loaded ({time.perf_counter() - started:.0f}s)")
+
+    with engine.begin() as conn:
+        # the app takes UserAnswer ids from its sequence
+        conn.execute(text("""SELECT setval('public."UserAnswer_id_seq"', GREATEST((SELECT MAX(id) FROM public."UserAnswer"), (SELECT last_value FROM public."UserAnswer_id_seq")))"""))
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table in _SCALE_TABLES:
+            conn.execute(text(f'ANALYZE public."{table}"'))
+    elapsed = time.perf_counter() - started
+    print(f"{rows:,} answers in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
 if __name__ == '__main__':
-    print('Starting seed script...')
-    run()
-    print('Seeding finished.')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', action='store_true', help='bulk-load a synthetic dataset instead of the sample rows')
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--courses', type=int, default=20)
+    parser.add_argument('--modules-per-course', type=int, default=5)
+    parser.add_argument('--questions-per-test', type=int, default=10)
+    parser.add_argument('--attempts-per-user', type=int, default=10)
+    parser.add_argument('--courses-per-user', type=int, default=2)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='parallel loader processes')
+    parser.add_argument('--batch-students', type=int, default=5_000, help='students per COPY round and commit')
+    parser.add_argument('--no-fk-checks', action='store_true', help='skip foreign key triggers (superuser)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if args.scale:
+        run_scale(args)
+    else:
+        print('Starting seed script...')
+        run()
+        print('Seeding finished.')
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from app.cache import AnswerNode, CourseTree, ModuleNode, QuestionNode, TopicNode, dump_tree, load_tree
+from app.cache import TestNode as _TestNode  # not a pytest class
+
+
+def make_tree() -> CourseTree:
+    question = QuestionNode(
+        id=31, testId=21, text="2 + 2?", picture=None, complexityPoints=2, questionType="single",
+        topicId=11, answers=(AnswerNode(41, 31, "4", True), AnswerNode(42, 31, "5", False)),
+    )
+    module_test = _TestNode(21, "Module test", "", 10, 1, None, (question,))
+    final_test = _TestNode(22, "Final", "", 30, None, 7, ())
+    module = ModuleNode(1, "Module", "", 7, (TopicNode(11, "Topic", "", 1),), (module_test,))
+    return CourseTree(course_id=7, version=3, modules=(module,), course_tests=(final_test,))
+
+
+def test_tree_round_trips_through_json():
+    tree = make_tree()
+    tree.derived[("paper", 21)] = object()
+
+    raw = dump_tree(tree)
+    restored = load_tree(raw)
+
+    # plain JSON, without the derived values or the lookup indexes
+    assert set(json.loads(raw)) == {"course_id", "version", "modules", "course_tests"}
+    assert restored == tree
+    assert restored.derived == {}
+    assert restored.test(21).questions[0].answers[0].isCorrect is True
+    assert restored.test(22).courseId == 7
+    assert restored.module(1).topics[0].name == "Topic"
+
+
+def test_unexpected_fields_are_rejected():
+    data = json.loads(dump_tree(make_tree()))
+    data["modules"][0]["topics"][0]["__reduce__"] = "os.system"
+
+    with pytest.raises(TypeError):
+        load_tree(json.dumps(data).encode())
@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.cache import AnswerNode, CourseTree, ModuleNode, QuestionNode
+from app.cache import TestNode as _TestNode  # not a pytest class
+from app.grading import answer_key_from_tree, build_answer_key, grade_submission
+from app.utils import question_points, score_breakdown, time_factor_for
+
+PASS_PERCENT = 80
+
+
+def question(id, question_type="test", points=1, topic_id=None):
+    return SimpleNamespace(id=id, questionType=question_type, complexityPoints=points, topicId=topic_id)
+
+
+def answer(id, question_id, text="", is_correct=False):
+    return SimpleNamespace(id=id, questionId=question_id, text=text, isCorrect=is_correct)
+
+
+QUESTIONS = [
+    question(1, points=2),
+    question(2, points=1),
+    question(3, question_type="open", points=3),
+    question(4, points=1),
+]
+ANSWERS = [
+    answer(11, 1, "a", True), answer(12, 1, "b"),
+    answer(21, 2, "c"), answer(22, 2, "d", True),
+    answer(31, 3, "  Paris ", True), answer(32, 3, "paris, france", True),
+    answer(41, 4, "e", True), answer(42, 4, "f"),
+]
+
+
+def key():
+    return build_answer_key(100, QUESTIONS, ANSWERS)
+
+
+def legacy_grade(answers, expected_minutes, actual_minutes):
+    """The grading submit_test did inline before grade_submission, on plain rows."""
+    by_id = {a.id: a for a in ANSWERS}
+    correct_flags = []
+    for q in QUESTIONS:
+        provided = answers.get(q.id)
+        if provided is None:
+            provided = answers.get(str(q.id))
+        is_correct = False
+        if provided is not None and q.questionType == "open":
+            accepted = [a.text.strip().lower() for a in ANSWERS if a.questionId == q.id and a.isCorrect]
+            is_correct = str(provided).strip().lower() in accepted
+        elif provided is not None:
+            try:
+                chosen = by_id.get(int(provided))
+            except Exception:
+                chosen = None
+            is_correct = bool(chosen and chosen.questionId == q.id and chosen.isCorrect)
+        correct_flags.append(is_correct)
+    breakdown = score_breakdown(
+        ((question_points(q), ok) for q, ok in zip(QUESTIONS, correct_flags)),
+        time_factor_for(expected_minutes, actual_minutes),
+    )
+    return sum(correct_flags), int(round(breakdown.percent)), breakdown.percent >= PASS_PERCENT
+
+
+def test_closed_and_open_questions():
+    result = grade_submission(key(), {"1": "11", "2": 21, "3": "PARIS", "4": 41}, 10, 10)
+
+    assert [g.is_correct for g in result.graded] == [True, False, True, True]
+    assert all(g.recorded for g in result.graded)
+    assert result.correct == 3 and result.total == 4
+
+
+def test_open_answer_is_trimmed_and_case_insensitive():
+    graded = grade_submission(key(), {"3": "  paris, FRANCE  "}, 0, 0).graded
+
+    assert graded[2].answered and graded[2].is_correct
+
+
+def test_unanswered_questions_are_recorded_as_incorrect():
+    graded = grade_submission(key(), {"1": 11}, 0, 0).graded
+
+    assert [(g.answered, g.is_correct, g.recorded) for g in graded[1:]] == [(False, False, True)] * 3
+
+
+def test_foreign_and_invalid_answer_ids_are_ignored():
+    # 41 belongs to question 4, 999 does not exist, "x" is not an id
+    graded = grade_submission(key(), {"1": 41, "2": 999, "4": "x"}, 0, 0).graded
+
+    for g in (graded[0], graded[1], graded[3]):
+        assert g.answered and not g.is_correct and not g.recorded
+    assert not graded[2].answered and graded[2].recorded
+
+
+def test_non_dict_answers_grade_as_unanswered():
+    result = grade_submission(key(), ["11", "22"], 0, 0)
+
+    assert result.correct == 0
+    assert not any(g.answered for g in result.graded)
+
+
+@pytest.mark.parametrize(
+    "answers, expected_minutes, actual_minutes",
+    [
+        ({"1": 11, "2": 22, "3": "paris", "4": 41}, 10, 10),
+        ({"1": 11, "2": 22, "3": "paris", "4": 41}, 10, 40),
+        ({1: 11, 2: 22, 3: "paris"}, 10, 10),
+        ({"1": 11, "3": "paris", "4": 41}, 10, 8),
+        ({"1": 12, "2": "22", "3": "london", "4": 42}, 0, 5),
+        ({"1": 41, "2": "bad", "3": 7}, 10, 10),
+        ({}, 10, 10),
+    ],
+)
+def test_score_percent_and_pass_match_the_legacy_inline_grading(answers, expected_minutes, actual_minutes):
+    result = grade_submission(key(), answers, expected_minutes, actual_minutes)
+
+    assert (
+        result.correct,
+        int(round(result.breakdown.percent)),
+        result.breakdown.percent >= PASS_PERCENT,
+    ) == legacy_grade(answers, expected_minutes, actual_minutes)
+
+
+def test_answer_key_from_tree_is_built_once_per_snapshot():
+    nodes = [
+        QuestionNode(q.id, 100, "", None, q.complexityPoints, q.questionType, q.topicId,
+                     tuple(AnswerNode(a.id, a.questionId, a.text, a.isCorrect) for a in ANSWERS if a.questionId == q.id))
+        for q in QUESTIONS
+    ]
+    tree = CourseTree(
+        course_id=1, version=1,
+        modules=(ModuleNode(5, "", "", 1, (), (_TestNode(100, "", "", 10, 5, None, tuple(nodes)),)),),
+        course_tests=(),
+    )
+
+    first = answer_key_from_tree(tree, 100)
+
+    assert first == key()
+    assert answer_key_from_tree(tree, 100) is first
+    assert answer_key_from_tree(tree, 999) is None
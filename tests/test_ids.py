@@ -0,0 +1,78 @@
+import pytest
+
+from app import ids
+from app.ids import ID_EPOCH_MS, SEQUENCE_BITS, WORKER_BITS, ClockBehindError, SnowflakeAllocator
+
+
+class FakeClock:
+    """Wall clock in seconds that moves by `step` ms every `every` reads."""
+
+    def __init__(self, ms: int, step: int = 0, every: int = 1):
+        self.ms = ms
+        self.step = step
+        self.every = every
+        self.reads = 0
+
+    def __call__(self) -> float:
+        self.reads += 1
+        if self.step and self.reads % self.every == 0:
+            self.ms += self.step
+        return (ID_EPOCH_MS + self.ms) / 1000
+
+
+def id_ms(value: int) -> int:
+    return (value - ids.ID_BASE) >> (WORKER_BITS + SEQUENCE_BITS)
+
+
+def test_exhausted_millisecond_waits_for_the_clock():
+    # the clock advances one ms every 200 reads, so 65 ids need the next millisecond
+    clock = FakeClock(1_000, step=1, every=200)
+    allocator = SnowflakeAllocator(3, clock=clock)
+
+    issued = [allocator.next_id() for _ in range(65)]
+
+    assert len(set(issued)) == 65
+    assert issued == sorted(issued)
+    # no id is stamped later than the clock read that issued it
+    assert max(id_ms(v) for v in issued) <= clock.ms
+    assert id_ms(issued[-1]) == id_ms(issued[0]) + 1
+
+
+def test_clock_stepping_back_waits_instead_of_reusing_ids():
+    clock = FakeClock(5_000)
+    allocator = SnowflakeAllocator(0, clock=clock)
+    first = allocator.next_id()
+
+    clock.ms = 4_990
+    clock.step, clock.every = 1, 1
+    second = allocator.next_id()
+
+    assert second > first
+    assert id_ms(second) >= 5_000
+
+
+def test_clock_far_behind_raises(monkeypatch):
+    monkeypatch.setattr(ids, "ID_CLOCK_MAX_WAIT_MS", 5)
+    clock = FakeClock(5_000)
+    allocator = SnowflakeAllocator(0, clock=clock)
+    allocator.next_id()
+
+    clock.ms = 1_000
+    with pytest.raises(ClockBehindError):
+        allocator.next_id()
+
+
+def test_ids_stop_at_the_reserved_high_water_mark(monkeypatch):
+    monkeypatch.setattr(ids, "ID_CLOCK_MAX_WAIT_MS", 5)
+
+    class Lease:
+        closed = False
+        high_water_ms = 2_000
+
+    clock = FakeClock(2_000)
+    allocator = SnowflakeAllocator(1, clock=clock, lease=Lease())
+    assert id_ms(allocator.next_id()) == 2_000
+
+    clock.ms = 2_001
+    with pytest.raises(ClockBehindError):
+        allocator.next_id()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import rbac
+from app.deps import CurrentUser, require_role
+
+ACTIONS = [(1, "view_courses"), (2, "edit_courses"), (3, "manage_permissions"), (9, "edit_courses")]
+ROLES = [(1, "student"), (2, "teacher"), (3, "admin"), (4, "guest")]
+PAIRS = [(1, 1), (2, 1), (2, 2), (3, 1), (3, 3), (3, 9), (None, 1), (4, 77)]
+
+
+def compiled(loaded_at=None):
+    return rbac.build_compiled(ACTIONS, ROLES, PAIRS, loaded_at=loaded_at)
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    """Point rbac at a given snapshot and count reloads through `refresh`."""
+    reloads = []
+
+    def install(current, reload_to=None, reload_error=None):
+        monkeypatch.setattr(rbac, "_compiled", current)
+
+        def fake_refresh(db=None):
+            reloads.append(db)
+            if reload_error:
+                raise reload_error
+            monkeypatch.setattr(rbac, "_compiled", reload_to)
+            return reload_to
+
+        monkeypatch.setattr(rbac, "refresh", fake_refresh)
+        return reloads
+
+    return install
+
+
+def test_actions_get_bits_in_permission_id_order():
+    c = compiled()
+
+    assert c.bits == {"view_courses": 0, "edit_courses": 1, "manage_permissions": 2}
+    assert c.role_masks == {1: 0b001, 2: 0b011, 3: 0b111, 4: 0}
+    assert c.role_ids == {"student": 1, "teacher": 2, "admin": 3, "guest": 4}
+
+
+def test_allows_checks_the_role_bit():
+    c = compiled()
+
+    assert c.allows(2, "edit_courses")
+    assert not c.allows(1, "edit_courses")
+    # a grant through a duplicate row of an action sets the shared bit
+    assert c.allows(3, "edit_courses")
+    assert c.allows(None, "manage_permissions", role_name="admin")
+    assert not c.allows(None, "manage_permissions", role_name="teacher")
+    # unknown actions, roles and permission ids grant nothing
+    assert not c.allows(3, "delete_everything")
+    assert not c.allows(42, "view_courses")
+    assert not c.allows(4, "view_courses")
+    assert not c.allows(None, "view_courses")
+
+
+def test_missing_snapshot_is_loaded_on_first_use(snapshot):
+    reloads = snapshot(rbac.Compiled(), reload_to=compiled())
+
+    assert rbac.current().allows(2, "edit_courses")
+    assert len(reloads) == 1
+
+
+def test_fresh_snapshot_is_not_reloaded(snapshot):
+    fresh = compiled()
+    reloads = snapshot(fresh, reload_to=compiled())
+
+    assert rbac.current() is fresh
+    assert reloads == []
+
+
+def test_stale_snapshot_is_reloaded(snapshot):
+    stale = compiled(loaded_at=time.monotonic() - rbac.RBAC_REFRESH_INTERVAL - 1)
+    newer = rbac.build_compiled(ACTIONS, ROLES, [(1, 2)])
+    reloads = snapshot(stale, reload_to=newer)
+
+    assert rbac.current() is newer
+    assert rbac.current().allows(1, "edit_courses")
+    assert len(reloads) == 1
+
+
+def test_stale_snapshot_is_kept_when_the_reload_fails(snapshot):
+    stale = compiled(loaded_at=time.monotonic() - rbac.RBAC_REFRESH_INTERVAL - 1)
+    reloads = snapshot(stale, reload_error=RuntimeError("database is down"))
+
+    assert rbac.current() is stale
+    assert rbac.current() is stale
+    # every call retries until a reload succeeds
+    assert len(reloads) == 2
+
+
+def test_missing_snapshot_propagates_the_reload_error(snapshot):
+    snapshot(rbac.Compiled(), reload_error=RuntimeError("database is down"))
+
+    with pytest.raises(RuntimeError):
+        rbac.current()
+
+
+def test_require_role_falls_back_to_compiled_role_names(snapshot):
+    snapshot(rbac.Compiled(), reload_to=compiled())
+    check = require_role("admin")
+
+    admin = CurrentUser(1, 3, None, "admin", None, None)
+    teacher = CurrentUser(2, 2, None, "teacher1", None, None)
+    assert asyncio.run(check(admin)) is admin
+    with pytest.raises(HTTPException) as denied:
+        asyncio.run(check(teacher))
+    assert denied.value.status_code == 403
+
+
+def test_require_role_trusts_the_token_role_name(snapshot):
+    reloads = snapshot(rbac.Compiled(), reload_error=RuntimeError("must not be used"))
+    check = require_role("admin")
+
+    with pytest.raises(HTTPException):
+        asyncio.run(check(CurrentUser(1, 3, "teacher", "x", None, None)))
+    assert reloads == []
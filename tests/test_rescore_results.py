@@ -0,0 +1,34 @@
+import numpy as np
+
+from scripts.rescore_results import score_batch
+
+
+def test_rescore_can_fail_a_passed_attempt():
+    correct = np.array([[True, True, True, True, False]])
+    durations = np.array([10.0])
+
+    before, passed_before = score_batch(np.ones(5), correct, 10.0, durations, pass_percent=80)
+    # the missed question now weighs twice as much
+    after, passed_after = score_batch(np.array([1.0, 1.0, 1.0, 1.0, 2.0]), correct, 10.0, durations, pass_percent=80)
+
+    assert before.tolist() == [80] and passed_before.tolist() == [True]
+    assert after.tolist() == [67] and passed_after.tolist() == [False]
+
+
+def test_rescore_can_pass_a_failed_attempt():
+    correct = np.array([[True, True, True, False], [False, False, False, True]])
+    durations = np.array([10.0, 10.0])
+
+    before, passed_before = score_batch(np.ones(4), correct, 10.0, durations, pass_percent=80)
+    after, passed_after = score_batch(np.array([2.0, 2.0, 2.0, 1.0]), correct, 10.0, durations, pass_percent=80)
+
+    assert before.tolist() == [75, 25] and passed_before.tolist() == [False, False]
+    assert after.tolist() == [86, 14] and passed_after.tolist() == [True, False]
+
+
+def test_pass_flag_uses_unrounded_percent():
+    # 79.6% is stored as 80 but, as in submit_test, is not a pass
+    result, passed = score_batch(np.array([796.0, 204.0]), np.array([[True, False]]), 0.0, np.array([0.0]), pass_percent=80)
+
+    assert result.tolist() == [80]
+    assert passed.tolist() == [False]
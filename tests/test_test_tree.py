@@ -0,0 +1,124 @@
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas import AnswerTreeIn, QuestionTreeIn
+from app.teaching import diff_test_tree
+
+TEST_ID = 100
+
+
+def stored_question(id, text="q", points=1, question_type="test", topic_id=None):
+    return SimpleNamespace(id=id, text=text, complexityPoints=points, questionType=question_type, topicId=topic_id)
+
+
+def stored_answer(id, question_id, text="a", is_correct=False):
+    return SimpleNamespace(id=id, questionId=question_id, text=text, isCorrect=is_correct)
+
+
+STORED_QUESTIONS = {1: stored_question(1, topic_id=7), 2: stored_question(2, text="two"), 3: stored_question(3)}
+STORED_ANSWERS = {
+    11: stored_answer(11, 1, "yes", True),
+    12: stored_answer(12, 1, "no"),
+    21: stored_answer(21, 2, "x", True),
+    31: stored_answer(31, 3, "z", True),
+}
+
+
+def diff(questions, answered=()):
+    ids = count(1000)
+    return diff_test_tree(
+        TEST_ID,
+        questions,
+        STORED_QUESTIONS,
+        STORED_ANSWERS,
+        answered=lambda question_ids: [q for q in question_ids if q in answered],
+        new_id=lambda: next(ids),
+    )
+
+
+def unchanged_question(id, **changes):
+    row = STORED_QUESTIONS[id]
+    values = dict(text=row.text, complexityPoints=row.complexityPoints, questionType=row.questionType, topicId=row.topicId)
+    values.update(changes)
+    answers = [AnswerTreeIn(id=a.id, text=a.text, isCorrect=a.isCorrect) for a in STORED_ANSWERS.values() if a.questionId == id]
+    return QuestionTreeIn(id=id, answers=answers, **values)
+
+
+def test_unchanged_tree_has_no_changes():
+    result = diff([unchanged_question(1), unchanged_question(2), unchanged_question(3)])
+
+    assert not result.has_changes
+    assert result.topic_ids == set()
+
+
+def test_inserts_updates_and_removals_are_classified():
+    q1 = unchanged_question(1, text="q (edited)")
+    q1.answers = [AnswerTreeIn(id=11, text="yes", isCorrect=False), AnswerTreeIn(text="maybe", isCorrect=True)]
+    new_question = QuestionTreeIn(text="new", complexityPoints=2, topicId=8, answers=[AnswerTreeIn(text="n", isCorrect=True)])
+
+    result = diff([q1, unchanged_question(2), new_question])
+
+    assert result.question_updates == [
+        {"id": 1, "text": "q (edited)", "complexityPoints": 1, "questionType": "test", "topicId": 7}
+    ]
+    assert result.question_inserts == [
+        {"id": 1001, "testId": TEST_ID, "text": "new", "complexityPoints": 2, "questionType": "test", "topicId": 8}
+    ]
+    assert result.answer_updates == [{"id": 11, "text": "yes", "isCorrect": False}]
+    assert result.answer_inserts == [
+        {"id": 1000, "questionId": 1, "text": "maybe", "isCorrect": True},
+        {"id": 1002, "questionId": 1001, "text": "n", "isCorrect": True},
+    ]
+    # answer 12 dropped from question 1; question 3 and its answer dropped entirely
+    assert result.removed_answers == [12, 31]
+    assert result.removed_questions == [3]
+    assert result.has_changes
+
+
+def test_only_new_and_changed_topics_are_reported():
+    result = diff([
+        unchanged_question(1, text="edited"),
+        unchanged_question(2, topicId=9),
+        unchanged_question(3),
+        QuestionTreeIn(text="new", complexityPoints=1, topicId=None),
+    ])
+
+    # question 1 keeps topic 7, question 2 moves to 9, the new one has none
+    assert result.topic_ids == {9}
+
+
+def test_removing_answered_questions_is_refused():
+    with pytest.raises(HTTPException) as refused:
+        diff([unchanged_question(1)], answered={2, 3})
+
+    assert refused.value.status_code == 409
+    assert "[2, 3]" in refused.value.detail
+
+
+def test_removing_unanswered_questions_is_allowed():
+    result = diff([unchanged_question(1), unchanged_question(2)], answered={1})
+
+    assert result.removed_questions == [3]
+
+
+@pytest.mark.parametrize(
+    "questions",
+    [
+        # a question of another test
+        [QuestionTreeIn(id=99, text="q", complexityPoints=1)],
+        # the same question twice
+        [unchanged_question(1), unchanged_question(1)],
+        # an answer moved to another question
+        [QuestionTreeIn(id=2, text="two", complexityPoints=1, answers=[AnswerTreeIn(id=11, text="yes", isCorrect=True)])],
+        # an unknown answer
+        [QuestionTreeIn(text="new", complexityPoints=1, answers=[AnswerTreeIn(id=555, text="a", isCorrect=True)])],
+    ],
+)
+def test_foreign_or_repeated_ids_are_rejected(questions):
+    with pytest.raises(HTTPException) as rejected:
+        diff(questions)
+
+    assert rejected.value.status_code == 400